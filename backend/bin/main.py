@@ -1,8 +1,74 @@
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi import Response
+
+from db.db import Caches
 from db.db import CollectionAdapters
+from db.db import DatabaseAdapter
+from db.settings import mongo_settings
+from shared import db_adapters
+from shared.analytics.store import frames
+from shared.api import live
+from shared.api import routes
+from shared.api.metrics import RouteMetricsMiddleware
+from shared.api.metrics import render_caches
+from shared.api.metrics import route_metrics
+from shared.api.responses import response_cache
+from shared.live.matches import live_matches
+from shared.models import cricket  # noqa: F401  (registers the stored models for ensure_indexes)
+from shared.models.common.base import BaseModel
+from shared.models.common.indexes import ensure_indexes
+from shared.search.names import name_index
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # "warn" logs collection scans, "strict" raises on them; meant for development and tests
+    check_plans = os.environ.get("GAMEVIZ_CHECK_QUERY_PLANS", "")
+    if check_plans:
+        db_adapters.CollectionAdapter.plan_checker = db_adapters.QueryPlanChecker(strict=check_plans == "strict")
+
+    metrics = db_adapters.CollectionAdapter.metrics
+    if metrics is not None:
+        metrics.slow_threshold = None if mongo_settings.slow_operation_ms is None \
+            else mongo_settings.slow_operation_ms / 1000
+        metrics.byte_sample = mongo_settings.metrics_byte_sample
+
+    # Open the pool before serving so the first requests after a deploy do not pay for connection setup
+    await DatabaseAdapter.CRICKET.warm_up(mongo_settings.warm_up_connections)
+    await ensure_indexes()
+    snapshot_collections = mongo_settings.snapshot_collection_names()
+    if snapshot_collections:
+        await DatabaseAdapter.CRICKET.load_snapshot(snapshot_collections)
+    # Names written by other processes (e.g. the ingest) show up after the next restart
+    await name_index.load()
+    BaseModel.write_listeners.append(name_index.written)
+    yield
+
+    BaseModel.write_listeners.remove(name_index.written)
+
+    await live_matches.close()
+    db_adapters.clients.close_all()
+    DatabaseAdapter.CRICKET.close()
+
 
 # FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RouteMetricsMiddleware)
+app.include_router(routes.router)
+app.include_router(live.router)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint() -> Response:
+    """Prometheus text exposition of request, database and cache metrics."""
+    lines = route_metrics.render()
+    if db_adapters.CollectionAdapter.metrics is not None:
+        lines.extend(db_adapters.CollectionAdapter.metrics.render())
+    lines.extend(render_caches({"dimensions": Caches.DIMENSIONS, "frames": frames, "responses": response_cache}))
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/")
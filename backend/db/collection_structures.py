@@ -10,3 +10,97 @@ class Teams:
     NAME = "name"
     COUNTRY = "country"
     TEAM_TYPE = "team_type"
+
+
+class Players:
+    CRIC_SHEET_ID = "cric_sheet_id"
+    NAME = "name"
+    FULL_NAME = "full_name"
+    TEAMS = "teams"
+    BATTING_STYLE = "batting_style"
+    BOWLING_STYLE = "bowling_style"
+    ROLE = "role"
+    DATE_OF_BIRTH = "date_of_birth"
+    PROFILE_FETCHED_AT = "profile_fetched_at"
+
+
+class Stadium:
+    NAME = "name"
+    CITY = "city"
+
+
+class Matches:
+    CRIC_SHEET_ID = "cric_sheet_id"
+    SERIES = "series"
+    VENUE = "venue"
+    DATES = "dates"
+    MATCH_NUMBER = "match_number"
+    OUTCOME_WINNER = "outcome.winner"
+    TEAM_1 = "team_1.team_id"
+    TEAM_2 = "team_2.team_id"
+    PLAYER_OF_MATCH = "player_of_match"
+
+
+class Innings:
+    INNINGS_ID = "innings_id"
+    MATCH_ID = "match_id"
+    INNINGS_NUMBER = "innings_number"
+    TEAM = "team"
+    POWER_PLAY = "power_play"
+    TARGET = "target"
+    OVERS = "overs"
+
+
+class Overs:
+    OVER_ID = "over_id"
+    INNINGS_ID = "innings_id"
+    OVER_NUMBER = "over_number"
+    DELIVERIES = "deliveries"
+
+
+class Deliveries:
+    DELIVERY_ID = "delivery_id"
+    OVER_ID = "over_id"
+    DELIVERY_NUMBER = "delivery_number"
+    BATTER = "batter"
+    BOWLER = "bowler"
+    NON_STRIKER = "non_striker"
+
+
+class InningsColumns:
+    INNINGS_ID = "innings_id"
+    MATCH_ID = "match_id"
+    INNINGS_NUMBER = "innings_number"
+    TEAM = "team"
+    PLAYERS = "players"
+
+
+class InningsCharts:
+    INNINGS_ID = "innings_id"
+    MATCH_ID = "match_id"
+    INNINGS_NUMBER = "innings_number"
+
+
+class LiveDeliveries:
+    MATCH_KEY = "match_key"
+    SEQUENCE = "sequence"
+    INNINGS_NUMBER = "innings_number"
+    TEAM = "team"
+    OVER_NUMBER = "over_number"
+    DELIVERY = "delivery"
+    RECEIVED_AT = "received_at"
+
+
+class LiveMatches:
+    MATCH_KEY = "match_key"
+    FINISHED_AT = "finished_at"
+
+
+class SourceFiles:
+    CRIC_SHEET_ID = "cric_sheet_id"
+    MATCH_ID = "match_id"
+    REVISION = "revision"
+    DATA_VERSION = "data_version"
+    CONTENT_HASH = "content_hash"
+    LAYOUT = "layout"
+    INGESTED_AT = "ingested_at"
@@ -1,10 +1,11 @@
+from db.settings import mongo_settings
 from shared import db_adapters
 
 
 class CricketDatabaseAdapterBuilder(db_adapters.DatabaseAdapterBuilder):
 
     def __init__(self):
-        super().__init__("mongodb://localhost:27017", "cricket")
+        super().__init__(mongo_settings.uri, mongo_settings.database, client_options=mongo_settings.client_options())
 
 
 class DatabaseAdapter:
@@ -20,16 +21,30 @@ class Collections:
     INNINGS: str = "innings"
     OVERS: str = "overs"
     DELIVERIES: str = "deliveries"
+    INNINGS_COLUMNS: str = "innings_columns"
+    LIVE_DELIVERIES: str = "live_deliveries"
+    LIVE_MATCHES: str = "live_matches"
+    SOURCE_FILES: str = "source_files"
+    INNINGS_CHARTS: str = "innings_charts"
+
+
+class Caches:
+    # Small dimension collections that are looked up by natural key over and over
+    DIMENSIONS: db_adapters.QueryCache = db_adapters.QueryCache(max_entries=50000, ttl=600.0)
 
 
 class CollectionAdapters:
-    TEAMS: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET, Collections.TEAMS)
+    TEAMS: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET, Collections.TEAMS,
+                                                                         cache=Caches.DIMENSIONS)
 
-    PLAYERS: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET, Collections.PLAYERS)
+    PLAYERS: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET, Collections.PLAYERS,
+                                                                           cache=Caches.DIMENSIONS)
 
-    SERIES: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET, Collections.SERIES)
+    SERIES: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET, Collections.SERIES,
+                                                                          cache=Caches.DIMENSIONS)
 
-    STADIUM: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET, Collections.STADIUM)
+    STADIUM: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET, Collections.STADIUM,
+                                                                           cache=Caches.DIMENSIONS)
 
     MATCHES: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET, Collections.MATCHES)
 
@@ -39,3 +54,18 @@ class CollectionAdapters:
 
     DELIVERIES: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET,
                                                                               Collections.DELIVERIES)
+
+    INNINGS_COLUMNS: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET,
+                                                                                   Collections.INNINGS_COLUMNS)
+
+    LIVE_DELIVERIES: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET,
+                                                                                   Collections.LIVE_DELIVERIES)
+
+    LIVE_MATCHES: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET,
+                                                                                Collections.LIVE_MATCHES)
+
+    SOURCE_FILES: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET,
+                                                                                Collections.SOURCE_FILES)
+
+    INNINGS_CHARTS: db_adapters.CollectionAdapter = db_adapters.CollectionAdapter(DatabaseAdapter.CRICKET,
+                                                                                  Collections.INNINGS_CHARTS)
@@ -0,0 +1,50 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic_settings import BaseSettings
+from pydantic_settings import SettingsConfigDict
+
+
+class MongoSettings(BaseSettings):
+    """Connection and pool settings, read from `MONGO_*` environment variables or a `.env` file."""
+    model_config = SettingsConfigDict(env_prefix="MONGO_", env_file=".env", extra="ignore")
+
+    uri: str = "mongodb://localhost:27017"
+    database: str = "cricket"
+
+    max_pool_size: int = 100
+    min_pool_size: int = 10
+    max_idle_time_ms: Optional[int] = 300000
+    connect_timeout_ms: int = 5000
+    server_selection_timeout_ms: int = 5000
+    # Comma separated list such as "zstd,snappy"; needs the zstandard / python-snappy packages
+    compressors: str = ""
+
+    # Connections opened by the API before it starts serving requests
+    warm_up_connections: int = 10
+
+    # Comma separated collections the API copies into memory at start and serves from there, e.g. "series,matches";
+    # meant for data that no longer changes, since writes made through the API only reach the in-memory copy
+    snapshot_collections: str = ""
+
+    # Operations slower than this are logged with their redacted query shape; unset to turn the log off
+    slow_operation_ms: Optional[float] = 100.0
+    # One in this many documents is BSON encoded to estimate bytes transferred; 0 turns byte counting off
+    metrics_byte_sample: int = 100
+
+    def client_options(self) -> Dict[str, Any]:
+        options = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+        }
+        if self.compressors:
+            options["compressors"] = self.compressors
+        return options
+
+    def snapshot_collection_names(self) -> List[str]:
+        return [name.strip() for name in self.snapshot_collections.split(",") if name.strip()]
+
+
+mongo_settings = MongoSettings()
@@ -0,0 +1,95 @@
+import typing
+
+import numpy as np
+
+from shared.models import cricket
+
+# Series of `InningsChartModel` with one element per over
+OVER_SERIES = ("over_runs", "over_wickets", "run_rate", "required_rate")
+
+
+def _packed(values: np.ndarray, dtype: str) -> bytes:
+    return np.ascontiguousarray(values, dtype=dtype).tobytes()
+
+
+def build_chart(columns: cricket.InningsColumnsModel,
+                /,
+                balls_per_over: int = 6,
+                target: typing.Optional[cricket.TargetModel] = None) -> cricket.InningsChartModel:
+    """Derives the worm, Manhattan, run-rate and required-rate series and the wicket markers of an innings."""
+    runs = columns.runs_total().astype(np.int32)
+    legal = columns.legal()
+    over = columns.column("over").astype(np.intp)
+    wicket_ball = columns.column("wicket_ball")
+    overs = int(over.max()) + 1 if len(over) else 0
+
+    over_runs = np.bincount(over, weights=runs, minlength=overs)
+    over_balls = np.cumsum(np.bincount(over, weights=legal, minlength=overs))
+    over_wickets = np.bincount(over[wicket_ball], minlength=overs)
+    scored = np.cumsum(over_runs)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        run_rate = np.where(over_balls > 0, scored * balls_per_over / over_balls, 0.0)
+        if target is not None and target.overs:
+            remaining_balls = target.overs * balls_per_over - over_balls
+            remaining_runs = np.maximum(target.runs - scored, 0)
+            required_rate = np.where(remaining_balls > 0, remaining_runs * balls_per_over / remaining_balls, np.nan)
+        else:
+            required_rate = np.zeros(0)
+
+    return cricket.InningsChartModel(
+        innings_id=columns.innings_id,
+        match_id=columns.match_id,
+        innings_number=columns.innings_number,
+        team=columns.team,
+        balls_per_over=balls_per_over,
+        target_runs=target.runs if target is not None else None,
+        target_overs=target.overs if target is not None else None,
+        legal_balls=_packed(np.cumsum(legal), "<u2"),
+        score=_packed(np.cumsum(runs), "<i2"),
+        wicket_ball=_packed(wicket_ball, "<u2"),
+        over_runs=_packed(over_runs, "<i2"),
+        over_wickets=_packed(over_wickets, "<u1"),
+        run_rate=_packed(run_rate, "<f4"),
+        required_rate=_packed(required_rate, "<f4"),
+    )
+
+
+def _sample(length: int, points: int) -> np.ndarray:
+    """Evenly spaced indices that always keep the first and last element."""
+    return np.unique(np.linspace(0, length - 1, points).round().astype(np.intp))
+
+
+def chart_series(chart: cricket.InningsChartModel,
+                 /,
+                 points: typing.Optional[int] = None) -> typing.Dict[str, np.ndarray]:
+    """Chart series ready to draw, with wicket markers as `(wicket_balls, wicket_score)` points.
+
+    With `points`, the worm keeps at most that many evenly spaced deliveries (wicket markers stay exact), and
+    per-over series longer than `points` are merged into that many buckets: runs and wickets are summed, rates are
+    taken at the end of each bucket.
+    """
+    legal_balls, score = chart.column("legal_balls"), chart.column("score")
+    wicket_ball = chart.column("wicket_ball").astype(np.intp)
+    series = {"wicket_balls": legal_balls[wicket_ball], "wicket_score": score[wicket_ball]}
+
+    if points is not None and len(score) > points:
+        kept = _sample(len(score), points)
+        legal_balls, score = legal_balls[kept], score[kept]
+    series["legal_balls"], series["score"] = legal_balls, score
+
+    over_runs = chart.column("over_runs")
+    if points is not None and len(over_runs) > points:
+        ends = _sample(len(over_runs), points)
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        series["over_numbers"] = ends.astype("<u2")
+        series["over_runs"] = np.add.reduceat(over_runs, starts).astype("<i2")
+        series["over_wickets"] = np.add.reduceat(chart.column("over_wickets"), starts).astype("<u1")
+        series["run_rate"] = chart.column("run_rate")[ends]
+        required_rate = chart.column("required_rate")
+        series["required_rate"] = required_rate[ends] if len(required_rate) else required_rate
+    else:
+        series["over_numbers"] = np.arange(len(over_runs), dtype="<u2")
+        for name in OVER_SERIES:
+            series[name] = chart.column(name)
+    return series
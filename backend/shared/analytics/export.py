@@ -0,0 +1,383 @@
+import hashlib
+import json
+import os
+import shutil
+import typing
+from urllib.parse import quote
+
+import numpy as np
+from bson import ObjectId
+
+from db import collection_structures as coll
+from db.db import CollectionAdapters
+from shared.analytics.frame import DeliveryFrame
+from shared.analytics.frame import PHASES
+from shared.analytics.store import DeliveryFilter
+from shared.analytics.store import load_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, only needed to write or read exports
+    pa = pq = None
+
+# Series fields the export is partitioned by, outermost first
+PARTITION_KEYS = (coll.Series.GENDER, coll.Series.MATCH_TYPE, coll.Series.SEASON)
+
+# Parquet tables written per partition, each under its own directory of the export root
+TABLES = ("matches", "innings", "deliveries", "players")
+
+# Directory of the export root holding the uncompressed Arrow copy of the deliveries for `read_frame`
+MAPPED = "mapped"
+
+# Fingerprint each partition was last written from, kept in the export root
+MANIFEST = "_manifest.json"
+
+# Bumped when the exported schema changes so the next run rewrites every partition
+EXPORT_VERSION = 1
+
+# Schema metadata holding the ids of the players behind the player dictionary codes, in code order
+PLAYERS_METADATA = b"gameviz.players"
+
+# Partition values in `PARTITION_KEYS` order
+Partition = typing.Tuple[str, str, str]
+
+
+def require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("Parquet export needs pyarrow: pip install pyarrow")
+
+
+def partition_path(values: typing.Sequence[str]) -> str:
+    """Hive-style path of a partition, e.g. `gender=male/match_type=T20/season=2007%2F08`."""
+    return "/".join(f"{key}={quote(value, safe='')}" for key, value in zip(PARTITION_KEYS, values))
+
+
+async def _names(adapter, ids: typing.Iterable[ObjectId], *fields: str) -> typing.Dict[ObjectId, typing.Any]:
+    """`fields` of the documents with the given ids; the value itself when only one field is asked for."""
+    names = {}
+    cursor = await adapter.find_documents({"_id": {"$in": list(set(ids))}}, projection={field: 1 for field in fields},
+                                          batch_size=1000)
+    async for document in cursor:
+        names[document["_id"]] = document.get(fields[0]) if len(fields) == 1 else document
+    return names
+
+
+def _coded(codes: np.ndarray, dictionary: typing.List[typing.Optional[str]], index_type) -> "pa.DictionaryArray":
+    """Dictionary column from codes into `dictionary`; negative codes are nulls."""
+    missing = codes < 0
+    indices = pa.array(codes, type=index_type, mask=missing if missing.any() else None)
+    return pa.DictionaryArray.from_arrays(indices, pa.array(dictionary, type=pa.string()))
+
+
+def _joined(chunks: typing.List[np.ndarray], dtype) -> np.ndarray:
+    return np.concatenate(chunks).astype(dtype, copy=False) if chunks else np.zeros(0, dtype=dtype)
+
+
+class ParquetExporter:
+    """Writes matches, innings, deliveries and players to Parquet, partitioned by the gender, match type and
+    season of their series, for analysis away from the database.
+
+    Player, team and other repeated text columns are dictionary encoded. Each partition's deliveries are also
+    written as an uncompressed Arrow file that `shared.analytics.mapped.read_frame` memory-maps. A partition is
+    only rewritten when the matches in it or their source files changed since the last run (see `MANIFEST`).
+    """
+
+    def __init__(self,
+                 root: str,
+                 /,
+                 full: bool = False,
+                 compression: str = "zstd") -> None:
+        require_pyarrow()
+        self.root = root
+        self.full = full
+        self.compression = compression
+        self.exported = 0
+        self.skipped = 0
+        self.removed = 0
+        self.deliveries = 0
+
+    async def export(self) -> None:
+        manifest = {} if self.full else self._read_manifest()
+        partitions = await self._partitions()
+
+        current = set()
+        for values, series_ids in sorted(partitions.items()):
+            path = partition_path(values)
+            fingerprint, matches = await self._fingerprint(series_ids)
+            if not matches:
+                continue
+            current.add(path)
+            if manifest.get(path) == fingerprint:
+                self.skipped += 1
+                continue
+
+            tables = await self._tables(values, series_ids)
+            self._write(path, tables)
+            self.exported += 1
+            self.deliveries += tables["deliveries"].num_rows
+            manifest[path] = fingerprint
+            self._write_manifest(manifest)
+
+        for path in set(manifest) - current:
+            for directory in (*TABLES, MAPPED):
+                shutil.rmtree(os.path.join(self.root, directory, path), ignore_errors=True)
+            del manifest[path]
+            self.removed += 1
+        self._write_manifest(manifest)
+
+    @staticmethod
+    async def _partitions() -> typing.Dict[Partition, typing.List[ObjectId]]:
+        partitions: typing.Dict[Partition, typing.List[ObjectId]] = {}
+        cursor = await CollectionAdapters.SERIES.find_documents({}, projection={key: 1 for key in PARTITION_KEYS})
+        async for series in cursor:
+            values = typing.cast(Partition, tuple(str(series.get(key, "")) for key in PARTITION_KEYS))
+            partitions.setdefault(values, []).append(series["_id"])
+        return partitions
+
+    @staticmethod
+    async def _fingerprint(series_ids: typing.List[ObjectId]) -> typing.Tuple[str, int]:
+        """Digest of the partition's matches and the content hashes of the files they were loaded from."""
+        matches = {}
+        cursor = await CollectionAdapters.MATCHES.find_documents({coll.Matches.SERIES: {"$in": series_ids}},
+                                                                 projection={coll.Matches.CRIC_SHEET_ID: 1},
+                                                                 batch_size=1000)
+        async for match in cursor:
+            matches[str(match.get(coll.Matches.CRIC_SHEET_ID, match["_id"]))] = match["_id"]
+
+        sources = {}
+        cursor = await CollectionAdapters.SOURCE_FILES.find_documents(
+            {coll.SourceFiles.CRIC_SHEET_ID: {"$in": list(matches)}},
+            projection={coll.SourceFiles.CRIC_SHEET_ID: 1, coll.SourceFiles.CONTENT_HASH: 1,
+                        coll.SourceFiles.LAYOUT: 1},
+            batch_size=1000)
+        async for source in cursor:
+            sources[source[coll.SourceFiles.CRIC_SHEET_ID]] = (f"{source.get(coll.SourceFiles.CONTENT_HASH, '')}"
+                                                               f":{source.get(coll.SourceFiles.LAYOUT, '')}")
+
+        # Matches stored without a manifest entry (e.g. by parse_data.py) only count by id; use --full after
+        # changing them another way
+        digest = hashlib.blake2b(f"{EXPORT_VERSION}".encode(), digest_size=16)
+        for cric_sheet_id in sorted(matches):
+            digest.update(f"{cric_sheet_id}:{matches[cric_sheet_id]}:{sources.get(cric_sheet_id, '')}\n".encode())
+        return digest.hexdigest(), len(matches)
+
+    @staticmethod
+    async def _tables(values: Partition, series_ids: typing.List[ObjectId]) -> typing.Dict[str, "pa.Table"]:
+        gender, match_type, season = values
+        innings, powerplays, match_types = await load_columns(DeliveryFilter(season=season, match_type=match_type,
+                                                                             gender=gender))
+        frame = DeliveryFrame.from_columns(innings, powerplays=powerplays, match_types=match_types)
+
+        matches = []
+        cursor = await CollectionAdapters.MATCHES.find_documents(
+            {coll.Matches.SERIES: {"$in": series_ids}},
+            projection={field: 1 for field in (coll.Matches.CRIC_SHEET_ID, coll.Matches.SERIES, coll.Matches.DATES,
+                                               coll.Matches.MATCH_NUMBER, coll.Matches.VENUE, coll.Matches.TEAM_1,
+                                               coll.Matches.TEAM_2, coll.Matches.OUTCOME_WINNER,
+                                               coll.Matches.PLAYER_OF_MATCH)},
+            sort=[("_id", 1)],
+            batch_size=1000)
+        async for match in cursor:
+            matches.append(match)
+        # Matches with deliveries first, in the order of the match codes of the deliveries
+        order = {match_id: position for position, match_id in enumerate(frame.match_ids)}
+        matches.sort(key=lambda match: order.get(match["_id"], len(order)))
+
+        targets = {}
+        cursor = await CollectionAdapters.INNINGS.find_documents(
+            {coll.Innings.MATCH_ID: {"$in": [match["_id"] for match in matches]}},
+            projection={coll.Innings.INNINGS_ID: 1, coll.Innings.TARGET: 1},
+            batch_size=1000)
+        async for document in cursor:
+            targets[document[coll.Innings.INNINGS_ID]] = document.get(coll.Innings.TARGET) or {}
+        # Matches ingested with the `documents` layout have innings but no packed columns to export
+        unpacked = len(set(targets) - set(frame.innings_ids))
+        if unpacked:
+            raise ValueError(f"{unpacked} innings in {partition_path(values)} have no innings_columns; re-run the "
+                             f"ingest with --full --layout columnar (or both) before exporting")
+
+        team_ids = [columns.team for columns in innings]
+        for match in matches:
+            team_ids.extend(match.get(side, {}).get("team_id") for side in ("team_1", "team_2"))
+        players = frame.players + [match[coll.Matches.PLAYER_OF_MATCH] for match in matches
+                                   if match.get(coll.Matches.PLAYER_OF_MATCH) is not None]
+
+        series_names = await _names(CollectionAdapters.SERIES, series_ids, coll.Series.NAME)
+        venue_names = await _names(CollectionAdapters.STADIUM, (match.get(coll.Matches.VENUE) for match in matches),
+                                   coll.Stadium.NAME)
+        team_names = await _names(CollectionAdapters.TEAMS, team_ids, coll.Teams.NAME)
+        player_documents = await _names(CollectionAdapters.PLAYERS, players, coll.Players.NAME,
+                                        coll.Players.CRIC_SHEET_ID)
+        player_names = {player: document.get(coll.Players.NAME) for player, document in player_documents.items()}
+
+        return {
+            "matches": _matches_table(matches, series_names, venue_names, team_names, player_names),
+            "innings": _innings_table(innings, targets, team_names),
+            "deliveries": _deliveries_table(frame, innings, team_names, player_names),
+            "players": pa.table({
+                "player_id": pa.array([str(player) for player in frame.players], type=pa.string()),
+                "cric_sheet_id": pa.array([player_documents.get(player, {}).get(coll.Players.CRIC_SHEET_ID)
+                                           for player in frame.players], type=pa.string()),
+                "name": pa.array([player_names.get(player) for player in frame.players], type=pa.string()),
+            }),
+        }
+
+    def _write(self, path: str, tables: typing.Dict[str, "pa.Table"]) -> None:
+        """Writes a partition into a staging directory first so readers never see a half-written file."""
+        staging = os.path.join(self.root, "_staging")
+        shutil.rmtree(staging, ignore_errors=True)
+
+        written = {}
+        for name, table in tables.items():
+            directory = os.path.join(staging, name)
+            os.makedirs(directory)
+            pq.write_table(table, os.path.join(directory, "data.parquet"), compression=self.compression)
+            written[name] = directory
+
+        directory = os.path.join(staging, MAPPED)
+        os.makedirs(directory)
+        deliveries = tables["deliveries"].combine_chunks()
+        with pa.OSFile(os.path.join(directory, "deliveries.arrow"), "wb") as sink:
+            # One record batch, so every column of the partition is a single contiguous buffer in the file
+            with pa.ipc.new_file(sink, deliveries.schema) as writer:
+                writer.write_table(deliveries, max_chunksize=max(deliveries.num_rows, 1))
+        written[MAPPED] = directory
+
+        for name, directory in written.items():
+            target = os.path.join(self.root, name, path)
+            shutil.rmtree(target, ignore_errors=True)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(directory, target)
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def _read_manifest(self) -> typing.Dict[str, str]:
+        try:
+            with open(os.path.join(self.root, MANIFEST)) as manifest:
+                return json.load(manifest)
+        except FileNotFoundError:
+            return {}
+
+    def _write_manifest(self, manifest: typing.Dict[str, str]) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, MANIFEST)
+        with open(path + ".tmp", "w") as file:
+            json.dump(manifest, file, indent=1, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+
+def _matches_table(matches: typing.List[dict],
+                   series_names: typing.Dict[ObjectId, str],
+                   venue_names: typing.Dict[ObjectId, str],
+                   team_names: typing.Dict[ObjectId, str],
+                   player_names: typing.Dict[ObjectId, str]) -> "pa.Table":
+    def team(match: dict, side: str) -> typing.Optional[str]:
+        return team_names.get(match.get(side, {}).get("team_id"))
+
+    return pa.table({
+        "match_id": pa.array([str(match["_id"]) for match in matches], type=pa.string()),
+        "cric_sheet_id": pa.array([match.get(coll.Matches.CRIC_SHEET_ID) for match in matches], type=pa.string()),
+        "series": pa.array([series_names.get(match.get(coll.Matches.SERIES)) for match in matches],
+                           type=pa.string()).dictionary_encode(),
+        "date": pa.array([(match.get(coll.Matches.DATES) or [None])[0] for match in matches],
+                         type=pa.timestamp("ms")),
+        "match_number": pa.array([match.get(coll.Matches.MATCH_NUMBER) for match in matches], type=pa.int32()),
+        "venue": pa.array([venue_names.get(match.get(coll.Matches.VENUE)) for match in matches],
+                          type=pa.string()).dictionary_encode(),
+        "team_1": pa.array([team(match, "team_1") for match in matches], type=pa.string()).dictionary_encode(),
+        "team_2": pa.array([team(match, "team_2") for match in matches], type=pa.string()).dictionary_encode(),
+        "winner": pa.array([(match.get("outcome") or {}).get("winner") for match in matches],
+                           type=pa.string()).dictionary_encode(),
+        "player_of_match": pa.array([player_names.get(match.get(coll.Matches.PLAYER_OF_MATCH)) for match in matches],
+                                    type=pa.string()),
+    })
+
+
+def _innings_table(innings: typing.List[typing.Any],
+                   targets: typing.Dict[ObjectId, dict],
+                   team_names: typing.Dict[ObjectId, str]) -> "pa.Table":
+    return pa.table({
+        "innings_id": pa.array([str(columns.innings_id) for columns in innings], type=pa.string()),
+        "match_id": pa.array([str(columns.match_id) for columns in innings], type=pa.string()),
+        "innings_number": pa.array([columns.innings_number for columns in innings], type=pa.int8()),
+        "team": pa.array([team_names.get(columns.team) for columns in innings], type=pa.string()).dictionary_encode(),
+        "balls": pa.array([columns.balls for columns in innings], type=pa.int32()),
+        "runs": pa.array([int(columns.runs_total().sum()) for columns in innings], type=pa.int32()),
+        "wickets": pa.array([len(columns.column("wicket_ball")) for columns in innings], type=pa.int16()),
+        "target_runs": pa.array([targets.get(columns.innings_id, {}).get("runs") for columns in innings],
+                                type=pa.int32()),
+        "target_overs": pa.array([targets.get(columns.innings_id, {}).get("overs") for columns in innings],
+                                 type=pa.int16()),
+    })
+
+
+def _deliveries_table(frame: DeliveryFrame,
+                      innings: typing.List[typing.Any],
+                      team_names: typing.Dict[ObjectId, str],
+                      player_names: typing.Dict[ObjectId, str]) -> "pa.Table":
+    """One row per delivery; the frame's own columns plus what only the packed innings hold."""
+    player_codes = {player: code for code, player in enumerate(frame.players)}
+    team_codes: typing.Dict[ObjectId, int] = {}
+    kind_codes: typing.Dict[str, int] = {}
+    parts: typing.Dict[str, typing.List[np.ndarray]] = {
+        name: [] for name in ("innings_number", "batting_team", "ball", "non_striker", "wicket", "wicket_kind",
+                              "player_out", "other_wicket_kind", "other_player_out")}
+
+    for columns in innings:
+        balls = columns.balls
+        codes = np.array([player_codes[player] for player in columns.players], dtype=np.int32)
+        kinds = np.array([kind_codes.setdefault(kind, len(kind_codes)) for kind in columns.wicket_kinds],
+                         dtype=np.int32)
+        parts["innings_number"].append(np.full(balls, columns.innings_number, dtype=np.int8))
+        parts["batting_team"].append(np.full(balls, team_codes.setdefault(columns.team, len(team_codes)),
+                                             dtype=np.int32))
+        parts["ball"].append(columns.column("ball"))
+        parts["non_striker"].append(codes[columns.column("non_striker")])
+        parts["wicket"].append(columns.column("wicket"))
+
+        # A delivery rarely has two wickets (e.g. a run out and a retirement); the second goes to the other_ columns
+        wicket_ball = columns.column("wicket_ball").astype(np.intp)
+        wicket_player = codes[columns.column("wicket_player")]
+        wicket_kind = kinds[columns.column("wicket_kind")]
+        _, first = np.unique(wicket_ball, return_index=True)
+        for prefix, picked in (("", first), ("other_", np.setdiff1d(np.arange(len(wicket_ball)), first))):
+            player_out = np.full(balls, -1, dtype=np.int32)
+            kind = np.full(balls, -1, dtype=np.int32)
+            player_out[wicket_ball[picked]] = wicket_player[picked]
+            kind[wicket_ball[picked]] = wicket_kind[picked]
+            parts[f"{prefix}player_out"].append(player_out)
+            parts[f"{prefix}wicket_kind"].append(kind)
+
+    dtypes = {"innings_number": np.int8, "ball": np.uint8, "wicket": bool}
+    extra = {name: _joined(chunks, dtypes.get(name, np.int32)) for name, chunks in parts.items()}
+    players = [player_names.get(player) for player in frame.players]
+    teams = [team_names.get(team) for team in team_codes]
+    kinds = list(kind_codes)
+
+    table = pa.table({
+        "match_id": _coded(frame.match, [str(match) for match in frame.match_ids], pa.int32()),
+        "innings_id": _coded(frame.innings, [str(innings_id) for innings_id in frame.innings_ids], pa.int32()),
+        "innings_number": pa.array(extra["innings_number"]),
+        "batting_team": _coded(extra["batting_team"], teams, pa.int32()),
+        "over": pa.array(frame.over),
+        "ball": pa.array(extra["ball"]),
+        "batter": _coded(frame.batter, players, pa.int32()),
+        "bowler": _coded(frame.bowler, players, pa.int32()),
+        "non_striker": _coded(extra["non_striker"], players, pa.int32()),
+        "runs_batter": pa.array(frame.runs_batter),
+        "runs_extras": pa.array(frame.runs_extras),
+        "wide": pa.array(frame.wide),
+        "no_ball": pa.array(frame.no_ball),
+        "bye": pa.array(frame.bye),
+        "leg_bye": pa.array(frame.leg_bye),
+        "wicket": pa.array(extra["wicket"]),
+        "wicket_kind": _coded(extra["wicket_kind"], kinds, pa.int8()),
+        "player_out": _coded(extra["player_out"], players, pa.int32()),
+        "other_wicket_kind": _coded(extra["other_wicket_kind"], kinds, pa.int8()),
+        "other_player_out": _coded(extra["other_player_out"], players, pa.int32()),
+        "bowler_wickets": pa.array(frame.bowler_wickets),
+        "phase": _coded(frame.phase, list(PHASES), pa.int8()),
+    })
+    return table.replace_schema_metadata({
+        PLAYERS_METADATA: " ".join(str(player) for player in frame.players).encode(),
+    })
@@ -0,0 +1,258 @@
+import typing
+
+import numpy as np
+from bson import ObjectId
+
+from shared.models import cricket
+from shared.scoring.scorecard import BOWLER_WICKETS
+
+POWERPLAY, MIDDLE, DEATH = 0, 1, 2
+PHASES = ("powerplay", "middle", "death")
+
+# First over (0-based) of the death phase per match type; formats not listed have no death phase
+DEATH_FROM = {"T20": 15, "IT20": 15, "ODI": 40, "ODM": 40}
+# Powerplay used when an innings does not record one
+DEFAULT_POWERPLAY = {"T20": 6, "IT20": 6, "ODI": 10, "ODM": 10}
+
+_COLUMNS = ("match", "innings", "over", "batter", "bowler", "runs_batter", "runs_extras",
+            "wide", "no_ball", "bye", "leg_bye", "bowler_wickets", "phase")
+
+
+class DeliveryFrame:
+    """Ball-by-ball data of many innings as flat NumPy columns with players encoded as small integers."""
+    players: typing.List[ObjectId]
+    innings_ids: typing.List[ObjectId]
+    match_ids: typing.List[ObjectId]
+
+    def __init__(self, columns: typing.Dict[str, np.ndarray], dismissed: np.ndarray, dismissed_innings: np.ndarray,
+                 players: typing.List[ObjectId], innings_ids: typing.List[ObjectId],
+                 match_ids: typing.List[ObjectId]) -> None:
+        for name in _COLUMNS:
+            setattr(self, name, columns[name])
+        # Player code of every dismissal and the innings code it happened in
+        self.dismissed = dismissed
+        self.dismissed_innings = dismissed_innings
+        self.players = players
+        self.innings_ids = innings_ids
+        self.match_ids = match_ids
+
+    @classmethod
+    def from_columns(cls,
+                     innings: typing.Iterable[cricket.InningsColumnsModel],
+                     /,
+                     powerplays: typing.Optional[typing.Dict[ObjectId, typing.Optional[dict]]] = None,
+                     match_types: typing.Optional[typing.Dict[ObjectId, str]] = None) -> "DeliveryFrame":
+        """Concatenates packed innings; only the per-innings player tables are remapped in Python."""
+        powerplays = powerplays or {}
+        match_types = match_types or {}
+        player_codes: typing.Dict[ObjectId, int] = {}
+        match_codes: typing.Dict[ObjectId, int] = {}
+        innings_ids = []
+        parts = {name: [] for name in _COLUMNS}
+        dismissed = []
+        dismissed_innings = []
+
+        for index, columns in enumerate(innings):
+            innings_ids.append(columns.innings_id)
+            codes = np.array([player_codes.setdefault(player, len(player_codes)) for player in columns.players],
+                             dtype=np.int32)
+            balls = columns.balls
+            over = columns.column("over")
+
+            wicket_ball = columns.column("wicket_ball")
+            credited = np.array([kind in BOWLER_WICKETS for kind in columns.wicket_kinds], dtype=bool)
+            bowler_wickets = np.zeros(balls, dtype=np.int8)
+            if len(wicket_ball):
+                np.add.at(bowler_wickets, wicket_ball, credited[columns.column("wicket_kind")])
+                dismissed.append(codes[columns.column("wicket_player")])
+                dismissed_innings.append(np.full(len(wicket_ball), index, dtype=np.int32))
+
+            match_type = match_types.get(columns.match_id, "")
+            parts["match"].append(np.full(balls, match_codes.setdefault(columns.match_id, len(match_codes)),
+                                          dtype=np.int32))
+            parts["innings"].append(np.full(balls, index, dtype=np.int32))
+            parts["over"].append(over)
+            parts["batter"].append(codes[columns.column("batter")])
+            parts["bowler"].append(codes[columns.column("bowler")])
+            parts["runs_batter"].append(columns.column("runs_batter"))
+            parts["runs_extras"].append(columns.column("runs_extras"))
+            parts["wide"].append(columns.column("wides"))
+            parts["no_ball"].append(columns.column("no_balls"))
+            parts["bye"].append(columns.column("byes"))
+            parts["leg_bye"].append(columns.column("leg_byes"))
+            parts["bowler_wickets"].append(bowler_wickets)
+            parts["phase"].append(_phases(over, powerplays.get(columns.innings_id), match_type))
+
+        dtypes = {"match": np.int32, "innings": np.int32, "over": np.int16, "batter": np.int32, "bowler": np.int32,
+                  "runs_batter": np.int16, "runs_extras": np.int16, "wide": bool, "no_ball": bool, "bye": bool,
+                  "leg_bye": bool, "bowler_wickets": np.int8, "phase": np.int8}
+        merged = {name: np.concatenate(chunks).astype(dtypes[name], copy=False) if chunks
+                  else np.zeros(0, dtype=dtypes[name]) for name, chunks in parts.items()}
+        return cls(merged,
+                   np.concatenate(dismissed).astype(np.int32, copy=False) if dismissed else np.zeros(0, np.int32),
+                   np.concatenate(dismissed_innings) if dismissed_innings else np.zeros(0, np.int32),
+                   list(player_codes), innings_ids, list(match_codes))
+
+    @classmethod
+    def concatenate(cls, frames: typing.Sequence["DeliveryFrame"], /) -> "DeliveryFrame":
+        """Joins frames into one, remapping their player and match codes; a single frame is returned as is."""
+        if len(frames) == 1:
+            return frames[0]
+
+        player_codes: typing.Dict[ObjectId, int] = {}
+        match_codes: typing.Dict[ObjectId, int] = {}
+        innings_ids: typing.List[ObjectId] = []
+        parts = {name: [] for name in _COLUMNS}
+        dismissed = []
+        dismissed_innings = []
+
+        for frame in frames:
+            players = np.array([player_codes.setdefault(player, len(player_codes)) for player in frame.players],
+                               dtype=np.int32)
+            matches = np.array([match_codes.setdefault(match, len(match_codes)) for match in frame.match_ids],
+                               dtype=np.int32)
+            for name in _COLUMNS:
+                parts[name].append(getattr(frame, name))
+            parts["batter"][-1] = players[frame.batter]
+            parts["bowler"][-1] = players[frame.bowler]
+            parts["match"][-1] = matches[frame.match]
+            parts["innings"][-1] = frame.innings + np.int32(len(innings_ids))
+            dismissed.append(players[frame.dismissed])
+            dismissed_innings.append(frame.dismissed_innings + np.int32(len(innings_ids)))
+            innings_ids.extend(frame.innings_ids)
+
+        empty = cls.from_columns(())
+        merged = {name: np.concatenate(chunks).astype(getattr(empty, name).dtype, copy=False) if chunks
+                  else getattr(empty, name) for name, chunks in parts.items()}
+        return cls(merged, np.concatenate(dismissed).astype(np.int32, copy=False) if dismissed else empty.dismissed,
+                   np.concatenate(dismissed_innings).astype(np.int32, copy=False) if dismissed_innings
+                   else empty.dismissed_innings,
+                   list(player_codes), innings_ids, list(match_codes))
+
+    def select_innings(self, keep: np.ndarray, /) -> "DeliveryFrame":
+        """Frame of the innings whose codes `keep` (a mask over `innings_ids`) selects.
+
+        Player, innings and match codes stay those of this frame, so a view is built with one mask per column and
+        players without a delivery in it simply aggregate to zero.
+        """
+        rows = keep[self.innings]
+        return DeliveryFrame({name: getattr(self, name)[rows] for name in _COLUMNS},
+                             self.dismissed[keep[self.dismissed_innings]],
+                             self.dismissed_innings[keep[self.dismissed_innings]],
+                             self.players, self.innings_ids, self.match_ids)
+
+    def __len__(self) -> int:
+        return len(self.over)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in _COLUMNS) + self.dismissed.nbytes \
+            + self.dismissed_innings.nbytes
+
+    @property
+    def legal(self) -> np.ndarray:
+        return ~(self.wide | self.no_ball)
+
+    @property
+    def runs_total(self) -> np.ndarray:
+        return self.runs_batter + self.runs_extras
+
+    @property
+    def runs_conceded(self) -> np.ndarray:
+        """Runs charged to the bowler: off the bat, wides, and the no-ball penalty (not byes off a no-ball)."""
+        no_ball_runs = np.where(self.bye | self.leg_bye, 1, self.runs_extras)
+        return self.runs_batter + np.where(self.wide, self.runs_extras, np.where(self.no_ball, no_ball_runs, 0))
+
+    def _count(self, codes: np.ndarray, weights: typing.Optional[np.ndarray], by_phase: bool) -> np.ndarray:
+        n = len(self.players)
+        if not by_phase:
+            return np.bincount(codes, weights=weights, minlength=n)
+        grouped = np.bincount(codes * len(PHASES) + self.phase, weights=weights, minlength=n * len(PHASES))
+        return grouped.reshape(n, len(PHASES))
+
+    def batting(self, /, by_phase: bool = False) -> typing.Dict[str, np.ndarray]:
+        """Per-player batting aggregates indexed by player code; shape (players, 3) when split by phase."""
+        faced = ~self.wide
+        runs = self._count(self.batter, self.runs_batter, by_phase)
+        balls = self._count(self.batter, faced, by_phase)
+        dots = self._count(self.batter, faced & (self.runs_batter == 0), by_phase)
+        fours = self._count(self.batter, self.runs_batter == 4, by_phase)
+        sixes = self._count(self.batter, self.runs_batter == 6, by_phase)
+        stats = {"runs": runs, "balls": balls, "dots": dots, "fours": fours, "sixes": sixes,
+                 "strike_rate": _ratio(runs * 100, balls),
+                 "dot_pct": _ratio(dots * 100, balls),
+                 "boundary_pct": _ratio((fours + sixes) * 100, balls)}
+        if not by_phase:
+            stats["dismissals"] = np.bincount(self.dismissed, minlength=len(self.players))
+            stats["average"] = _ratio(runs, stats["dismissals"])
+        return stats
+
+    def bowling(self, /, by_phase: bool = False) -> typing.Dict[str, np.ndarray]:
+        """Per-player bowling aggregates indexed by player code; shape (players, 3) when split by phase."""
+        legal = self.legal
+        total = self.runs_total
+        balls = self._count(self.bowler, legal, by_phase)
+        runs = self._count(self.bowler, self.runs_conceded, by_phase)
+        dots = self._count(self.bowler, legal & (total == 0), by_phase)
+        boundaries = self._count(self.bowler, (self.runs_batter == 4) | (self.runs_batter == 6), by_phase)
+        wickets = self._count(self.bowler, self.bowler_wickets, by_phase)
+        return {"balls": balls, "runs": runs, "wickets": wickets, "dots": dots, "boundaries": boundaries,
+                "economy": _ratio(runs * 6, balls),
+                "dot_pct": _ratio(dots * 100, balls),
+                "boundary_pct": _ratio(boundaries * 100, balls),
+                "average": _ratio(runs, wickets),
+                "strike_rate": _ratio(balls, wickets)}
+
+    def runs_per_over(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Average runs scored in each over number across all innings: `(over_numbers, run_rate)`."""
+        if not len(self):
+            return np.zeros(0, dtype=np.int16), np.zeros(0)
+
+        key = self.innings.astype(np.int64) * 1024 + self.over
+        starts = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+        over_runs = np.add.reduceat(self.runs_total.astype(np.int64), starts)
+        overs = self.over[starts]
+        totals = np.bincount(overs, weights=over_runs)
+        counts = np.bincount(overs)
+        present = np.flatnonzero(counts)
+        return present.astype(np.int16), totals[present] / counts[present]
+
+
+def leaderboard(frame: DeliveryFrame,
+                stats: typing.Dict[str, np.ndarray],
+                key: str,
+                /,
+                limit: int = 10,
+                ascending: bool = False,
+                min_balls: int = 0) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Returns the top `limit` players by `stats[key]` as rows carrying every stat for that player."""
+    values = stats[key].astype(np.float64)
+    eligible = np.flatnonzero(stats["balls"] >= max(min_balls, 1))
+    if not len(eligible):
+        return []
+
+    order = values[eligible] if ascending else -values[eligible]
+    limit = min(limit, len(eligible))
+    top = eligible[np.argpartition(order, limit - 1)[:limit]]
+    top = top[np.argsort(values[top] if ascending else -values[top], kind="stable")]
+    return [{"player": frame.players[code], **{name: stats[name][code].item() for name in stats}} for code in top]
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    numerator = np.asarray(numerator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=np.asarray(denominator) > 0)
+
+
+def _phases(over: np.ndarray, power_play: typing.Optional[dict], match_type: str) -> np.ndarray:
+    phase = np.full(len(over), MIDDLE, dtype=np.int8)
+    death_from = DEATH_FROM.get(match_type)
+    if death_from is not None:
+        phase[over >= death_from] = DEATH
+
+    if power_play:
+        # Powerplay bounds are in overs.balls notation, e.g. 0.1 to 5.6 covers overs 0-5
+        first, last = int(power_play["from_over"]), int(power_play["to_over"])
+        phase[(over >= first) & (over <= last)] = POWERPLAY
+    elif match_type in DEFAULT_POWERPLAY:
+        phase[over < DEFAULT_POWERPLAY[match_type]] = POWERPLAY
+    return phase
@@ -0,0 +1,107 @@
+import glob
+import os
+import typing
+from urllib.parse import unquote
+
+import numpy as np
+from bson import ObjectId
+
+from shared.analytics.export import MAPPED
+from shared.analytics.export import PARTITION_KEYS
+from shared.analytics.export import PLAYERS_METADATA
+from shared.analytics.export import require_pyarrow
+from shared.analytics.frame import DeliveryFrame
+from shared.analytics.store import DeliveryFilter
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional dependency, only needed to write or read exports
+    pa = None
+
+
+def _values(array: "pa.Array") -> np.ndarray:
+    """NumPy view of a column's values in the mapped file; dictionary columns give their codes.
+
+    Booleans are bit-packed in Arrow like `BitsetField`, so they are the one kind expanded into a new array.
+    """
+    if pa.types.is_dictionary(array.type):
+        array = array.indices
+    data = array.buffers()[1]
+    if pa.types.is_boolean(array.type):
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=array.offset + len(array), bitorder="little")
+        return bits[array.offset:].view(bool)
+    # Integer type names (int8, uint16, ...) are the same in Arrow and NumPy
+    return np.frombuffer(data, dtype=np.dtype(str(array.type)), count=array.offset + len(array))[array.offset:]
+
+
+def _valid(array: "pa.Array") -> np.ndarray:
+    if array.null_count == 0:
+        return np.ones(len(array), dtype=bool)
+    return _values(array.is_valid())
+
+
+def read_frame(path: str, /) -> DeliveryFrame:
+    """Memory-maps the Arrow deliveries of one exported partition as a `DeliveryFrame`.
+
+    The frame's numeric and code columns are views of the mapped file, so opening even a large partition reads
+    nothing up front and the operating system pages columns in as the analytics touch them.
+    """
+    require_pyarrow()
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    columns = {name: (table.column(name).chunk(0) if table.column(name).num_chunks == 1
+                      else pa.concat_arrays(table.column(name).chunks))
+               for name in table.column_names}
+    if not table.num_rows:
+        return DeliveryFrame.from_columns(())
+
+    metadata = table.schema.metadata or {}
+    players = [ObjectId(player) for player in metadata.get(PLAYERS_METADATA, b"").decode().split()]
+    innings_codes = _values(columns["innings_id"])
+    dismissed = [_values(columns[name])[_valid(columns[name])] for name in ("player_out", "other_player_out")]
+    dismissed_innings = [innings_codes[_valid(columns[name])] for name in ("player_out", "other_player_out")]
+    frame_columns = {
+        "match": _values(columns["match_id"]),
+        "innings": innings_codes,
+        "over": _values(columns["over"]),
+        "batter": _values(columns["batter"]),
+        "bowler": _values(columns["bowler"]),
+        "runs_batter": _values(columns["runs_batter"]),
+        "runs_extras": _values(columns["runs_extras"]),
+        "wide": _values(columns["wide"]),
+        "no_ball": _values(columns["no_ball"]),
+        "bye": _values(columns["bye"]),
+        "leg_bye": _values(columns["leg_bye"]),
+        "bowler_wickets": _values(columns["bowler_wickets"]),
+        "phase": _values(columns["phase"]),
+    }
+    return DeliveryFrame(frame_columns,
+                         np.concatenate(dismissed).astype(np.int32, copy=False),
+                         np.concatenate(dismissed_innings).astype(np.int32, copy=False),
+                         players,
+                         [ObjectId(innings_id) for innings_id in columns["innings_id"].dictionary.to_pylist()],
+                         [ObjectId(match_id) for match_id in columns["match_id"].dictionary.to_pylist()])
+
+
+def partitions(root: str, /) -> typing.Dict[typing.Tuple[str, ...], str]:
+    """Arrow deliveries files of an export keyed by their partition values in `PARTITION_KEYS` order."""
+    pattern = os.path.join(root, MAPPED, *(f"{key}=*" for key in PARTITION_KEYS), "deliveries.arrow")
+    found = {}
+    for path in glob.glob(pattern):
+        parts = os.path.relpath(path, os.path.join(root, MAPPED)).split(os.sep)[:len(PARTITION_KEYS)]
+        found[tuple(unquote(part.split("=", 1)[1]) for part in parts)] = path
+    return found
+
+
+def load_mapped_frame(root: str, delivery_filter: DeliveryFilter, /) -> DeliveryFrame:
+    """Frame of the exported partitions `delivery_filter` selects, read from the export instead of the database.
+
+    A single partition stays memory-mapped; several are concatenated. Only the partition criteria (gender, match
+    type, season) can be used, since the export has no series, team or player index.
+    """
+    if delivery_filter.series is not None or delivery_filter.team is not None or delivery_filter.player is not None:
+        raise ValueError("Exported frames can only be filtered by gender, match type and season")
+
+    wanted = (delivery_filter.gender, delivery_filter.match_type, delivery_filter.season)
+    selected = [path for values, path in sorted(partitions(root).items())
+                if all(value is None or value == found for value, found in zip(wanted, values))]
+    return DeliveryFrame.concatenate([read_frame(path) for path in selected])
@@ -0,0 +1,242 @@
+import asyncio
+import time
+import typing
+from collections import OrderedDict
+
+import numpy as np
+from bson import ObjectId
+
+from db import collection_structures as coll
+from db.db import CollectionAdapters
+from shared.analytics.frame import DeliveryFrame
+from shared.db_adapters.cache import freeze_query
+from shared.models import cricket
+
+# Packed innings, the powerplay of each innings id and the match type of each match id
+LoadedColumns = typing.Tuple[typing.List[cricket.InningsColumnsModel],
+                             typing.Dict[ObjectId, typing.Optional[dict]],
+                             typing.Dict[ObjectId, str]]
+
+# Collections frames are built from; a write through any of them makes the cached frames stale
+FRAME_SOURCES = (CollectionAdapters.SERIES, CollectionAdapters.MATCHES, CollectionAdapters.INNINGS,
+                 CollectionAdapters.INNINGS_COLUMNS)
+
+
+class DeliveryFilter:
+    """Selects the innings an analytics frame is built from; unset criteria match everything."""
+
+    def __init__(self,
+                 /,
+                 series: typing.Optional[ObjectId] = None,
+                 season: typing.Optional[str] = None,
+                 match_type: typing.Optional[str] = None,
+                 gender: typing.Optional[str] = None,
+                 team: typing.Optional[ObjectId] = None,
+                 player: typing.Optional[ObjectId] = None) -> None:
+        self.series = series
+        self.season = season
+        self.match_type = match_type
+        self.gender = gender
+        self.team = team
+        self.player = player
+
+    def key(self) -> typing.Hashable:
+        return freeze_query(vars(self))
+
+    def base(self) -> "DeliveryFilter":
+        """The filter without its team and player, i.e. the season-wide frame those are selected from."""
+        return DeliveryFilter(series=self.series, season=self.season, match_type=self.match_type, gender=self.gender)
+
+    def series_query(self) -> typing.Dict[str, typing.Any]:
+        query = {}
+        if self.season is not None:
+            query[coll.Series.SEASON] = self.season
+        if self.match_type is not None:
+            query[coll.Series.MATCH_TYPE] = self.match_type
+        if self.gender is not None:
+            query[coll.Series.GENDER] = self.gender
+        return query
+
+
+class FrameCache:
+    """LRU of season-wide frames (series, season, match type and gender) bounded by the memory their arrays use.
+
+    Team and player filters select innings of the cached frame instead of loading their own, so every view of a
+    season shares one load. Like `QueryCache`, entries remember the write generations of `FRAME_SOURCES` and are
+    dropped once any of them moves on; `ttl` bounds how long writes made by other processes go unseen.
+    """
+    _clock: typing.Callable[[], float]
+    _frames: "OrderedDict[typing.Hashable, typing.Tuple[float, typing.Tuple[int, ...], DeliveryFrame]]"
+    _loading: typing.Dict[typing.Hashable, asyncio.Future]
+
+    def __init__(self,
+                 /,
+                 max_bytes: int = 512 * 1024 * 1024,
+                 ttl: float = 600.0,
+                 clock: typing.Callable[[], float] = time.monotonic) -> None:
+        self._clock = clock
+        self._frames = OrderedDict()
+        self._loading = {}
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def generation() -> typing.Tuple[int, ...]:
+        return tuple(adapter.generation for adapter in FRAME_SOURCES)
+
+    async def get(self, delivery_filter: DeliveryFilter) -> DeliveryFrame:
+        """Returns the frame for `delivery_filter`, loading its season-wide frame once even when requested
+        concurrently."""
+        frame = await self._season_frame(delivery_filter.base())
+        if delivery_filter.team is None and delivery_filter.player is None:
+            return frame
+        return frame.select_innings(await selected_innings(frame, delivery_filter))
+
+    async def _season_frame(self, delivery_filter: DeliveryFilter) -> DeliveryFrame:
+        key = delivery_filter.key()
+        generation = self.generation()
+        entry = self._frames.get(key)
+        if entry is not None:
+            expires_at, stored_generation, frame = entry
+            if expires_at > self._clock() and stored_generation == generation:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return frame
+            self._discard(key)
+
+        pending = self._loading.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        pending = self._loading[key] = asyncio.get_running_loop().create_future()
+        try:
+            frame = await load_frame(delivery_filter)
+        except BaseException as exc:
+            pending.set_exception(exc)
+            pending.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            pending.set_result(frame)
+            # A frame loaded while its sources were written to may mix old and new innings
+            if self.generation() == generation:
+                self._store(key, generation, frame)
+            return frame
+        finally:
+            del self._loading[key]
+
+    def clear(self) -> None:
+        self._frames.clear()
+        self.nbytes = 0
+
+    def _discard(self, key: typing.Hashable) -> None:
+        _, _, frame = self._frames.pop(key)
+        self.nbytes -= frame.nbytes
+
+    def _store(self, key: typing.Hashable, generation: typing.Tuple[int, ...], frame: DeliveryFrame) -> None:
+        if frame.nbytes > self.max_bytes:
+            return
+        self._frames[key] = (self._clock() + self.ttl, generation, frame)
+        self.nbytes += frame.nbytes
+        while self.nbytes > self.max_bytes:
+            _, (_, _, evicted) = self._frames.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def stats(self) -> typing.Dict[str, int]:
+        return {"entries": len(self._frames), "bytes": self.nbytes, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+
+async def selected_innings(frame: DeliveryFrame, delivery_filter: DeliveryFilter) -> np.ndarray:
+    """Mask over the innings of `frame` that the team and player of `delivery_filter` select, as in `load_columns`:
+    every innings of the team's matches, and the innings the player took part in."""
+    keep = np.ones(len(frame.innings_ids), dtype=bool)
+    if delivery_filter.team is not None:
+        cursor = await CollectionAdapters.MATCHES.find_documents(
+            {"$or": [{coll.Matches.TEAM_1: delivery_filter.team}, {coll.Matches.TEAM_2: delivery_filter.team}]},
+            projection={"_id": 1})
+        matches = {document["_id"] async for document in cursor}
+        wanted = np.fromiter((match_id in matches for match_id in frame.match_ids), dtype=bool,
+                             count=len(frame.match_ids))
+        innings_match = np.zeros(len(frame.innings_ids), dtype=np.int32)
+        innings_match[frame.innings] = frame.match
+        keep &= wanted[innings_match]
+
+    if delivery_filter.player is not None:
+        cursor = await CollectionAdapters.INNINGS_COLUMNS.find_documents(
+            {coll.InningsColumns.PLAYERS: delivery_filter.player}, projection={coll.InningsColumns.INNINGS_ID: 1})
+        innings_ids = {document[coll.InningsColumns.INNINGS_ID] async for document in cursor}
+        keep &= np.fromiter((innings_id in innings_ids for innings_id in frame.innings_ids), dtype=bool,
+                            count=len(frame.innings_ids))
+    return keep
+
+
+async def load_columns(delivery_filter: DeliveryFilter) -> LoadedColumns:
+    """Packed innings selected by `delivery_filter` in match order, with their powerplays and the match types."""
+    series_types: typing.Dict[ObjectId, str] = {}
+    match_query: typing.Dict[str, typing.Any] = {}
+
+    series_query = delivery_filter.series_query()
+    if delivery_filter.series is not None:
+        series_query["_id"] = delivery_filter.series
+    if series_query:
+        cursor = await CollectionAdapters.SERIES.find_documents(series_query,
+                                                                projection={coll.Series.MATCH_TYPE: 1})
+        async for series in cursor:
+            series_types[series["_id"]] = series.get(coll.Series.MATCH_TYPE, "")
+        match_query[coll.Matches.SERIES] = {"$in": list(series_types)}
+
+    if delivery_filter.team is not None:
+        match_query["$or"] = [{coll.Matches.TEAM_1: delivery_filter.team},
+                              {coll.Matches.TEAM_2: delivery_filter.team}]
+
+    match_series: typing.Dict[ObjectId, typing.Optional[ObjectId]] = {}
+    cursor = await CollectionAdapters.MATCHES.find_documents(match_query, projection={coll.Matches.SERIES: 1},
+                                                             batch_size=1000)
+    async for match in cursor:
+        match_series[match["_id"]] = match.get(coll.Matches.SERIES)
+
+    if not series_query:
+        # No series criteria: look up the types of just the series the matches belong to
+        series_ids = list({series_id for series_id in match_series.values() if series_id is not None})
+        cursor = await CollectionAdapters.SERIES.find_documents({"_id": {"$in": series_ids}},
+                                                                projection={coll.Series.MATCH_TYPE: 1})
+        async for series in cursor:
+            series_types[series["_id"]] = series.get(coll.Series.MATCH_TYPE, "")
+    match_types = {match_id: series_types.get(series_id, "") for match_id, series_id in match_series.items()}
+
+    innings_query: typing.Dict[str, typing.Any] = {coll.InningsColumns.MATCH_ID: {"$in": list(match_types)}}
+    if delivery_filter.player is not None:
+        innings_query[coll.InningsColumns.PLAYERS] = delivery_filter.player
+
+    # Written by the ingest, so decoded without re-validating every column
+    innings = [columns async for columns in cricket.InningsColumnsModel.find(
+        innings_query,
+        sort=[(coll.InningsColumns.MATCH_ID, 1), (coll.InningsColumns.INNINGS_NUMBER, 1)],
+        batch_size=500,
+        trusted=True)]
+
+    powerplays = {}
+    cursor = await CollectionAdapters.INNINGS.find_documents(
+        {coll.Innings.INNINGS_ID: {"$in": [columns.innings_id for columns in innings]}},
+        projection={coll.Innings.INNINGS_ID: 1, coll.Innings.POWER_PLAY: 1},
+        batch_size=1000)
+    async for document in cursor:
+        powerplays[document[coll.Innings.INNINGS_ID]] = document.get(coll.Innings.POWER_PLAY)
+
+    return innings, powerplays, match_types
+
+
+async def load_frame(delivery_filter: DeliveryFilter) -> DeliveryFrame:
+    """Loads the packed innings selected by `delivery_filter` and concatenates them into one frame."""
+    innings, powerplays, match_types = await load_columns(delivery_filter)
+    return DeliveryFrame.from_columns(innings, powerplays=powerplays, match_types=match_types)
+
+
+frames = FrameCache()
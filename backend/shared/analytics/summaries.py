@@ -0,0 +1,82 @@
+import typing
+
+from bson import ObjectId
+
+from db import collection_structures as coll
+from shared.models import cricket
+from shared.models.common.aggregation import Avg
+from shared.models.common.aggregation import Count
+from shared.models.common.aggregation import Row
+from shared.models.common.aggregation import Sum
+
+# Paths inside the innings scoreboard the summaries read
+_BATTING = "scoreboard.batting_performance"
+_FINAL_RUNS = "scoreboard.final_score.total_runs"
+
+
+async def _series_ids(season: typing.Optional[str],
+                      match_type: typing.Optional[str]) -> typing.Optional[typing.List[ObjectId]]:
+    query = {key: value for key, value in ((coll.Series.SEASON, season), (coll.Series.MATCH_TYPE, match_type))
+             if value is not None}
+    if not query:
+        return None
+    return [series.id async for series in cricket.Series.find(query, fields=[coll.Series.NAME], trusted=True)]
+
+
+async def top_run_scorers(season: str,
+                          /,
+                          match_type: typing.Optional[str] = None,
+                          limit: int = 10) -> typing.List[Row]:
+    """Batters with the most runs in a season, from the innings scoreboards: `player`, `runs`, `balls`, `innings`,
+    `fours`, `sixes` and `strike_rate`."""
+    series_ids = await _series_ids(season, match_type)
+    pipeline = cricket.Match.aggregate() \
+        .match({coll.Matches.SERIES: {"$in": series_ids}}) \
+        .lookup(cricket.InningsModel, "_id", coll.Innings.MATCH_ID, into="innings") \
+        .unwind("innings") \
+        .unwind(f"innings.{_BATTING}") \
+        .group(f"innings.{_BATTING}.player",
+               runs=Sum(f"innings.{_BATTING}.runs"),
+               balls=Sum(f"innings.{_BATTING}.balls_faced"),
+               innings=Count(),
+               fours=Sum(f"innings.{_BATTING}.fours"),
+               sixes=Sum(f"innings.{_BATTING}.sixes")) \
+        .sort(("runs", -1), ("balls", 1)) \
+        .limit(limit) \
+        .project("runs", "balls", "innings", "fours", "sixes", _id=0, player="_id",
+                 strike_rate={"$cond": [{"$gt": ["$balls", 0]},
+                                        {"$multiply": [{"$divide": ["$runs", "$balls"]}, 100]}, 0]})
+    return await pipeline.to_list(limit)
+
+
+async def team_wins(season: typing.Optional[str] = None,
+                    match_type: typing.Optional[str] = None) -> typing.List[Row]:
+    """Number of matches each team won, most first: `team` and `wins`."""
+    query: typing.Dict[str, typing.Any] = {coll.Matches.OUTCOME_WINNER: {"$nin": [None, ""]}}
+    series_ids = await _series_ids(season, match_type)
+    if series_ids is not None:
+        query[coll.Matches.SERIES] = {"$in": series_ids}
+
+    pipeline = cricket.Match.aggregate() \
+        .match(query) \
+        .group(coll.Matches.OUTCOME_WINNER, wins=Count()) \
+        .sort(("wins", -1), ("_id", 1)) \
+        .project("wins", _id=0, team="_id")
+    return [row async for row in pipeline.run()]
+
+
+async def venue_averages(innings_number: int = 0,
+                         min_innings: int = 1) -> typing.List[Row]:
+    """Average score of an innings at each venue, highest first: `venue`, `city`, `innings` and `average_runs`."""
+    pipeline = cricket.InningsModel.aggregate() \
+        .match({coll.Innings.INNINGS_NUMBER: innings_number}) \
+        .lookup(cricket.Match, coll.Innings.MATCH_ID, "_id", into="match") \
+        .unwind("match") \
+        .group(f"match.{coll.Matches.VENUE}", innings=Count(), average_runs=Avg(_FINAL_RUNS)) \
+        .match({"innings": {"$gte": min_innings}}) \
+        .lookup(cricket.Stadium, "_id", "_id", into="stadium") \
+        .unwind("stadium") \
+        .sort(("average_runs", -1)) \
+        .project("innings", "average_runs", _id=0, venue=f"stadium.{coll.Stadium.NAME}",
+                 city=f"stadium.{coll.Stadium.CITY}")
+    return [row async for row in pipeline.run()]
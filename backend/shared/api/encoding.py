@@ -0,0 +1,81 @@
+import base64
+import json
+import struct
+from datetime import date
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict
+
+import numpy as np
+from bson import ObjectId
+
+from shared.models.common.base import BaseModel
+
+
+def jsonable(value: Any) -> Any:
+    """Converts models and BSON values into plain JSON types; `_id` is exposed as `id`."""
+    if isinstance(value, BaseModel):
+        value = value.to_dict()
+
+    if isinstance(value, dict):
+        data = {}
+        for key, item in value.items():
+            if key == "_id":
+                key = "id"
+            data[key] = jsonable(item)
+        return data
+
+    if isinstance(value, (list, tuple)):
+        return [jsonable(item) for item in value]
+
+    if isinstance(value, ObjectId):
+        return str(value)
+
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+
+    return value
+
+
+def encode_json(value: Any) -> bytes:
+    return json.dumps(jsonable(value), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+# Media type of `encode_arrays` bodies
+ARRAYS = "application/vnd.gameviz.arrays"
+ARRAYS_MAGIC = b"GVA1"
+# struct format characters of the element types `encode_arrays` writes
+ARRAY_TYPES = {np.dtype("<u1"): b"B", np.dtype("<u2"): b"H", np.dtype("<i2"): b"h", np.dtype("<f4"): b"f"}
+
+
+def encode_arrays(arrays: Dict[str, np.ndarray]) -> bytes:
+    """Packs named numeric arrays into one little-endian body a browser can view with typed arrays, no parsing.
+
+    Layout: `GVA1`, then a uint32 array count, then per array a uint8 name length, the UTF-8 name, one struct format
+    character (`B` uint8, `H` uint16, `h` int16, `f` float32) and a uint32 element count, followed by zero padding to
+    a multiple of 4 bytes and the elements, themselves padded to a multiple of 4 bytes.
+    """
+    parts = [ARRAYS_MAGIC, struct.pack("<I", len(arrays))]
+    size = 8
+    for name, values in arrays.items():
+        values = np.asarray(values)
+        values = values.astype(values.dtype.newbyteorder("<"), copy=False)
+        code = ARRAY_TYPES.get(values.dtype)
+        if code is None:
+            raise ValueError(f"Cannot encode {name!r} of type {values.dtype}")
+
+        encoded_name = name.encode("utf-8")
+        header = struct.pack("<B", len(encoded_name)) + encoded_name + code + struct.pack("<I", len(values))
+        data = values.tobytes()
+        header += b"\0" * (-(size + len(header)) % 4)
+        parts.extend((header, data, b"\0" * (-len(data) % 4)))
+        size += len(header) + len(data) + (-len(data) % 4)
+    return b"".join(parts)
+
+
+async def ndjson_lines(values: AsyncIterable[Any]) -> AsyncIterator[bytes]:
+    """Encodes each value as one line of newline-delimited JSON as soon as it is produced."""
+    async for value in values:
+        yield encode_json(value) + b"\n"
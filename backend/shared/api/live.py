@@ -0,0 +1,112 @@
+import hmac
+import os
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import APIRouter
+from fastapi import Body
+from fastapi import HTTPException
+from fastapi import Request
+from fastapi import Response
+from fastapi import WebSocket
+from fastapi import WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from shared.live.matches import LiveMatch
+from shared.live.matches import live_matches
+
+router = APIRouter(prefix="/live")
+
+# Idle seconds after which server-sent event streams get a comment line, so proxies keep them open
+SSE_HEARTBEAT = 15.0
+# Close code sent to WebSocket viewers of a match nobody is feeding
+WS_UNKNOWN_MATCH = 4404
+
+
+def _check_feed_token(request: Request) -> None:
+    """Requires `Authorization: Bearer $GAMEVIZ_LIVE_FEED_TOKEN` on feed writes when that variable is set."""
+    token = os.environ.get("GAMEVIZ_LIVE_FEED_TOKEN")
+    if not token:
+        return
+
+    header = request.headers.get("authorization", "")
+    if not hmac.compare_digest(header.encode(), f"Bearer {token}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid live feed token")
+
+
+async def _live(match_key: str) -> LiveMatch:
+    match = await live_matches.get(match_key)
+    if match is None:
+        raise HTTPException(status_code=404, detail=f"No live match {match_key!r}")
+    return match
+
+
+@router.post("/{match_key}/deliveries")
+async def add_deliveries(request: Request, match_key: str, over: Dict[str, Any] = Body(...)):
+    """Takes `{"innings": 0, "team": ..., "over": 3, "deliveries": [...], "first_sequence": 18}` from a feed."""
+    _check_feed_token(request)
+    try:
+        innings_number, team, over_number = over["innings"], over["team"], over["over"]
+        deliveries = over["deliveries"]
+        first_sequence: Optional[int] = over.get("first_sequence")
+        if not isinstance(team, str) or not isinstance(deliveries, list) \
+                or not all(isinstance(value, int) for value in (innings_number, over_number)) \
+                or not isinstance(first_sequence, (int, type(None))):
+            raise ValueError("Expected integer innings and over, a team name and a list of deliveries")
+
+        match = await live_matches.get(match_key, create=True)
+        added = match.add_over(innings_number, team, over_number, deliveries, first_sequence=first_sequence)
+    except KeyError as exc:
+        raise HTTPException(status_code=422, detail=f"Missing {exc.args[0]!r}")
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+    return {"added": added, "balls": match.sequence, "version": match.version}
+
+
+@router.post("/{match_key}/finish")
+async def finish_match(request: Request, match_key: str):
+    _check_feed_token(request)
+    match = await _live(match_key)
+    await match.finish()
+    return {"balls": match.sequence, "version": match.version}
+
+
+@router.get("/{match_key}")
+async def get_scoreboard(match_key: str):
+    match = await _live(match_key)
+    return Response(match.encoded(), media_type="application/json", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/{match_key}/events")
+async def scoreboard_events(request: Request, match_key: str):
+    """Server-sent events carrying the latest scoreboard; `Last-Event-ID` resumes after a reconnect."""
+    match = await _live(match_key)
+    last_event_id = request.headers.get("last-event-id", "")
+    after = int(last_event_id) if last_event_id.isdigit() else 0
+
+    async def events() -> AsyncIterator[bytes]:
+        async for version, body in match.updates(after=after, heartbeat=SSE_HEARTBEAT):
+            if body is None:
+                yield b": keep-alive\n\n"
+            else:
+                yield b"event: scoreboard\nid: %d\ndata: %s\n\n" % (version, body)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.websocket("/{match_key}/ws")
+async def scoreboard_socket(websocket: WebSocket, match_key: str):
+    """Sends the latest scoreboard as a text message whenever it changes."""
+    match = await live_matches.get(match_key)
+    if match is None:
+        await websocket.close(code=WS_UNKNOWN_MATCH)
+        return
+
+    await websocket.accept()
+    try:
+        async for _, body in match.updates():
+            await websocket.send_text(body.decode("utf-8"))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
@@ -0,0 +1,91 @@
+import time
+from typing import Dict, List, Tuple
+
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+from shared.db_adapters.cache import QueryCache
+from shared.db_adapters.metrics import DEFAULT_BUCKETS
+from shared.db_adapters.metrics import Histogram
+from shared.db_adapters.metrics import format_labels
+
+# Label used for requests that match no route, so scanners cannot blow up the number of series
+UNMATCHED = "unmatched"
+
+
+class RouteMetrics:
+    """Request latency histograms keyed by method, route template and status code."""
+    _latency: Dict[Tuple[str, str, str], Histogram]
+
+    def __init__(self) -> None:
+        self._latency = {}
+
+    def observe(self, method: str, route: str, status: int, elapsed: float) -> None:
+        key = (method, route, str(status))
+        histogram = self._latency.get(key)
+        if histogram is None:
+            histogram = self._latency[key] = Histogram(DEFAULT_BUCKETS)
+        histogram.observe(elapsed)
+
+    def render(self) -> List[str]:
+        lines = ["# HELP gameviz_http_request_seconds Time from receiving a request to sending the last byte.",
+                 "# TYPE gameviz_http_request_seconds histogram"]
+        for (method, route, status), histogram in sorted(self._latency.items()):
+            lines.extend(histogram.render("gameviz_http_request_seconds",
+                                          {"method": method, "route": route, "status": status}))
+        return lines
+
+    def reset(self) -> None:
+        self._latency.clear()
+
+
+route_metrics = RouteMetrics()
+
+
+class RouteMetricsMiddleware:
+    """ASGI middleware that times every HTTP request, including streamed bodies, against its route template."""
+    app: ASGIApp
+    metrics: RouteMetrics
+
+    def __init__(self, app: ASGIApp, metrics: RouteMetrics = route_metrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the shared scope
+            route = getattr(scope.get("route"), "path", UNMATCHED)
+            self.metrics.observe(scope["method"], route, status, time.perf_counter() - started)
+
+
+def render_caches(caches: Dict[str, QueryCache]) -> List[str]:
+    """Hit, miss and eviction counters and the size of in-process caches."""
+    lines = []
+    for metric, kind, description in (("hits", "counter", "Cache lookups answered from memory."),
+                                      ("misses", "counter", "Cache lookups that went to the source."),
+                                      ("evictions", "counter", "Entries dropped to stay within the size limit."),
+                                      ("entries", "gauge", "Entries currently cached.")):
+        name = f"gameviz_cache_{metric}" + ("_total" if kind == "counter" else "")
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for cache_name, cache in sorted(caches.items()):
+            lines.append(f"{name}{{{format_labels({'cache': cache_name})}}} {cache.stats()[metric]}")
+    return lines
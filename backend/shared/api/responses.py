@@ -0,0 +1,79 @@
+import hashlib
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict
+
+from fastapi import Request
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+
+from shared.api.encoding import encode_json
+from shared.api.encoding import ndjson_lines
+from shared.db_adapters import CollectionAdapter
+from shared.db_adapters import track_reads
+from shared.db_adapters.cache import MISSING
+from shared.db_adapters.cache import QueryCache
+
+NDJSON = "application/x-ndjson"
+
+# Encoded bodies keyed by route and parameters, with the collections each was read from. A write made in this
+# process to one of those collections retires the body at once; the TTL bounds how long writes made by other
+# processes, such as the ingest and enrichment commands, go unseen
+response_cache = QueryCache(max_entries=5000, ttl=600.0)
+
+
+def etag_of(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """Applies the weak comparison RFC 9110 prescribes for `If-None-Match`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    if header.strip() == "*":
+        return True
+
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+async def cached_body(request: Request,
+                      route: str,
+                      params: Dict[str, Any],
+                      produce: Callable[[], Awaitable[bytes]],
+                      /,
+                      media_type: str = "application/json") -> Response:
+    """Serves the body `produce` returns from the response cache, answering 304 when the client is current."""
+    entry = response_cache.get(route, params)
+    if entry is not MISSING and any(CollectionAdapter.generation_of(name) != generation
+                                    for name, generation in entry[2].items()):
+        entry = MISSING
+
+    if entry is MISSING:
+        generation = response_cache.generation(route)
+        with track_reads() as reads:
+            body = await produce()
+        entry = (etag_of(body), body, reads)
+        response_cache.put(route, params, entry, generation)
+
+    etag, body, _ = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(body, media_type=media_type, headers=headers)
+
+
+async def cached_json(request: Request,
+                      route: str,
+                      params: Dict[str, Any],
+                      produce: Callable[[], Awaitable[Any]]) -> Response:
+    """Serves the JSON encoded result of `produce` from the response cache, see `cached_body`."""
+    async def encoded() -> bytes:
+        return encode_json(await produce())
+
+    return await cached_body(request, route, params, encoded)
+
+
+def stream_ndjson(values: AsyncIterable[Any]) -> StreamingResponse:
+    """Streams one JSON document per line instead of building the whole body in memory."""
+    return StreamingResponse(ndjson_lines(values), media_type=NDJSON)
@@ -0,0 +1,370 @@
+from typing import AsyncIterator, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter
+from fastapi import HTTPException
+from fastapi import Query
+from fastapi import Request
+from fastapi import Response
+
+from db import collection_structures as coll
+from shared.analytics import summaries
+from shared.analytics.charts import chart_series
+from shared.analytics.frame import leaderboard
+from shared.analytics.store import DeliveryFilter
+from shared.analytics.store import frames
+from shared.api.encoding import ARRAYS
+from shared.api.encoding import encode_arrays
+from shared.api.encoding import encode_json
+from shared.api.responses import cached_body
+from shared.api.responses import cached_json
+from shared.api.responses import stream_ndjson
+from shared.models import cricket
+from shared.models.common.loader import ReferenceLoader
+from shared.models.common.pagination import DEFAULT_PAGE_SIZE
+from shared.models.common.pagination import InvalidPageToken
+from shared.search.names import KINDS
+from shared.search.names import name_index
+
+router = APIRouter()
+
+# Caps for the lists returned inside a single JSON body
+MAX_INNINGS = 10
+MAX_PLAYERS = 100
+MAX_LEADERS = 100
+# Largest page the keyset-paginated endpoints return
+MAX_PAGE_SIZE = 1000
+
+# Innings one chart overlay can compare, and the most points a chart series can be downsampled to
+MAX_OVERLAY = 20
+MAX_CHART_POINTS = 2000
+# Chart bodies: JSON lists or typed arrays, see `encode_arrays`
+CHART_FORMAT = Query("json", alias="format", pattern="^(json|binary)$")
+
+# Most rows one name search returns
+MAX_SEARCH_RESULTS = 50
+
+# Stats the frame leaderboards rank by, and whether lower is better; averages are left out since a player never
+# dismissed (or without a wicket) has a ratio of 0
+PLAYER_STATS = {
+    "batting": {"runs": False, "strike_rate": False, "boundary_pct": False, "dot_pct": True},
+    "bowling": {"wickets": False, "economy": True, "dot_pct": False},
+}
+
+# Delivery fields a player's deliveries are listed by
+DELIVERY_ROLES = {"batter": coll.Deliveries.BATTER, "bowler": coll.Deliveries.BOWLER}
+
+
+def _object_id(value: str) -> ObjectId:
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=404, detail=f"Unknown id {value!r}")
+
+
+async def _page(model,
+                query: dict,
+                /,
+                limit: int,
+                after: Optional[str],
+                sort: Optional[Sequence[Tuple[str, int]]] = None) -> dict:
+    """One page of `model` documents as `{"items": [...], "next": token}`; `next` is null on the last page."""
+    try:
+        page = await model.page(query, sort=sort, limit=limit, after=after, trusted=True)
+    except InvalidPageToken as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return page.to_dict()
+
+
+async def _one(model, value: str):
+    instance = await model.read_from_db({"_id": _object_id(value)}, trusted=True)
+    if instance is None:
+        raise HTTPException(status_code=404, detail=f"{model.__name__} {value} not found")
+    return instance
+
+
+@router.get("/series")
+async def list_series(request: Request,
+                      season: Optional[str] = None,
+                      match_type: Optional[str] = None,
+                      gender: Optional[str] = None,
+                      limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                      after: Optional[str] = None):
+    query = {key: value for key, value in ((coll.Series.SEASON, season),
+                                           (coll.Series.MATCH_TYPE, match_type),
+                                           (coll.Series.GENDER, gender)) if value is not None}
+    return await cached_json(request, "series", {**query, "limit": limit, "after": after},
+                             lambda: _page(cricket.Series, query, limit=limit, after=after,
+                                           sort=[(coll.Series.NAME, 1)]))
+
+
+@router.get("/series/{series_id}")
+async def get_series(request: Request, series_id: str):
+    return await cached_json(request, "series/id", {"id": series_id},
+                             lambda: _one(cricket.Series, series_id))
+
+
+@router.get("/series/{series_id}/matches")
+async def series_matches(series_id: str):
+    query = {coll.Matches.SERIES: _object_id(series_id)}
+    return stream_ndjson(cricket.Match.find(query, sort=[(coll.Matches.SERIES, 1), (coll.Matches.DATES, 1)],
+                                            trusted=True))
+
+
+@router.get("/seasons/{season:path}/matches")
+async def season_matches(season: str, match_type: Optional[str] = None, gender: Optional[str] = None):
+    """Matches of a season's series; Cricsheet seasons may contain a slash, e.g. `/seasons/2007/08/matches` (or
+    `2007%2F08`)."""
+    query = {coll.Series.SEASON: season}
+    if match_type is not None:
+        query[coll.Series.MATCH_TYPE] = match_type
+    if gender is not None:
+        query[coll.Series.GENDER] = gender
+
+    async def matches() -> AsyncIterator[cricket.Match]:
+        async for series in cricket.Series.find(query, fields=[coll.Series.NAME], trusted=True):
+            async for match in cricket.Match.find({coll.Matches.SERIES: series.id},
+                                                  sort=[(coll.Matches.SERIES, 1), (coll.Matches.DATES, 1)],
+                                                  trusted=True):
+                yield match
+
+    return stream_ndjson(matches())
+
+
+@router.get("/matches/{match_id}")
+async def get_match(request: Request, match_id: str):
+    return await cached_json(request, "matches/id", {"id": match_id},
+                             lambda: _one(cricket.Match, match_id))
+
+
+@router.get("/matches/{match_id}/full")
+async def full_match(request: Request, match_id: str):
+    """The match with everything it references: series, venue, teams, players and officials, and its innings with
+    their overs and deliveries, loaded level by level with one query per collection."""
+    async def produce():
+        loader = ReferenceLoader(trusted=True)
+        match = await loader.load(cricket.Match, _object_id(match_id))
+        if match is None:
+            raise HTTPException(status_code=404, detail=f"Match {match_id} not found")
+
+        innings = await cricket.InningsModel.find({coll.Innings.MATCH_ID: match.id},
+                                                  sort=[(coll.Innings.MATCH_ID, 1), (coll.Innings.INNINGS_NUMBER, 1)],
+                                                  trusted=True).to_list(MAX_INNINGS)
+        await loader.resolve([match, *innings])
+        return {"match": match,
+                "innings": innings,
+                "series": loader.get(cricket.Series, match.series),
+                "venue": loader.get(cricket.Stadium, match.venue),
+                "teams": loader.loaded(cricket.Team),
+                "players": loader.loaded(cricket.Player),
+                "overs": loader.loaded(cricket.OverModel),
+                "deliveries": loader.loaded(cricket.DeliveryModel)}
+
+    return await cached_json(request, "matches/full", {"id": match_id}, produce)
+
+
+@router.get("/matches/{match_id}/innings")
+async def match_innings(request: Request,
+                        match_id: str,
+                        limit: int = Query(MAX_INNINGS, ge=1, le=MAX_INNINGS),
+                        after: Optional[str] = None):
+    query = {coll.Innings.MATCH_ID: _object_id(match_id)}
+    return await cached_json(request, "matches/innings", {"id": match_id, "limit": limit, "after": after},
+                             lambda: _page(cricket.InningsModel, query, limit=limit, after=after,
+                                           sort=[(coll.Innings.INNINGS_NUMBER, 1)]))
+
+
+@router.get("/matches/{match_id}/deliveries")
+async def match_deliveries(match_id: str):
+    """Streams every delivery of the match in bowling order, one innings at a time."""
+    query = {coll.Innings.MATCH_ID: _object_id(match_id)}
+
+    async def deliveries() -> AsyncIterator[cricket.DeliveryModel]:
+        innings = cricket.InningsModel.find(query,
+                                            fields=[coll.Innings.INNINGS_ID, coll.Innings.INNINGS_NUMBER],
+                                            sort=[(coll.Innings.MATCH_ID, 1), (coll.Innings.INNINGS_NUMBER, 1)],
+                                            trusted=True)
+        async for current in innings:
+            overs = await cricket.OverModel.find({coll.Overs.INNINGS_ID: current.innings_id},
+                                                 sort=[(coll.Overs.INNINGS_ID, 1), (coll.Overs.OVER_NUMBER, 1)],
+                                                 trusted=True).to_list(1000)
+            by_id = {}
+            async for delivery in cricket.DeliveryModel.find(
+                    {coll.Deliveries.OVER_ID: {"$in": [over.over_id for over in overs]}},
+                    batch_size=500, trusted=True):
+                by_id[delivery.delivery_id] = delivery
+            for over in overs:
+                for delivery_id in over.deliveries:
+                    if delivery_id in by_id:
+                        yield by_id[delivery_id]
+
+    return stream_ndjson(deliveries())
+
+
+@router.get("/innings/{innings_id}")
+async def get_innings(request: Request, innings_id: str):
+    return await cached_json(request, "innings/id", {"id": innings_id},
+                             lambda: _one(cricket.InningsModel, innings_id))
+
+
+def _chart_arrays(chart: cricket.InningsChartModel, points: Optional[int]) -> Dict[str, np.ndarray]:
+    arrays = chart_series(chart, points=points)
+    if chart.target_runs is not None:
+        arrays["target"] = np.array([chart.target_runs, chart.target_overs or 0], dtype="<i2")
+    return arrays
+
+
+def _chart_json(chart: cricket.InningsChartModel, arrays: Dict[str, np.ndarray]) -> dict:
+    series = {}
+    for name, values in arrays.items():
+        if values.dtype.kind == "f":
+            # Rates to three decimals instead of float32 noise; NaN (no rate) is not valid JSON
+            series[name] = [None if value != value else value for value in values.astype(np.float64).round(3).tolist()]
+        elif name != "target":
+            series[name] = values.tolist()
+    return {"innings_id": chart.innings_id, "match_id": chart.match_id, "innings_number": chart.innings_number,
+            "team": chart.team, "balls_per_over": chart.balls_per_over, "target_runs": chart.target_runs,
+            "target_overs": chart.target_overs, "series": series}
+
+
+@router.get("/innings/{innings_id}/chart")
+async def innings_chart(request: Request,
+                        innings_id: str,
+                        points: Optional[int] = Query(None, ge=2, le=MAX_CHART_POINTS),
+                        format_: str = CHART_FORMAT):
+    """Worm, Manhattan, run-rate and required-rate series and wicket markers of an innings, precomputed at ingest."""
+    async def produce() -> bytes:
+        chart = await _one(cricket.InningsChartModel, innings_id)
+        arrays = _chart_arrays(chart, points)
+        return encode_arrays(arrays) if format_ == "binary" else encode_json(_chart_json(chart, arrays))
+
+    return await cached_body(request, "innings/chart", {"id": innings_id, "points": points, "format": format_},
+                             produce, media_type=ARRAYS if format_ == "binary" else "application/json")
+
+
+@router.get("/charts")
+async def chart_overlay(request: Request,
+                        innings: str,
+                        points: int = Query(200, ge=2, le=MAX_CHART_POINTS),
+                        format_: str = CHART_FORMAT):
+    """Charts of several innings (comma separated ids) for an overlay, each downsampled to `points`; binary arrays
+    are named `<position>.<series>` in the order the ids were given."""
+    ids = [_object_id(value) for value in dict.fromkeys(innings.split(","))]
+    if len(ids) > MAX_OVERLAY:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_OVERLAY} innings can be overlaid")
+
+    async def produce() -> bytes:
+        charts = {chart.id: chart for chart in await cricket.InningsChartModel.find({"_id": {"$in": ids}},
+                                                                                   trusted=True).to_list(len(ids))}
+        missing = [str(innings_id) for innings_id in ids if innings_id not in charts]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"No chart for innings {', '.join(missing)}")
+
+        arrays = [_chart_arrays(charts[innings_id], points) for innings_id in ids]
+        if format_ == "binary":
+            return encode_arrays({f"{position}.{name}": values
+                                  for position, chart_arrays in enumerate(arrays)
+                                  for name, values in chart_arrays.items()})
+        return encode_json([_chart_json(charts[innings_id], chart_arrays)
+                            for innings_id, chart_arrays in zip(ids, arrays)])
+
+    return await cached_body(request, "charts", {"innings": innings, "points": points, "format": format_},
+                             produce, media_type=ARRAYS if format_ == "binary" else "application/json")
+
+
+@router.get("/players")
+async def find_players(request: Request,
+                       name: str,
+                       limit: int = Query(MAX_PLAYERS, ge=1, le=MAX_PLAYERS),
+                       after: Optional[str] = None):
+    query = {coll.Players.NAME: name}
+    return await cached_json(request, "players", {**query, "limit": limit, "after": after},
+                             lambda: _page(cricket.Player, query, limit=limit, after=after))
+
+
+@router.get("/search")
+async def search_names(q: str = Query(..., min_length=1, max_length=100),
+                       kind: Optional[str] = None,
+                       limit: int = Query(10, ge=1, le=MAX_SEARCH_RESULTS)):
+    """Type-ahead search over player, team and venue names (`kind`, comma separated, narrows it), tolerant of
+    partial and misspelt names."""
+    kinds = None if kind is None else kind.split(",")
+    unknown = sorted(set(kinds or ()) - set(KINDS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown kind {', '.join(unknown)}; use {', '.join(KINDS)}")
+    return {"results": name_index.search(q, kinds=kinds, limit=limit)}
+
+
+@router.get("/players/{player_id}")
+async def get_player(request: Request, player_id: str):
+    return await cached_json(request, "players/id", {"id": player_id},
+                             lambda: _one(cricket.Player, player_id))
+
+
+@router.get("/players/{player_id}/deliveries")
+async def player_deliveries(request: Request,
+                            player_id: str,
+                            role: str = Query("batter", pattern="^(batter|bowler)$"),
+                            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                            after: Optional[str] = None):
+    """Pages through the deliveries a player faced (or bowled, with `role=bowler`) in a stable order."""
+    query = {DELIVERY_ROLES[role]: _object_id(player_id)}
+    params = {"id": player_id, "role": role, "limit": limit, "after": after}
+    return await cached_json(request, "players/deliveries", params,
+                             lambda: _page(cricket.DeliveryModel, query, limit=limit, after=after))
+
+
+@router.get("/leaderboards/runs")
+async def run_leaders(request: Request,
+                      season: str,
+                      match_type: Optional[str] = None,
+                      limit: int = Query(10, ge=1, le=MAX_LEADERS)):
+    params = {"season": season, "match_type": match_type, "limit": limit}
+    return await cached_json(request, "leaderboards/runs", params,
+                             lambda: summaries.top_run_scorers(season, match_type=match_type, limit=limit))
+
+
+@router.get("/leaderboards/players")
+async def player_leaders(role: str = Query("batting", pattern="^(batting|bowling)$"),
+                         stat: Optional[str] = None,
+                         season: Optional[str] = None,
+                         match_type: Optional[str] = None,
+                         gender: Optional[str] = None,
+                         team: Optional[str] = None,
+                         player: Optional[str] = None,
+                         min_balls: int = Query(0, ge=0),
+                         limit: int = Query(10, ge=1, le=MAX_LEADERS)):
+    """Batting or bowling leaders from the cached season frames (`shared.analytics.store.frames`), which ingest
+    writes invalidate, so this is not held in the response cache; `team` and `player` narrow a season's frame."""
+    stat = stat or next(iter(PLAYER_STATS[role]))
+    if stat not in PLAYER_STATS[role]:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown {role} stat {stat!r}; use {', '.join(PLAYER_STATS[role])}")
+
+    delivery_filter = DeliveryFilter(season=season, match_type=match_type, gender=gender,
+                                     team=_object_id(team) if team is not None else None,
+                                     player=_object_id(player) if player is not None else None)
+    frame = await frames.get(delivery_filter)
+    stats = frame.batting() if role == "batting" else frame.bowling()
+    rows = leaderboard(frame, stats, stat, limit=limit, ascending=PLAYER_STATS[role][stat], min_balls=min_balls)
+    return Response(encode_json(rows), media_type="application/json")
+
+
+@router.get("/leaderboards/wins")
+async def win_leaders(request: Request, season: Optional[str] = None, match_type: Optional[str] = None):
+    params = {"season": season, "match_type": match_type}
+    return await cached_json(request, "leaderboards/wins", params,
+                             lambda: summaries.team_wins(season=season, match_type=match_type))
+
+
+@router.get("/leaderboards/venues")
+async def venue_leaders(request: Request,
+                        innings_number: int = Query(0, ge=0),
+                        min_innings: int = Query(1, ge=1)):
+    params = {"innings_number": innings_number, "min_innings": min_innings}
+    return await cached_json(request, "leaderboards/venues", params,
+                             lambda: summaries.venue_averages(innings_number=innings_number,
+                                                              min_innings=min_innings))
@@ -1,32 +1,112 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Dict, Any, Optional
+from typing import ClassVar
+from typing import Iterator
+from typing import List
+from typing import Sequence
+from typing import Tuple
 from typing import Type
+from typing import Union
 
 from bson import ObjectId
 from motor.core import AgnosticCollection
+from motor.core import AgnosticCommandCursor
 from motor.core import AgnosticCursor
 from motor.core import AgnosticDatabase
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel
+from pymongo.results import BulkWriteResult
+
+from shared.db_adapters.cache import MISSING
+from shared.db_adapters.cache import QueryCache
+from shared.db_adapters.keyset import after_condition
+from shared.db_adapters.memory import MemoryDatabase
+from shared.db_adapters.metrics import MeasuredCursor
+from shared.db_adapters.metrics import OperationMetrics
+from shared.db_adapters.plans import QueryPlanChecker
+
+# Backends a `DatabaseAdapter` can hand out; both expose Motor's database and collection API
+Database = Union[AgnosticDatabase, MemoryDatabase]
+
+# Collections read in the current context, each with its write generation at the first read; see `track_reads`
+_reads: ContextVar[Optional[Dict[str, int]]] = ContextVar("gameviz_reads", default=None)
+
+
+@contextmanager
+def track_reads() -> Iterator[Dict[str, int]]:
+    """Collects the collections read through any `CollectionAdapter` inside the block, including tasks it starts,
+    with their write generations, so a cache of what was derived from them can tell when it went stale."""
+    reads: Dict[str, int] = {}
+    token = _reads.set(reads)
+    try:
+        yield reads
+    finally:
+        _reads.reset(token)
+
+
+def _lookups(pipeline: Any) -> Iterator[str]:
+    """Collections an aggregation pipeline joins with `$lookup`, nested pipelines included."""
+    if isinstance(pipeline, dict):
+        for key, value in pipeline.items():
+            if key == "$lookup" and isinstance(value, dict) and isinstance(value.get("from"), str):
+                yield value["from"]
+            yield from _lookups(value)
+    elif isinstance(pipeline, list):
+        for value in pipeline:
+            yield from _lookups(value)
+
+
+class ClientRegistry:
+    """Shares one Motor client, and therefore one connection pool, per URI."""
+    _clients: Dict[str, AsyncIOMotorClient]
+
+    def __init__(self) -> None:
+        self._clients = {}
+
+    def get_client(self,
+                   uri: str,
+                   /,
+                   **options: Any) -> AsyncIOMotorClient:
+        """Returns the client for `uri`, creating it with `options` on first use; later options are ignored."""
+        client = self._clients.get(uri)
+        if client is None:
+            client = self._clients[uri] = AsyncIOMotorClient(uri, **options)
+        return client
+
+    def close_all(self) -> None:
+        for client in self._clients.values():
+            client.close()
+        self._clients.clear()
+
+
+clients = ClientRegistry()
 
 
 class DatabaseAdapterBuilder:
+    _client_options: Dict[str, Any]
     _database_name: str
     _uri: str
 
     def __init__(self,
                  uri: str,
                  database_name: str,
-                 /) -> None:
+                 /,
+                 client_options: Optional[Dict[str, Any]] = None) -> None:
+        self._client_options = client_options or {}
         self._database_name = database_name
         self._uri = uri
 
     def build(self) -> AgnosticDatabase:
-        client = AsyncIOMotorClient(self._uri)
+        client = clients.get_client(self._uri, **self._client_options)
         return client.get_database(self._database_name)
 
 
 class DatabaseAdapter:
     _builder: Type[DatabaseAdapterBuilder]
-    _db: Optional[AgnosticDatabase]
+    _db: Optional[Database]
 
     def __init__(self,
                  builder: Type[DatabaseAdapterBuilder],
@@ -34,22 +114,64 @@ class DatabaseAdapter:
         self._builder = builder
         self._db = None
 
-    def connect_db(self) -> AgnosticDatabase:
+    def connect_db(self) -> Database:
         if self._db is None:
             # noinspection PyArgumentList
             self._db = self._builder().build()
 
         return self._db
 
+    def use(self,
+            db: Database,
+            /) -> None:
+        """Serves every collection from `db`, e.g. a `MemoryDatabase` in tests, instead of the built client."""
+        self._db = db
+
+    async def load_snapshot(self,
+                            collection_names: Sequence[str],
+                            /) -> Dict[str, int]:
+        """Copies `collection_names` into memory and serves them from there; other collections stay on the server."""
+        # noinspection PyArgumentList
+        source = self._builder().build()
+        snapshot = MemoryDatabase(source.name, fallback=source)
+        loaded = await snapshot.load_snapshot(source, collection_names)
+        self._db = snapshot
+        return loaded
+
+    async def warm_up(self,
+                      connections: int,
+                      /) -> None:
+        """Selects a server and opens `connections` pooled connections by running that many concurrent pings."""
+        db = self.connect_db()
+        await asyncio.gather(*(db.command("ping") for _ in range(max(connections, 1))))
+
+    def close(self) -> None:
+        """Forgets the database handle; the shared client is closed through `clients.close_all()`."""
+        self._db = None
+
 
 class CollectionAdapter:
+    # Set in development and tests to explain every new query shape and flag collection scans
+    plan_checker: ClassVar[Optional[QueryPlanChecker]] = None
+    # Latency, document and error counters for every database round trip; `None` switches instrumentation off
+    metrics: ClassVar[Optional[OperationMetrics]] = OperationMetrics()
+    # Writes made per collection name in this process, whichever adapter made them
+    _generations: ClassVar[Dict[str, int]] = {}
+
+    _cache: Optional[QueryCache]
+    _collection: Optional[AgnosticCollection]
+    _collection_db: Optional[Database]
     _db_adapter: DatabaseAdapter
     _collection_name: str
 
     def __init__(self,
                  db_adapter: DatabaseAdapter,
                  collection_name: str,
-                 /) -> None:
+                 /,
+                 cache: Optional[QueryCache] = None) -> None:
+        self._cache = cache
+        self._collection = None
+        self._collection_db = None
         self._db_adapter = db_adapter
         self._collection_name = collection_name
 
@@ -61,40 +183,229 @@ class CollectionAdapter:
     def collection_name(self) -> str:
         return self._collection_name
 
+    @property
+    def cache(self) -> Optional[QueryCache]:
+        return self._cache
+
+    @property
+    def generation(self) -> int:
+        """Number of writes made to the collection in this process, for caches of data derived from it."""
+        return self.generation_of(self._collection_name)
+
+    @classmethod
+    def generation_of(cls, collection_name: str) -> int:
+        return cls._generations.get(collection_name, 0)
+
+    def _read(self, *collection_names: str) -> None:
+        reads = _reads.get()
+        if reads is not None:
+            for name in collection_names:
+                reads.setdefault(name, self.generation_of(name))
+
+    def invalidate_cache(self) -> None:
+        self._generations[self._collection_name] = self.generation + 1
+        if self._cache is not None:
+            self._cache.invalidate(self._collection_name)
+
     def get_collection(self,
                        /) -> AgnosticCollection:
         db = self._db_adapter.connect_db()
-        coll = db.get_collection(self._collection_name)
-        return coll
+        # The handle is reused until the database adapter hands out a different database
+        if self._collection_db is not db:
+            self._collection = db.get_collection(self._collection_name)
+            self._collection_db = db
+        return self._collection
+
+    def _observe(self,
+                 operation: str,
+                 started: float,
+                 query: Any,
+                 /,
+                 documents: Sequence[Any] = (),
+                 count: Optional[int] = None) -> None:
+        if self.metrics is not None:
+            self.metrics.observe(self._collection_name, operation, time.perf_counter() - started, query=query,
+                                 documents=documents, count=count)
+
+    def _failed(self,
+                operation: str,
+                started: float,
+                /) -> None:
+        if self.metrics is not None:
+            self.metrics.failed(self._collection_name, operation, time.perf_counter() - started)
 
     async def insert_one(self,
                          data: Dict[str, Any],
                          /) -> ObjectId:
-        result = await self.get_collection().insert_one(data)
+        started = time.perf_counter()
+        try:
+            result = await self.get_collection().insert_one(data)
+        except Exception:
+            self._failed("insert_one", started)
+            raise
+        finally:
+            self.invalidate_cache()
+
+        self._observe("insert_one", started, data, documents=(data,))
         return result.inserted_id
 
     async def find_one(self,
-                       query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        return await self.get_collection().find_one(query)
+                       query: Dict[str, Any],
+                       /,
+                       projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        self._read(self._collection_name)
+        if self.plan_checker is not None:
+            await self.plan_checker.check(self.get_collection(), query)
+
+        key = query if projection is None else {"$query": query, "$projection": projection}
+        if self._cache is not None:
+            cached = self._cache.get(self._collection_name, key)
+            if cached is not MISSING:
+                return cached
+            generation = self._cache.generation(self._collection_name)
+
+        started = time.perf_counter()
+        try:
+            document = await self.get_collection().find_one(query, projection)
+        except Exception:
+            self._failed("find_one", started)
+            raise
+
+        self._observe("find_one", started, query, documents=(document,))
+        if self._cache is not None:
+            self._cache.put(self._collection_name, key, document, generation)
+        return document
+
+    def find_one_blocking(self,
+                          query: Dict[str, Any],
+                          /,
+                          projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Synchronous `find_one` for code that cannot await and runs outside an event loop, such as attribute access
+        in scripts; `BaseModel` refuses to call it from inside a running loop."""
+        self._read(self._collection_name)
+        started = time.perf_counter()
+        try:
+            document = self.get_collection().delegate.find_one(query, projection)
+        except Exception:
+            self._failed("find_one_blocking", started)
+            raise
+
+        self._observe("find_one_blocking", started, query, documents=(document,))
+        return document
 
     async def find_documents(self,
                              query: Dict[str, Any],
-                             /) -> AgnosticCursor:
-        cursor = self.get_collection().find(query)
+                             /,
+                             projection: Optional[Dict[str, Any]] = None,
+                             sort: Optional[Sequence[Tuple[str, int]]] = None,
+                             limit: int = 0,
+                             batch_size: Optional[int] = None,
+                             after: Optional[Sequence[Any]] = None) -> AgnosticCursor:
+        """Opens a cursor over the matching documents; `after` holds the values of the `sort` keys of the last
+        document already read, and the cursor continues behind it (keyset pagination)."""
+        if after is not None:
+            if not sort:
+                raise ValueError("Continuing after a document needs a sort order")
+            query = {"$and": [query, after_condition(sort, after)]}
+
+        self._read(self._collection_name)
+        if self.plan_checker is not None:
+            await self.plan_checker.check(self.get_collection(), query, sort=sort)
+
+        cursor = self.get_collection().find(query, projection)
+        if sort:
+            cursor = cursor.sort(list(sort))
+        if limit:
+            cursor = cursor.limit(limit)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        if self.metrics is not None:
+            # Nothing is sent until the first batch is requested, so the cursor times its own reads
+            cursor = MeasuredCursor(cursor, self.metrics, self._collection_name, query)
+        return cursor
+
+    async def aggregate(self,
+                        pipeline: List[Dict[str, Any]],
+                        /,
+                        allow_disk_use: bool = True,
+                        batch_size: Optional[int] = None) -> AgnosticCommandCursor:
+        """Runs an aggregation pipeline on the server; `allow_disk_use` lets large `$group`/`$sort` stages spill."""
+        self._read(self._collection_name, *_lookups(pipeline))
+        options: Dict[str, Any] = {"allowDiskUse": allow_disk_use}
+        if batch_size:
+            options["batchSize"] = batch_size
+
+        cursor = self.get_collection().aggregate(pipeline, **options)
+        if self.metrics is not None:
+            cursor = MeasuredCursor(cursor, self.metrics, self._collection_name, pipeline, operation="aggregate")
         return cursor
 
     async def update_one(self, query: dict, update: dict):
         """Updates a single document in the collection."""
-        return await self.get_collection().update_one(query, update)
+        started = time.perf_counter()
+        try:
+            result = await self.get_collection().update_one(query, update)
+        except Exception:
+            self._failed("update_one", started)
+            raise
+        finally:
+            self.invalidate_cache()
+
+        self._observe("update_one", started, query, documents=(update,), count=result.modified_count)
+        return result
 
     async def update_many(self,
                           query: Dict[str, Any],
                           update_data: Dict[str, Any],
                           /) -> int:
-        result = await self.get_collection().update_many(query, {"$set": update_data})
+        started = time.perf_counter()
+        try:
+            result = await self.get_collection().update_many(query, {"$set": update_data})
+        except Exception:
+            self._failed("update_many", started)
+            raise
+        finally:
+            self.invalidate_cache()
+
+        self._observe("update_many", started, query, documents=(update_data,), count=result.modified_count)
         return result.modified_count
 
     async def delete_one(self,
                          query: Dict[str, Any]) -> int:
-        result = await self.get_collection().delete_one(query)
+        started = time.perf_counter()
+        try:
+            result = await self.get_collection().delete_one(query)
+        except Exception:
+            self._failed("delete_one", started)
+            raise
+        finally:
+            self.invalidate_cache()
+
+        self._observe("delete_one", started, query, count=result.deleted_count)
         return result.deleted_count
+
+    async def bulk_write(self,
+                         requests: List[Any],
+                         /,
+                         ordered: bool = True) -> BulkWriteResult:
+        """Sends a batch of write operations to the collection in a single round trip."""
+        started = time.perf_counter()
+        try:
+            result = await self.get_collection().bulk_write(requests, ordered=ordered)
+        except Exception:
+            self._failed("bulk_write", started)
+            raise
+        finally:
+            # Part of an ordered batch may have been applied even when it fails
+            self.invalidate_cache()
+
+        self._observe("bulk_write", started, None, count=len(requests))
+        return result
+
+    async def create_indexes(self,
+                             indexes: List[IndexModel],
+                             /) -> List[str]:
+        """Creates the given indexes; indexes that already exist with the same options are left untouched."""
+        if not indexes:
+            return []
+        return await self.get_collection().create_indexes(indexes)
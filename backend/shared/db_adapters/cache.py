@@ -0,0 +1,98 @@
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# Returned by `QueryCache.get` on a miss, since `None` is a valid cached result
+MISSING = object()
+
+
+def freeze_query(query: Dict[str, Any]) -> Hashable:
+    """Turns a query into a hashable key; top-level field order does not matter."""
+    return tuple(sorted((key, _freeze(value)) for key, value in query.items()))
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return ("$doc",) + tuple((key, _freeze(item)) for key, item in value.items())
+
+    if isinstance(value, (list, tuple)):
+        return ("$list",) + tuple(_freeze(item) for item in value)
+
+    return value
+
+
+class QueryCache:
+    """Process-wide LRU of query results with a TTL, invalidated per collection on writes."""
+    _clock: Callable[[], float]
+    _entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, int, Any]]"
+    _generations: Dict[str, int]
+    _max_entries: int
+    _ttl: float
+
+    def __init__(self,
+                 /,
+                 max_entries: int = 10000,
+                 ttl: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._max_entries = max_entries
+        self._ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, collection_name: str, query: Dict[str, Any]) -> Any:
+        """Returns a copy of the cached result, or `MISSING` when the query has to go to the database."""
+        try:
+            key = (collection_name, freeze_query(query))
+            entry = self._entries.get(key)
+        except TypeError:
+            entry = None
+
+        if entry is not None:
+            expires_at, generation, value = entry
+            if expires_at > self._clock() and generation == self._generations.get(collection_name, 0):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(value)
+            del self._entries[key]
+
+        self.misses += 1
+        return MISSING
+
+    def generation(self, collection_name: str) -> int:
+        """Returns the write generation of a collection, to be passed back to `put`."""
+        return self._generations.get(collection_name, 0)
+
+    def put(self, collection_name: str, query: Dict[str, Any], value: Any, generation: int) -> None:
+        """Caches `value` unless the collection was written to since `generation` was read."""
+        if generation != self._generations.get(collection_name, 0):
+            return
+
+        try:
+            key = (collection_name, freeze_query(query))
+            hash(key)
+        except TypeError:
+            return
+
+        self._entries[key] = (self._clock() + self._ttl, generation, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, collection_name: str) -> None:
+        """Drops every cached result of a collection; stale entries are discarded lazily."""
+        self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
@@ -0,0 +1,34 @@
+from typing import Any, Dict, List, Sequence, Tuple
+
+
+def sort_values(document: Dict[str, Any],
+                sort: Sequence[Tuple[str, int]],
+                /) -> List[Any]:
+    """Values of the sort keys in `document`, following dotted paths; a missing key reads as None."""
+    values = []
+    for path, _ in sort:
+        value: Any = document
+        for part in path.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        values.append(value)
+    return values
+
+
+def after_condition(sort: Sequence[Tuple[str, int]],
+                    values: Sequence[Any],
+                    /) -> Dict[str, Any]:
+    """Query for the documents that come after `values` in `sort` order.
+
+    For keys `(a, b, _id)` this is `a > x or (a == x and b > y) or (a == x and b == y and _id > z)`, with `$lt`
+    for descending keys, so an index on the keys seeks straight to the position instead of skipping over the
+    documents before it.
+    """
+    if len(values) != len(sort):
+        raise ValueError(f"Expected {len(sort)} values after which to continue, got {len(values)}")
+
+    branches = []
+    for position, (path, direction) in enumerate(sort):
+        branch: Dict[str, Any] = {key: value for (key, _), value in zip(sort[:position], values)}
+        branch[path] = {"$gt" if direction == 1 else "$lt": values[position]}
+        branches.append(branch)
+    return branches[0] if len(branches) == 1 else {"$or": branches}
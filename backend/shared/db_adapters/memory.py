@@ -0,0 +1,1124 @@
+import datetime
+import itertools
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from bson import ObjectId
+from pymongo import DeleteMany
+from pymongo import DeleteOne
+from pymongo import IndexModel
+from pymongo import InsertOne
+from pymongo import ReplaceOne
+from pymongo import UpdateMany
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import BulkWriteResult
+from pymongo.results import DeleteResult
+from pymongo.results import InsertOneResult
+from pymongo.results import UpdateResult
+
+# Returned by `_resolve` for a path that does not exist, which equality treats like `None`
+_ABSENT = object()
+
+# Cross-type sort order, a subset of MongoDB's BSON comparison order
+_TYPE_ORDER = {type(None): 0, int: 1, float: 1, str: 2, dict: 3, list: 4, bytes: 5, ObjectId: 6, bool: 7,
+               datetime.datetime: 8}
+
+
+def _copy(value: Any) -> Any:
+    """Copies the containers of a document; the scalars stored in BSON documents are immutable."""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [_copy(item) for item in value]
+
+    return value
+
+
+def _resolve(document: Any, path: str) -> List[Any]:
+    """Returns the values at a dotted path, descending into arrays of sub-documents like MongoDB does."""
+    values = [document]
+    for part in path.split("."):
+        found = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    found.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    found.append(value[int(part)])
+                found.extend(item[part] for item in value if isinstance(item, dict) and part in item)
+        values = found
+    return values
+
+
+def _candidates(document: Dict[str, Any], path: str) -> List[Any]:
+    """Values a query condition is compared with: each value at the path and the elements of array values."""
+    values = _resolve(document, path)
+    if not values:
+        return [_ABSENT]
+
+    expanded = list(values)
+    for value in values:
+        if isinstance(value, list):
+            expanded.extend(value)
+    return expanded
+
+
+def _equal(value: Any, expected: Any) -> bool:
+    if value is _ABSENT:
+        return expected is None
+    return value == expected and isinstance(value, bool) == isinstance(expected, bool)
+
+
+class _Members:
+    """Values of an `$in`/`$nin` condition, with the strings and ids among them hashed once per query."""
+    __slots__ = ("hashed", "items")
+
+    hashed: Set[Any]
+    items: List[Any]
+
+    def __init__(self, items: Iterable[Any]) -> None:
+        self.items = list(items)
+        self.hashed = {item for item in self.items if isinstance(item, (str, ObjectId))}
+
+    def contains(self, value: Any) -> bool:
+        # Strings and ids only ever equal their own type, so a set lookup agrees with `_equal`
+        if isinstance(value, (str, ObjectId)):
+            return value in self.hashed
+        return any(_equal(value, item) for item in self.items)
+
+
+def _prepare(query: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of `query` ready to be matched against many documents."""
+    prepared = {}
+    for key, condition in query.items():
+        if key in ("$or", "$and"):
+            prepared[key] = [_prepare(branch) for branch in condition]
+        elif isinstance(condition, dict) and any(operator in condition for operator in ("$in", "$nin")):
+            prepared[key] = {operator: _Members(expected) if operator in ("$in", "$nin") else expected
+                             for operator, expected in condition.items()}
+        else:
+            prepared[key] = condition
+    return prepared
+
+
+def _compare(value: Any, expected: Any, check: Callable[[Any, Any], bool]) -> bool:
+    if value is _ABSENT or value is None or _TYPE_ORDER.get(type(value)) != _TYPE_ORDER.get(type(expected)):
+        return False
+    return check(value, expected)
+
+
+_COMPARISONS: Dict[str, Callable[[Any, Any], bool]] = {
+    "$gt": lambda value, expected: value > expected,
+    "$gte": lambda value, expected: value >= expected,
+    "$lt": lambda value, expected: value < expected,
+    "$lte": lambda value, expected: value <= expected,
+}
+
+
+def _matches_condition(document: Dict[str, Any], path: str, condition: Any) -> bool:
+    values = _candidates(document, path)
+    if not (isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition)):
+        return any(_equal(value, condition) for value in values)
+
+    for operator, expected in condition.items():
+        if operator == "$eq":
+            matched = any(_equal(value, expected) for value in values)
+        elif operator == "$ne":
+            matched = not any(_equal(value, expected) for value in values)
+        elif operator in ("$in", "$nin"):
+            members = expected if isinstance(expected, _Members) else _Members(expected)
+            matched = any(members.contains(value) for value in values) == (operator == "$in")
+        elif operator == "$exists":
+            matched = bool(_resolve(document, path)) == bool(expected)
+        elif operator in _COMPARISONS:
+            check = _COMPARISONS[operator]
+            matched = any(_compare(value, expected, check) for value in values)
+        else:
+            raise ValueError(f"Query operator {operator} is not supported by the memory backend")
+
+        if not matched:
+            return False
+    return True
+
+
+def matches(document: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """Evaluates the query subset the models use: equality, `$in`/`$nin`, comparisons, `$exists`, `$and`/`$or`."""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, branch) for branch in condition):
+                return False
+        elif key.startswith("$"):
+            raise ValueError(f"Query operator {key} is not supported by the memory backend")
+        elif not _matches_condition(document, key, condition):
+            return False
+    return True
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    if isinstance(value, list):
+        return (_TYPE_ORDER[list], [_sort_key(item) for item in value])
+
+    if isinstance(value, dict):
+        return (_TYPE_ORDER[dict], [(key, _sort_key(item)) for key, item in value.items()])
+
+    return (_TYPE_ORDER.get(type(value), len(_TYPE_ORDER)), value)
+
+
+def _set_path(document: Dict[str, Any], path: str, value: Any) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+
+def _unset_path(document: Dict[str, Any], path: str) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(last, None)
+
+
+def _get_path(document: Dict[str, Any], path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(document, dict) or part not in document:
+            return _ABSENT
+        document = document[part]
+    return document
+
+
+def _sort_value(document: Dict[str, Any], path: str) -> Any:
+    value = _get_path(document, path)
+    return None if value is _ABSENT else value
+
+
+def _apply_update(document: Dict[str, Any], update: Dict[str, Any], /, inserting: bool = False) -> None:
+    """Applies an update document in place: `$set`, `$setOnInsert`, `$unset`, `$inc`, `$push` and `$addToSet`."""
+    for operator, fields in update.items():
+        if operator == "$setOnInsert" and not inserting:
+            continue
+
+        for path, value in fields.items():
+            if operator in ("$set", "$setOnInsert"):
+                _set_path(document, path, _copy(value))
+            elif operator == "$unset":
+                _unset_path(document, path)
+            elif operator == "$inc":
+                current = _get_path(document, path)
+                _set_path(document, path, value if current is _ABSENT else current + value)
+            elif operator in ("$push", "$addToSet"):
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                current = _get_path(document, path)
+                if current is _ABSENT:
+                    current = []
+                    _set_path(document, path, current)
+                elif not isinstance(current, list):
+                    raise ValueError(f"Cannot apply {operator} to non-array field {path}")
+                for item in items:
+                    if operator == "$push" or item not in current:
+                        current.append(_copy(item))
+            else:
+                raise ValueError(f"Update operator {operator} is not supported by the memory backend")
+
+
+def _project(document: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Returns a copy of the document restricted by an inclusion or exclusion projection."""
+    if not projection:
+        return _copy(document)
+
+    include = [path for path, flag in projection.items() if flag and path != "_id"]
+    if any(isinstance(flag, dict) for flag in projection.values()):
+        raise ValueError("Projection operators are not supported by the memory backend")
+
+    if include:
+        projected = {"_id": document["_id"]} if projection.get("_id", 1) and "_id" in document else {}
+        for path in include:
+            value = _get_path(document, path)
+            if value is not _ABSENT:
+                _set_path(projected, path, _copy(value))
+        return projected
+
+    projected = _copy(document)
+    for path, flag in projection.items():
+        if not flag:
+            _unset_path(projected, path)
+    return projected
+
+
+def _field_value(document: Any, path: str) -> Any:
+    """Value of a `$path` expression; a path through an array yields the array of values found in its elements."""
+    value = document
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _ABSENT)
+        elif isinstance(value, list):
+            value = [item[part] for item in value if isinstance(item, dict) and part in item]
+        else:
+            return _ABSENT
+        if value is _ABSENT:
+            return _ABSENT
+    return value
+
+
+def _number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _arithmetic(operator: str, values: List[Any]) -> Any:
+    if any(value is None or value is _ABSENT for value in values):
+        return None
+    if not all(_number(value) for value in values):
+        raise ValueError(f"{operator} only accepts numbers in the memory backend")
+
+    if operator == "$add":
+        return sum(values)
+    if operator == "$multiply":
+        product = 1
+        for value in values:
+            product *= value
+        return product
+    if operator == "$subtract":
+        return values[0] - values[1]
+    if values[1] == 0:
+        raise ValueError("$divide by zero")
+    return values[0] / values[1]
+
+
+_EXPRESSION_COMPARISONS: Dict[str, Callable[[Any, Any], bool]] = {
+    "$eq": lambda left, right: _sort_key(left) == _sort_key(right),
+    "$ne": lambda left, right: _sort_key(left) != _sort_key(right),
+    "$gt": lambda left, right: _sort_key(left) > _sort_key(right),
+    "$gte": lambda left, right: _sort_key(left) >= _sort_key(right),
+    "$lt": lambda left, right: _sort_key(left) < _sort_key(right),
+    "$lte": lambda left, right: _sort_key(left) <= _sort_key(right),
+}
+
+
+def _evaluate(document: Dict[str, Any], expression: Any) -> Any:
+    """Evaluates the aggregation expressions the pipelines use: paths, literals, arithmetic, comparisons, `$cond`,
+    `$ifNull` and `$size`. Missing values come back as `_ABSENT`."""
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _field_value(document, expression[1:])
+
+    if isinstance(expression, list):
+        return [_evaluate(document, item) for item in expression]
+
+    if not isinstance(expression, dict):
+        return expression
+
+    operators = [key for key in expression if key.startswith("$")]
+    if not operators:
+        return {key: _evaluate(document, value) for key, value in expression.items()}
+    if len(expression) != 1:
+        raise ValueError(f"Expression objects take a single operator, got {sorted(expression)}")
+
+    operator, argument = next(iter(expression.items()))
+    if operator == "$literal":
+        return argument
+
+    arguments = argument if isinstance(argument, list) else [argument]
+    if operator in ("$add", "$subtract", "$multiply", "$divide"):
+        return _arithmetic(operator, [_evaluate(document, item) for item in arguments])
+    if operator in _EXPRESSION_COMPARISONS:
+        left, right = (_evaluate(document, item) for item in arguments)
+        return _EXPRESSION_COMPARISONS[operator](None if left is _ABSENT else left, None if right is _ABSENT else right)
+    if operator == "$cond":
+        condition, then, otherwise = (argument["if"], argument["then"], argument["else"]) \
+            if isinstance(argument, dict) else arguments
+        value = _evaluate(document, condition)
+        return _evaluate(document, then if value not in (None, _ABSENT, False, 0) else otherwise)
+    if operator == "$ifNull":
+        for item in arguments:
+            value = _evaluate(document, item)
+            if value is not None and value is not _ABSENT:
+                return value
+        return None
+    if operator == "$size":
+        value = _evaluate(document, arguments[0])
+        if not isinstance(value, list):
+            raise ValueError("$size needs an array")
+        return len(value)
+    raise ValueError(f"Expression operator {operator} is not supported by the memory backend")
+
+
+def _group_key(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return ("dict",) + tuple((key, _group_key(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return ("list",) + tuple(_group_key(item) for item in value)
+    # 1 and True are different groups, as in MongoDB
+    return (type(value) is bool, value)
+
+
+class _Accumulator:
+    """Running value of one `$group` accumulator."""
+    __slots__ = ("operator", "value", "count")
+
+    operator: str
+    value: Any
+    count: int
+
+    def __init__(self, operator: str) -> None:
+        if operator not in ("$sum", "$avg", "$min", "$max", "$first", "$last", "$push", "$addToSet"):
+            raise ValueError(f"Accumulator {operator} is not supported by the memory backend")
+
+        self.operator = operator
+        self.value = [] if operator in ("$push", "$addToSet") else _ABSENT
+        self.count = 0
+
+    def add(self, value: Any) -> None:
+        operator = self.operator
+        if operator in ("$sum", "$avg"):
+            # Like MongoDB, non-numeric values are ignored
+            if _number(value):
+                self.value = value if self.value is _ABSENT else self.value + value
+                self.count += 1
+        elif operator in ("$min", "$max"):
+            if value is _ABSENT or value is None:
+                return
+            if self.value is _ABSENT \
+                    or operator == "$min" and _sort_key(value) < _sort_key(self.value) \
+                    or operator == "$max" and _sort_key(value) > _sort_key(self.value):
+                self.value = value
+        elif operator == "$first":
+            if self.count == 0:
+                self.value = value
+            self.count += 1
+        elif operator == "$last":
+            self.value = value
+        elif value is not _ABSENT and (operator == "$push" or value not in self.value):
+            self.value.append(_copy(value))
+
+    def result(self) -> Any:
+        if self.operator == "$sum":
+            return 0 if self.value is _ABSENT else self.value
+        if self.operator == "$avg":
+            return None if self.value is _ABSENT else self.value / self.count
+        return None if self.value is _ABSENT else self.value
+
+
+def _group(documents: Iterable[Dict[str, Any]], specification: Dict[str, Any]) -> List[Dict[str, Any]]:
+    groups: Dict[Hashable, Tuple[Any, Dict[str, _Accumulator]]] = {}
+    accumulators = {name: next(iter(expression.items())) for name, expression in specification.items()
+                    if name != "_id"}
+    for document in documents:
+        key = _evaluate(document, specification["_id"])
+        key = None if key is _ABSENT else key
+        group = groups.get(_group_key(key))
+        if group is None:
+            group = groups[_group_key(key)] = (key, {name: _Accumulator(operator)
+                                                     for name, (operator, _) in accumulators.items()})
+        for name, (_, expression) in accumulators.items():
+            group[1][name].add(_evaluate(document, expression))
+
+    return [{"_id": key, **{name: accumulator.result() for name, accumulator in values.items()}}
+            for key, values in groups.values()]
+
+
+def _project_stage(document: Dict[str, Any], specification: Dict[str, Any], /, adding: bool = False) -> Dict[str, Any]:
+    """`$project` with included paths and computed fields, or `$addFields` when `adding`."""
+    if adding:
+        projected = _copy(document)
+    elif all(value in (0, False) for value in specification.values()):
+        return _project(document, specification)
+    else:
+        projected = {"_id": document["_id"]} if specification.get("_id", 1) not in (0, False) \
+            and "_id" in document else {}
+
+    for path, value in specification.items():
+        if value in (0, False) and path == "_id":
+            continue
+        if not adding and (value is True or _number(value)):
+            found = _get_path(document, path)
+            if found is not _ABSENT:
+                _set_path(projected, path, found)
+        else:
+            found = _evaluate(document, value)
+            if found is not _ABSENT:
+                _set_path(projected, path, found)
+    return projected
+
+
+def _unwind(documents: Iterable[Dict[str, Any]], specification: Any) -> Iterator[Dict[str, Any]]:
+    if isinstance(specification, str):
+        specification = {"path": specification}
+    path = specification["path"].removeprefix("$")
+    keep = specification.get("preserveNullAndEmptyArrays", False)
+
+    for document in documents:
+        value = _get_path(document, path)
+        if isinstance(value, list) and value:
+            for item in value:
+                unwound = _copy(document)
+                _set_path(unwound, path, item)
+                yield unwound
+        elif isinstance(value, list) or value is _ABSENT or value is None:
+            if keep:
+                unwound = _copy(document)
+                if isinstance(value, list):
+                    _unset_path(unwound, path)
+                yield unwound
+        else:
+            yield document
+
+
+def _sort_documents(documents: List[Dict[str, Any]], keys: Dict[str, int]) -> List[Dict[str, Any]]:
+    for field, direction in reversed(list(keys.items())):
+        documents = sorted(documents, key=lambda document: _sort_key(_sort_value(document, field)),
+                           reverse=direction < 0)
+    return documents
+
+
+def _hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def index_name(keys: Sequence[Tuple[str, Any]]) -> str:
+    """MongoDB's default name for an index on `keys`, e.g. `name_1_city_1`."""
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+class HashIndex:
+    """Maps each value of the first key, and each element of array values, to the ids of the documents holding it.
+
+    A unique index is enforced on all of its keys together; as with a sparse index, documents whose keys are all
+    missing or null are not checked.
+    """
+    keys: List[Tuple[str, Any]]
+    unique: bool
+    _entries: Dict[Hashable, Dict[Any, None]]
+    # Ids by the values of every key, kept for unique compound indexes only
+    _combinations: Dict[Hashable, Dict[Any, None]]
+
+    def __init__(self,
+                 keys: Sequence[Tuple[str, Any]],
+                 /,
+                 unique: bool = False) -> None:
+        self.keys = list(keys)
+        self.unique = unique
+        self._entries = {}
+        self._combinations = {}
+
+    @property
+    def field(self) -> str:
+        return self.keys[0][0]
+
+    @property
+    def name(self) -> str:
+        return index_name(self.keys)
+
+    def _values(self, document: Dict[str, Any], field: str) -> List[Hashable]:
+        values = {}
+        for value in _candidates(document, field):
+            key = None if value is _ABSENT else value
+            if _hashable(key):
+                values[key] = None
+        return list(values)
+
+    def _combined(self, document: Dict[str, Any]) -> Iterator[Tuple[Hashable, ...]]:
+        # Like a multikey index, an array value contributes one entry per element
+        return itertools.product(*(self._values(document, field) for field, _ in self.keys[1:]))
+
+    def add(self, document: Dict[str, Any]) -> None:
+        compound = self.unique and len(self.keys) > 1
+        for key in self._values(document, self.field):
+            ids = self._entries.get(key, {})
+            if self.unique and not compound and key is not None and ids and document["_id"] not in ids:
+                raise DuplicateKeyError(f"E11000 duplicate key error index: {self.name} dup key: {key!r}")
+            if compound:
+                for rest in self._combined(document):
+                    combination = (key, *rest)
+                    ids = self._combinations.get(combination, {})
+                    if any(value is not None for value in combination) and ids and document["_id"] not in ids:
+                        raise DuplicateKeyError(f"E11000 duplicate key error index: {self.name} "
+                                                f"dup key: {combination!r}")
+
+        for key in self._values(document, self.field):
+            self._entries.setdefault(key, {})[document["_id"]] = None
+            if compound:
+                for rest in self._combined(document):
+                    self._combinations.setdefault((key, *rest), {})[document["_id"]] = None
+
+    def remove(self, document: Dict[str, Any]) -> None:
+        for key in self._values(document, self.field):
+            self._discard(self._entries, key, document["_id"])
+            if self._combinations:
+                for rest in self._combined(document):
+                    self._discard(self._combinations, (key, *rest), document["_id"])
+
+    @staticmethod
+    def _discard(entries: Dict[Hashable, Dict[Any, None]], key: Hashable, document_id: Any) -> None:
+        ids = entries.get(key)
+        if ids is not None:
+            ids.pop(document_id, None)
+            if not ids:
+                del entries[key]
+
+    def lookup(self, condition: Any) -> Optional[Iterable[Any]]:
+        """Ids that can satisfy `condition`, or `None` when the index cannot answer it."""
+        if isinstance(condition, dict):
+            if set(condition) == {"$eq"}:
+                condition = condition["$eq"]
+            elif set(condition) == {"$in"} and all(_hashable(value) for value in condition["$in"]):
+                ids: Dict[Any, None] = {}
+                for value in condition["$in"]:
+                    ids.update(self._entries.get(value, {}))
+                return ids
+            else:
+                return None
+
+        if not _hashable(condition):
+            return None
+        return self._entries.get(condition, {})
+
+
+class MemoryCursor:
+    """Cursor over a query result with Motor's chaining and async iteration API."""
+    _collection: "MemoryCollection"
+    _documents: Optional[Iterator[Dict[str, Any]]]
+    _limit: int
+    _projection: Optional[Dict[str, Any]]
+    _query: Dict[str, Any]
+    _skip: int
+    _sort: List[Tuple[str, int]]
+
+    def __init__(self,
+                 collection: "MemoryCollection",
+                 query: Dict[str, Any],
+                 /,
+                 projection: Optional[Dict[str, Any]] = None) -> None:
+        self._collection = collection
+        self._documents = None
+        self._limit = 0
+        self._projection = projection
+        self._query = query
+        self._skip = 0
+        self._sort = []
+
+    def sort(self, key_or_list: Any, direction: Optional[int] = None) -> "MemoryCursor":
+        self._sort = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def skip(self, count: int) -> "MemoryCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "MemoryCursor":
+        self._limit = count
+        return self
+
+    def batch_size(self, _: int) -> "MemoryCursor":
+        return self
+
+    def _results(self) -> Iterator[Dict[str, Any]]:
+        if self._documents is None:
+            documents = self._collection._select(self._query)
+            for field, direction in reversed(self._sort):
+                documents = sorted(documents, key=lambda document: _sort_key(_sort_value(document, field)),
+                                   reverse=direction < 0)
+            end = self._skip + self._limit if self._limit else None
+            # Documents are copied as they are consumed, so a limit never pays for the rows it drops
+            self._documents = (_project(document, self._projection)
+                               for document in list(documents)[self._skip:end])
+        return self._documents
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self._results()
+
+    def __aiter__(self) -> "MemoryCursor":
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        try:
+            return next(self._results())
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = self._results()
+        if length is None:
+            return list(results)
+        return [document for _, document in zip(range(length), results)]
+
+    async def explain(self) -> Dict[str, Any]:
+        stage = "IXSCAN" if self._collection._index_for(self._query) is not None else "COLLSCAN"
+        return {"queryPlanner": {"winningPlan": {"stage": stage}}}
+
+
+class MemoryCommandCursor:
+    """Cursor over aggregation results with the iteration API of Motor's command cursors."""
+    _compute: Callable[[], List[Dict[str, Any]]]
+    _documents: Optional[Iterator[Dict[str, Any]]]
+
+    def __init__(self, compute: Callable[[], List[Dict[str, Any]]], /) -> None:
+        self._compute = compute
+        self._documents = None
+
+    def batch_size(self, _: int) -> "MemoryCommandCursor":
+        return self
+
+    def _results(self) -> Iterator[Dict[str, Any]]:
+        if self._documents is None:
+            self._documents = iter(self._compute())
+        return self._documents
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self._results()
+
+    def __aiter__(self) -> "MemoryCommandCursor":
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        try:
+            return next(self._results())
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = self._results()
+        if length is None:
+            return list(results)
+        return [document for _, document in zip(range(length), results)]
+
+
+class _BlockingCollection:
+    """Synchronous view used by `CollectionAdapter.find_one_blocking`, mirroring Motor's `delegate`."""
+
+    def __init__(self, collection: "MemoryCollection") -> None:
+        self.find_one = collection.find_one_now
+
+
+class MemoryCollection:
+    """Dict-backed collection with hash indexes that implements the part of Motor's collection API we use."""
+    name: str
+    _database: Optional["MemoryDatabase"]
+    _documents: Dict[Any, Dict[str, Any]]
+    # Indexes by name, and the index answering lookups on each first key
+    _indexes: Dict[str, HashIndex]
+    _lookups: Dict[str, HashIndex]
+
+    def __init__(self,
+                 name: str,
+                 /,
+                 database: Optional["MemoryDatabase"] = None) -> None:
+        self.name = name
+        self._database = database
+        self._documents = {}
+        self._indexes = {}
+        self._lookups = {}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    @property
+    def delegate(self) -> _BlockingCollection:
+        return _BlockingCollection(self)
+
+    def add_index(self,
+                  keys: Sequence[Tuple[str, Any]],
+                  /,
+                  unique: bool = False,
+                  name: Optional[str] = None) -> str:
+        """Indexes the first of `keys` for equality and `$in` lookups, enforcing uniqueness over all of them; returns
+        the index name.
+
+        Like MongoDB, raises `DuplicateKeyError` when stored documents already break a unique index, and
+        `ValueError` when another index of that name has different keys or options.
+        """
+        keys = [(field, direction) for field, direction in keys]
+        name = name or index_name(keys)
+        if keys == [("_id", 1)]:
+            return "_id_"
+
+        existing = self._indexes.get(name)
+        if existing is not None:
+            if existing.keys != keys or existing.unique != unique:
+                raise ValueError(f"Index {name} already exists on {self.name} with different keys or options")
+            return name
+
+        index = HashIndex(keys, unique=unique)
+        for document in self._documents.values():
+            index.add(document)
+        self._indexes[name] = index
+        self._lookups.setdefault(index.field, index)
+        return name
+
+    def _id_lookup(self, condition: Any) -> Optional[List[Any]]:
+        if isinstance(condition, dict):
+            if set(condition) == {"$eq"}:
+                condition = condition["$eq"]
+            elif set(condition) == {"$in"} and all(_hashable(value) for value in condition["$in"]):
+                return [value for value in condition["$in"] if value in self._documents]
+            else:
+                return None
+
+        if not _hashable(condition):
+            return None
+        return [condition] if condition in self._documents else []
+
+    def _index_for(self, query: Dict[str, Any]) -> Optional[Iterable[Any]]:
+        """Ids of the documents that can match, from the most selective usable index, or `None` for a scan."""
+        best = None
+        for field, condition in query.items():
+            if field == "$or":
+                branches = [self._index_for(branch) for branch in condition]
+                ids = None if any(branch is None for branch in branches) else \
+                    {key: None for branch in branches for key in branch}
+            elif field == "$and":
+                branches = [found for found in map(self._index_for, condition) if found is not None]
+                ids = min(branches, key=len) if branches else None
+            elif field == "_id":
+                ids = self._id_lookup(condition)
+            elif field in self._lookups:
+                ids = self._lookups[field].lookup(condition)
+            else:
+                continue
+
+            if ids is not None and (best is None or len(ids) < len(best)):
+                best = ids
+        return best
+
+    def _select(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        ids = self._index_for(query)
+        prepared = _prepare(query)
+        if ids is None:
+            return [document for document in self._documents.values() if matches(document, prepared)]
+
+        documents = (self._documents.get(key) for key in list(ids))
+        return [document for document in documents if document is not None and matches(document, prepared)]
+
+    def _store(self, document: Dict[str, Any]) -> None:
+        if document["_id"] in self._documents:
+            raise DuplicateKeyError(f"E11000 duplicate key error index: _id_ dup key: {document['_id']!r}")
+
+        added = []
+        try:
+            for index in self._indexes.values():
+                index.add(document)
+                added.append(index)
+        except DuplicateKeyError:
+            for index in added:
+                index.remove(document)
+            raise
+        self._documents[document["_id"]] = document
+
+    def _remove(self, document: Dict[str, Any]) -> None:
+        for index in self._indexes.values():
+            index.remove(document)
+        del self._documents[document["_id"]]
+
+    def _insert(self, document: Dict[str, Any]) -> Any:
+        # Like pymongo, the caller's document gains the generated `_id`
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        self._store(_copy(document))
+        return document["_id"]
+
+    def _update(self,
+                query: Dict[str, Any],
+                update: Dict[str, Any],
+                /,
+                upsert: bool = False,
+                multi: bool = False) -> Dict[str, Any]:
+        documents = self._select(query)
+        if not multi:
+            documents = documents[:1]
+
+        replace = not any(key.startswith("$") for key in update)
+        modified = 0
+        for document in documents:
+            updated = _copy(document)
+            if replace:
+                updated = {"_id": document["_id"], **_copy(update)}
+            else:
+                _apply_update(updated, update)
+            if updated == document:
+                continue
+
+            self._remove(document)
+            try:
+                self._store(updated)
+            except DuplicateKeyError:
+                self._store(document)
+                raise
+            modified += 1
+
+        if documents or not upsert:
+            return {"n": len(documents), "nModified": modified}
+
+        document: Dict[str, Any] = {}
+        if replace:
+            if "_id" in query and not isinstance(query["_id"], dict):
+                document["_id"] = query["_id"]
+            document.update(_copy(update))
+        else:
+            for path, condition in query.items():
+                if not path.startswith("$") and not isinstance(condition, dict):
+                    _set_path(document, path, _copy(condition))
+            _apply_update(document, update, inserting=True)
+        document.setdefault("_id", ObjectId())
+        self._store(document)
+        return {"n": 1, "nModified": 0, "upserted": document["_id"]}
+
+    def _delete(self,
+                query: Dict[str, Any],
+                /,
+                multi: bool = False) -> int:
+        documents = self._select(query)
+        if not multi:
+            documents = documents[:1]
+        for document in documents:
+            self._remove(document)
+        return len(documents)
+
+    def find_one_now(self,
+                     query: Optional[Dict[str, Any]] = None,
+                     projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        for document in self._select(query or {}):
+            return _project(document, projection)
+        return None
+
+    async def find_one(self,
+                       query: Optional[Dict[str, Any]] = None,
+                       projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        return self.find_one_now(query, projection)
+
+    def find(self,
+             query: Optional[Dict[str, Any]] = None,
+             projection: Optional[Dict[str, Any]] = None) -> MemoryCursor:
+        return MemoryCursor(self, query or {}, projection=projection)
+
+    def aggregate(self,
+                  pipeline: Sequence[Dict[str, Any]],
+                  allowDiskUse: bool = False,
+                  batchSize: Optional[int] = None) -> MemoryCommandCursor:
+        return MemoryCommandCursor(lambda: self._aggregate(list(pipeline)))
+
+    def _aggregate(self, stages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Runs `$match`, `$group`, `$sort`, `$skip`, `$limit`, `$project`, `$addFields`, `$unwind`, `$lookup` and
+        `$count` stages; stored documents are never modified."""
+        # A leading `$match` is answered from the indexes, as the server's planner would
+        if stages and "$match" in stages[0]:
+            documents = self._select(stages.pop(0)["$match"])
+        else:
+            documents = list(self._documents.values())
+
+        for stage in stages:
+            if len(stage) != 1:
+                raise ValueError(f"A pipeline stage takes a single operator, got {sorted(stage)}")
+            operator, specification = next(iter(stage.items()))
+
+            if operator == "$match":
+                prepared = _prepare(specification)
+                documents = [document for document in documents if matches(document, prepared)]
+            elif operator == "$group":
+                documents = _group(documents, specification)
+            elif operator == "$sort":
+                documents = _sort_documents(documents, specification)
+            elif operator == "$skip":
+                documents = documents[specification:]
+            elif operator == "$limit":
+                documents = documents[:specification]
+            elif operator == "$project":
+                documents = [_project_stage(document, specification) for document in documents]
+            elif operator in ("$addFields", "$set"):
+                documents = [_project_stage(document, specification, adding=True) for document in documents]
+            elif operator == "$unwind":
+                documents = list(_unwind(documents, specification))
+            elif operator == "$lookup":
+                documents = self._lookup(documents, specification)
+            elif operator == "$count":
+                documents = [{specification: len(documents)}] if documents else []
+            else:
+                raise ValueError(f"Pipeline stage {operator} is not supported by the memory backend")
+
+        return [_copy(document) for document in documents]
+
+    def _lookup(self, documents: List[Dict[str, Any]], specification: Dict[str, Any]) -> List[Dict[str, Any]]:
+        name = specification["from"]
+        foreign = self._database.get_collection(name) if self._database is not None else None
+        if not isinstance(foreign, MemoryCollection):
+            raise ValueError(f"$lookup from {name} needs that collection in the same memory database")
+
+        local_field, foreign_field, into = specification["localField"], specification["foreignField"], \
+            specification["as"]
+        joined, found = [], {}
+        for document in documents:
+            value = _field_value(document, local_field)
+            values = value if isinstance(value, list) else [None if value is _ABSENT else value]
+            key = _group_key(values)
+            if key not in found:
+                found[key] = foreign._select({foreign_field: {"$in": values}})
+            document = dict(document)
+            document[into] = found[key]
+            joined.append(document)
+        return joined
+
+    async def count_documents(self, query: Dict[str, Any]) -> int:
+        return len(self._select(query))
+
+    async def estimated_document_count(self) -> int:
+        return len(self._documents)
+
+    async def insert_one(self, document: Dict[str, Any]) -> InsertOneResult:
+        return InsertOneResult(self._insert(document), True)
+
+    async def update_one(self,
+                         query: Dict[str, Any],
+                         update: Dict[str, Any],
+                         upsert: bool = False) -> UpdateResult:
+        return UpdateResult(self._update(query, update, upsert=upsert), True)
+
+    async def update_many(self,
+                          query: Dict[str, Any],
+                          update: Dict[str, Any],
+                          upsert: bool = False) -> UpdateResult:
+        return UpdateResult(self._update(query, update, upsert=upsert, multi=True), True)
+
+    async def replace_one(self,
+                          query: Dict[str, Any],
+                          replacement: Dict[str, Any],
+                          upsert: bool = False) -> UpdateResult:
+        return UpdateResult(self._update(query, replacement, upsert=upsert), True)
+
+    async def delete_one(self, query: Dict[str, Any]) -> DeleteResult:
+        return DeleteResult({"n": self._delete(query)}, True)
+
+    async def delete_many(self, query: Dict[str, Any]) -> DeleteResult:
+        return DeleteResult({"n": self._delete(query, multi=True)}, True)
+
+    async def bulk_write(self,
+                         requests: Sequence[Any],
+                         ordered: bool = True) -> BulkWriteResult:
+        """Applies the operations in order. As in MongoDB, a failed write raises `BulkWriteError` with the counts of
+        what was applied: an ordered batch stops at it, and an unordered one carries on with the rest."""
+        result = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+                  "writeErrors": []}
+        for position, request in enumerate(requests):
+            try:
+                self._bulk_request(position, request, result)
+            except DuplicateKeyError as error:
+                result["writeErrors"].append({"index": position, "code": 11000, "errmsg": str(error),
+                                              "op": getattr(request, "_doc", None)})
+                if ordered:
+                    break
+
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        del result["writeErrors"]
+        return BulkWriteResult(result, True)
+
+    def _bulk_request(self, position: int, request: Any, result: Dict[str, Any]) -> None:
+        if isinstance(request, InsertOne):
+            self._insert(request._doc)
+            result["nInserted"] += 1
+        elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+            outcome = self._update(request._filter, request._doc, upsert=bool(request._upsert),
+                                   multi=isinstance(request, UpdateMany))
+            if "upserted" in outcome:
+                result["nUpserted"] += 1
+                result["upserted"].append({"index": position, "_id": outcome["upserted"]})
+            else:
+                result["nMatched"] += outcome["n"]
+                result["nModified"] += outcome["nModified"]
+        elif isinstance(request, (DeleteOne, DeleteMany)):
+            result["nRemoved"] += self._delete(request._filter, multi=isinstance(request, DeleteMany))
+        else:
+            raise ValueError(f"Bulk operation {type(request).__name__} is not supported by the memory backend")
+
+    async def create_indexes(self, indexes: List[IndexModel]) -> List[str]:
+        return [self.add_index(list(index.document["key"].items()),
+                               unique=bool(index.document.get("unique")),
+                               name=index.document["name"])
+                for index in indexes]
+
+    async def index_information(self) -> Dict[str, Dict[str, Any]]:
+        information: Dict[str, Dict[str, Any]] = {"_id_": {"key": [("_id", 1)]}}
+        for name, index in self._indexes.items():
+            information[name] = {"key": list(index.keys)}
+            if index.unique:
+                information[name]["unique"] = True
+        return information
+
+    async def drop(self) -> None:
+        self._documents.clear()
+        self._indexes = {name: HashIndex(index.keys, unique=index.unique) for name, index in self._indexes.items()}
+        self._lookups = {}
+        for index in self._indexes.values():
+            self._lookups.setdefault(index.field, index)
+
+
+class MemoryDatabase:
+    """In-process database whose collections live in memory.
+
+    With a `fallback` (a Motor database) only the collections loaded through `load_snapshot` are held in memory and
+    every other collection is served by the fallback, so immutable data can be read from RAM next to a live server.
+    """
+    name: str
+    _collections: Dict[str, MemoryCollection]
+    _fallback: Optional[Any]
+
+    def __init__(self,
+                 name: str,
+                 /,
+                 fallback: Optional[Any] = None) -> None:
+        self.name = name
+        self._collections = {}
+        self._fallback = fallback
+
+    @property
+    def client(self) -> Any:
+        return self._fallback.client if self._fallback is not None else None
+
+    def list_collection_names(self) -> List[str]:
+        return list(self._collections)
+
+    def get_collection(self, name: str) -> Any:
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+
+        if self._fallback is not None:
+            return self._fallback.get_collection(name)
+
+        collection = self._collections[name] = MemoryCollection(name, database=self)
+        return collection
+
+    async def command(self, command: str, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        if self._fallback is not None:
+            return await self._fallback.command(command, *args, **kwargs)
+        if command == "ping":
+            return {"ok": 1.0}
+        raise ValueError(f"Command {command} is not supported by the memory backend")
+
+    async def load_snapshot(self,
+                            source: Any,
+                            collection_names: Iterable[str],
+                            /,
+                            batch_size: int = 1000) -> Dict[str, int]:
+        """Copies whole collections and their indexed keys from `source`; returns the documents loaded per
+        collection."""
+        loaded = {}
+        for name in collection_names:
+            source_collection = source.get_collection(name)
+            collection = MemoryCollection(name, database=self)
+            for name, information in (await source_collection.index_information()).items():
+                collection.add_index(list(information["key"]), unique=bool(information.get("unique")), name=name)
+
+            async for document in source_collection.find({}).batch_size(batch_size):
+                collection._store(document)
+            # Swapped in once complete, so readers never see a half loaded collection
+            self._collections[name] = collection
+            loaded[name] = len(collection)
+        return loaded
@@ -0,0 +1,247 @@
+import bisect
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import bson
+
+from shared.db_adapters.plans import query_shape
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from an in-memory read to a slow aggregate
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                                      2.5, 5.0, 10.0)
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    return ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items())
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observing is a bisect and two additions."""
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    bounds: Tuple[float, ...]
+    counts: List[int]
+    count: int
+    sum: float
+
+    def __init__(self,
+                 /,
+                 bounds: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def render(self, name: str, labels: Dict[str, str]) -> List[str]:
+        """Prometheus text lines for the cumulative buckets, sum and count of this histogram."""
+        prefix = format_labels(labels)
+        separator = "," if prefix else ""
+        lines, cumulative = [], 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{prefix}{separator}le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{prefix}}} {self.sum!r}")
+        lines.append(f"{name}_count{{{prefix}}} {self.count}")
+        return lines
+
+
+class OperationStats:
+    __slots__ = ("latency", "errors", "documents", "bytes")
+
+    latency: Histogram
+    errors: int
+    documents: int
+    bytes: int
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.latency = Histogram(bounds)
+        self.errors = 0
+        self.documents = 0
+        self.bytes = 0
+
+
+class OperationMetrics:
+    """Per-collection, per-operation latency, error, document and byte counters with a slow-operation log.
+
+    Bytes are the BSON size of one document in every `byte_sample`, scaled up, since encoding every document would
+    cost more than many of the reads it measures; 1 measures every document and 0 turns byte counting off.
+    """
+    byte_sample: int
+    slow_threshold: Optional[float]
+    _bounds: Tuple[float, ...]
+    _stats: Dict[Tuple[str, str], OperationStats]
+
+    def __init__(self,
+                 /,
+                 slow_threshold: Optional[float] = 0.1,
+                 byte_sample: int = 100,
+                 bounds: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.byte_sample = byte_sample
+        self.slow_threshold = slow_threshold
+        self._bounds = bounds
+        self._stats = {}
+
+    def stats(self, collection_name: str, operation: str) -> OperationStats:
+        stats = self._stats.get((collection_name, operation))
+        if stats is None:
+            stats = self._stats[(collection_name, operation)] = OperationStats(self._bounds)
+        return stats
+
+    def observe(self,
+                collection_name: str,
+                operation: str,
+                elapsed: float,
+                /,
+                query: Any = None,
+                documents: Iterable[Any] = (),
+                count: Optional[int] = None) -> None:
+        """Records a finished operation; `documents` are sampled for bytes, `count` overrides their number."""
+        stats = self.stats(collection_name, operation)
+        stats.latency.observe(elapsed)
+
+        seen = 0
+        for document in documents:
+            if document is None:
+                continue
+            seen += 1
+            if self.byte_sample and (stats.documents + seen) % self.byte_sample == 0:
+                stats.bytes += len(bson.encode(document)) * self.byte_sample
+        stats.documents += seen if count is None else count
+
+        if self.slow_threshold is not None and elapsed >= self.slow_threshold:
+            logger.warning("Slow %s on %s took %.1f ms: %s", operation, collection_name, elapsed * 1000,
+                           "-" if query is None else query_shape(query))
+
+    def failed(self,
+               collection_name: str,
+               operation: str,
+               elapsed: float,
+               /) -> None:
+        stats = self.stats(collection_name, operation)
+        stats.latency.observe(elapsed)
+        stats.errors += 1
+
+    def render(self) -> List[str]:
+        """Prometheus text exposition of every recorded operation."""
+        ordered = sorted(self._stats.items())
+        lines = ["# HELP gameviz_db_operation_seconds Latency of database operations.",
+                 "# TYPE gameviz_db_operation_seconds histogram"]
+        for (collection_name, operation), stats in ordered:
+            lines.extend(stats.latency.render("gameviz_db_operation_seconds",
+                                              {"collection": collection_name, "operation": operation}))
+
+        for name, attribute, description in (("errors", "errors", "Database operations that raised."),
+                                             ("documents", "documents", "Documents read or written."),
+                                             ("bytes", "bytes", "Estimated BSON bytes read or written.")):
+            lines.append(f"# HELP gameviz_db_{name}_total {description}")
+            lines.append(f"# TYPE gameviz_db_{name}_total counter")
+            for (collection_name, operation), stats in ordered:
+                labels = format_labels({"collection": collection_name, "operation": operation})
+                lines.append(f"gameviz_db_{name}_total{{{labels}}} {getattr(stats, attribute)}")
+        return lines
+
+    def reset(self) -> None:
+        self._stats.clear()
+
+
+class MeasuredCursor:
+    """Wraps a find or aggregate cursor to time the waits for its batches and count the documents it returns.
+
+    The operation is recorded once, when the cursor is exhausted or dropped, so the time callers spend between
+    documents is not counted against the database.
+    """
+    _collection_name: str
+    _cursor: Any
+    _documents: int
+    _elapsed: float
+    _metrics: OperationMetrics
+    _operation: str
+    _query: Any
+    _recorded: bool
+
+    def __init__(self,
+                 cursor: Any,
+                 metrics: OperationMetrics,
+                 collection_name: str,
+                 query: Any,
+                 /,
+                 operation: str = "find_documents") -> None:
+        self._collection_name = collection_name
+        self._cursor = cursor
+        self._documents = 0
+        self._elapsed = 0.0
+        self._metrics = metrics
+        self._operation = operation
+        self._query = query
+        self._recorded = False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def _record(self) -> None:
+        if not self._recorded:
+            self._recorded = True
+            self._metrics.observe(self._collection_name, self._operation, self._elapsed, query=self._query,
+                                  count=self._documents)
+
+    def _count(self, document: Dict[str, Any]) -> None:
+        self._documents += 1
+        sample = self._metrics.byte_sample
+        if sample and self._documents % sample == 0:
+            self._metrics.stats(self._collection_name, self._operation).bytes += len(bson.encode(document)) * sample
+
+    def _fail(self, elapsed: float) -> None:
+        self._recorded = True
+        self._metrics.failed(self._collection_name, self._operation, self._elapsed + elapsed)
+
+    def __aiter__(self) -> "MeasuredCursor":
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            document = await self._cursor.__anext__()
+        except StopAsyncIteration:
+            self._elapsed += time.perf_counter() - started
+            self._record()
+            raise
+        except Exception:
+            self._fail(time.perf_counter() - started)
+            raise
+
+        self._elapsed += time.perf_counter() - started
+        self._count(document)
+        return document
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        started = time.perf_counter()
+        try:
+            documents = await self._cursor.to_list(length)
+        except Exception:
+            self._fail(time.perf_counter() - started)
+            raise
+
+        self._elapsed += time.perf_counter() - started
+        for document in documents:
+            self._count(document)
+        if length is None or len(documents) < length:
+            self._record()
+        return documents
+
+    def __del__(self) -> None:
+        # A cursor abandoned half way still spent time in the database
+        if not self._recorded and (self._documents or self._elapsed):
+            self._record()
@@ -0,0 +1,79 @@
+import logging
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+from motor.core import AgnosticCollection
+
+from shared.db_adapters.cache import freeze_query
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionScanError(RuntimeError):
+    """Raised in strict mode when a query can only be answered by scanning the whole collection."""
+
+
+def query_shape(query: Any) -> Any:
+    """Returns the query with every value replaced by "?" so it can be logged without leaking data."""
+    if isinstance(query, dict):
+        return {key: query_shape(value) if key.startswith("$") or isinstance(value, dict) else "?"
+                for key, value in query.items()}
+
+    if isinstance(query, list):
+        return [query_shape(value) for value in query]
+
+    return "?"
+
+
+def _stages(plan: Any) -> List[str]:
+    if isinstance(plan, dict):
+        stages = [plan["stage"]] if isinstance(plan.get("stage"), str) else []
+        for value in plan.values():
+            stages.extend(_stages(value))
+        return stages
+
+    if isinstance(plan, list):
+        return [stage for value in plan for stage in _stages(value)]
+
+    return []
+
+
+class QueryPlanChecker:
+    """Development aid that runs `explain` once per query shape and flags collection scans."""
+    _checked: Set[Hashable]
+    strict: bool
+
+    def __init__(self,
+                 /,
+                 strict: bool = False) -> None:
+        self._checked = set()
+        self.strict = strict
+        self.collection_scans: List[Tuple[str, Dict[str, Any]]] = []
+
+    async def check(self,
+                    collection: AgnosticCollection,
+                    query: Dict[str, Any],
+                    /,
+                    sort: Optional[Sequence[Tuple[str, int]]] = None) -> None:
+        if not query:
+            # Reading every document is the point of a query without criteria, e.g. loading the search index
+            return
+
+        shape = query_shape(query)
+        key = (collection.name, freeze_query({"query": shape, "sort": [field for field, _ in sort or []]}))
+        if key in self._checked:
+            return
+        self._checked.add(key)
+
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(list(sort))
+        plan = await cursor.explain()
+
+        if "COLLSCAN" not in _stages(plan.get("queryPlanner", plan)):
+            return
+
+        self.collection_scans.append((collection.name, shape))
+        message = f"Collection scan on {collection.name} for query {shape}"
+        if self.strict:
+            raise CollectionScanError(message)
+        logger.warning(message)
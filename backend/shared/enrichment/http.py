@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+# Statuses worth retrying; anything else is returned to the caller as is
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class HostRateLimiter:
+    """Token bucket per host: `rate` requests per second with bursts of up to `burst`."""
+    _buckets: Dict[str, Tuple[float, float]]
+    _locks: Dict[str, asyncio.Lock]
+
+    def __init__(self,
+                 /,
+                 rate: float = 5.0,
+                 burst: int = 5,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate and burst must be positive")
+
+        self._buckets = {}
+        self._locks = {}
+        self._clock = clock
+        self.rate = rate
+        self.burst = burst
+
+    async def acquire(self, host: str) -> None:
+        lock = self._locks.get(host)
+        if lock is None:
+            lock = self._locks[host] = asyncio.Lock()
+
+        # Holding the lock while sleeping queues callers for the same host in arrival order
+        async with lock:
+            now = self._clock()
+            tokens, updated = self._buckets.get(host, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                await asyncio.sleep((1 - tokens) / self.rate)
+                now = self._clock()
+                tokens = 1.0
+            self._buckets[host] = (tokens - 1, now)
+
+
+class HttpCache:
+    """On-disk store of response bodies with their validators, used for conditional requests."""
+
+    def __init__(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def load(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(url), encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, url: str, response: httpx.Response) -> None:
+        entry = {"url": url,
+                 "etag": response.headers.get("etag"),
+                 "last_modified": response.headers.get("last-modified"),
+                 "status": response.status_code,
+                 "body": response.text}
+        path = self._path(url)
+        # Written to a temporary file first so an interrupted run never leaves a truncated entry
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(entry, file)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+
+class CachedFetcher:
+    """Rate-limited GETs with retries and conditional revalidation against an `HttpCache`."""
+
+    def __init__(self,
+                 client: httpx.AsyncClient,
+                 /,
+                 limiter: Optional[HostRateLimiter] = None,
+                 cache: Optional[HttpCache] = None,
+                 max_retries: int = 4,
+                 backoff: float = 0.5) -> None:
+        self._client = client
+        self._limiter = limiter
+        self._cache = cache
+        self._max_retries = max_retries
+        self._backoff = backoff
+
+        self.requests = 0
+        self.not_modified = 0
+        self.retries = 0
+
+    async def get(self, url: str) -> Tuple[int, Optional[str], bool]:
+        """Returns `(status, body, changed)`; `changed` is False when the cached copy was still current."""
+        entry = self._cache.load(url) if self._cache is not None else None
+        headers = HttpCache.conditional_headers(entry)
+        host = urlsplit(url).netloc
+
+        for attempt in range(self._max_retries + 1):
+            if self._limiter is not None:
+                await self._limiter.acquire(host)
+
+            try:
+                self.requests += 1
+                response = await self._client.get(url, headers=headers)
+            except httpx.TransportError:
+                if attempt == self._max_retries:
+                    raise
+            else:
+                if response.status_code == 304 and entry is not None:
+                    self.not_modified += 1
+                    return entry["status"], entry["body"], False
+
+                if response.status_code not in RETRY_STATUSES or attempt == self._max_retries:
+                    if self._cache is not None and response.status_code in (200, 404):
+                        self._cache.store(url, response)
+                    return response.status_code, response.text, True
+
+                retry_after = response.headers.get("retry-after", "")
+                if retry_after.isdigit():
+                    self.retries += 1
+                    await asyncio.sleep(float(retry_after))
+                    continue
+
+            self.retries += 1
+            # Exponential backoff with full jitter so parallel workers do not retry in lockstep
+            await asyncio.sleep(random.uniform(0, self._backoff * 2 ** attempt))
+
+        raise RuntimeError(f"Unreachable retry state for {url}")
@@ -0,0 +1,131 @@
+import asyncio
+import json
+from datetime import datetime
+from datetime import timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from pymongo import UpdateOne
+
+from db import collection_structures as coll
+from db.db import CollectionAdapters
+from shared.enrichment.http import CachedFetcher
+from shared.enrichment.http import HostRateLimiter
+from shared.enrichment.http import HttpCache
+from shared.ingest.writer import BulkWriter
+
+# Player fields filled from the profile source
+ENRICHED_FIELDS = (coll.Players.FULL_NAME, coll.Players.BATTING_STYLE, coll.Players.BOWLING_STYLE,
+                   coll.Players.ROLE, coll.Players.DATE_OF_BIRTH)
+
+
+def parse_profile(body: str) -> Dict[str, Any]:
+    """Maps a JSON profile to `Player` fields; unknown or empty values are left out."""
+    data = json.loads(body)
+    profile = {}
+    for field in (coll.Players.FULL_NAME, coll.Players.BATTING_STYLE, coll.Players.BOWLING_STYLE, coll.Players.ROLE):
+        value = data.get(field)
+        if isinstance(value, str) and value:
+            profile[field] = value
+
+    born = data.get(coll.Players.DATE_OF_BIRTH)
+    if isinstance(born, str) and born:
+        try:
+            profile[coll.Players.DATE_OF_BIRTH] = datetime.fromisoformat(born[:10])
+        except ValueError:
+            pass
+    return profile
+
+
+class PlayerEnricher:
+    """Fills profile fields of stored players from an HTTP source, `{base_url}/{cric_sheet_id}` per player.
+
+    Every processed player gets `profile_fetched_at`, so an interrupted run resumes where it stopped, and
+    responses are cached on disk so re-runs only transfer pages that changed.
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 /,
+                 cache_dir: str = ".cache/player_profiles",
+                 concurrency: int = 16,
+                 rate: float = 10.0,
+                 max_retries: int = 4,
+                 batch_size: int = 200,
+                 timeout: float = 10.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        if concurrency < 1:
+            raise ValueError("concurrency must be positive")
+
+        self._base_url = base_url.rstrip("/")
+        self._cache = HttpCache(cache_dir)
+        self._concurrency = concurrency
+        self._limiter = HostRateLimiter(rate=rate, burst=concurrency)
+        self._max_retries = max_retries
+        self._timeout = timeout
+        self._transport = transport
+        self.writer = BulkWriter(batch_size=batch_size, max_in_flight=2)
+
+        self.players = 0
+        self.updated = 0
+        self.not_found = 0
+        self.errors: List[Tuple[str, str]] = []
+        self.fetcher: Optional[CachedFetcher] = None
+
+    @staticmethod
+    def pending_query(refresh: bool = False) -> Dict[str, Any]:
+        """Players missing any enriched field; unless `refresh`, players already looked up are skipped."""
+        query: Dict[str, Any] = {"$or": [{field: None} for field in ENRICHED_FIELDS]}
+        if not refresh:
+            query[coll.Players.PROFILE_FETCHED_AT] = None
+        return query
+
+    async def enrich(self, /, refresh: bool = False, limit: int = 0) -> None:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._concurrency * 4)
+        limits = httpx.Limits(max_connections=self._concurrency, max_keepalive_connections=self._concurrency)
+
+        async with httpx.AsyncClient(limits=limits, timeout=self._timeout, transport=self._transport,
+                                     headers={"Accept": "application/json"}) as client:
+            self.fetcher = CachedFetcher(client, limiter=self._limiter, cache=self._cache,
+                                         max_retries=self._max_retries)
+            workers = [asyncio.create_task(self._work(queue)) for _ in range(self._concurrency)]
+            try:
+                cursor = await CollectionAdapters.PLAYERS.find_documents(
+                    self.pending_query(refresh), projection={coll.Players.CRIC_SHEET_ID: 1}, limit=limit,
+                    batch_size=1000)
+                async for player in cursor:
+                    await queue.put(player)
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+
+        await self.writer.flush()
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        while True:
+            player = await queue.get()
+            if player is None:
+                return
+
+            cric_sheet_id = player[coll.Players.CRIC_SHEET_ID]
+            try:
+                status, body, _ = await self.fetcher.get(f"{self._base_url}/{cric_sheet_id}")
+                if status == 200:
+                    profile = parse_profile(body)
+                elif status == 404:
+                    profile = {}
+                    self.not_found += 1
+                else:
+                    self.errors.append((cric_sheet_id, f"HTTP {status}"))
+                    continue
+            except (httpx.HTTPError, ValueError) as exc:
+                self.errors.append((cric_sheet_id, repr(exc)))
+                continue
+
+            self.players += 1
+            self.updated += 1 if profile else 0
+            update = {**profile, coll.Players.PROFILE_FETCHED_AT: datetime.now(timezone.utc)}
+            await self.writer.add(CollectionAdapters.PLAYERS, UpdateOne({"_id": player["_id"]}, {"$set": update}))
@@ -0,0 +1,549 @@
+import asyncio
+import hashlib
+import json
+import os
+import zipfile
+from datetime import datetime
+from datetime import timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import DeleteMany
+from pymongo import UpdateOne
+
+from db import collection_structures as coll
+from db.db import CollectionAdapters
+from shared.analytics.charts import build_chart
+from shared.db_adapters import CollectionAdapter
+from shared.ingest.writer import BulkWriter
+from shared.models import cricket
+from shared.models.columnar import InningsColumnsBuilder
+from shared.models.common.base import BaseModel
+from shared.scoring.scorecard import ScorecardEngine
+
+# Upper bound on natural keys sent in a single lookup query
+_LOOKUP_SLICE = 500
+
+# Ball-by-ball storage: one document per over/delivery, packed innings columns, or both
+LAYOUTS = ("documents", "columnar", "both")
+
+
+def iter_match_files(path: str) -> Iterator[Tuple[str, bytes]]:
+    """Yields `(cric_sheet_id, raw_json)` for every match file in a directory, zip archive or single file."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for name in sorted(archive.namelist()):
+                if name.endswith(".json"):
+                    yield _match_key(name), archive.read(name)
+    elif os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".json"):
+                with open(os.path.join(path, name), "rb") as file:
+                    yield _match_key(name), file.read()
+    else:
+        with open(path, "rb") as file:
+            yield _match_key(path), file.read()
+
+
+def derive_id(*parts: Any) -> ObjectId:
+    """Builds a stable ObjectId from a natural key so re-ingesting a file targets the same documents."""
+    digest = hashlib.blake2b("\x1f".join(str(part) for part in parts).encode(), digest_size=12).digest()
+    return ObjectId(digest)
+
+
+def _match_key(name: str) -> str:
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def _encode(model: BaseModel) -> Dict[str, Any]:
+    """Returns the stored document of `model` without an id, so upserts can decide it."""
+    document = model.to_dict()
+    document.pop("id", None)
+    document.pop("_id", None)
+    return document
+
+
+class DimensionResolver:
+    """Maps natural keys of a dimension collection to ids, looking up unknown keys in batches.
+
+    With `derive_ids`, new keys get `derive_id(derive_ids, *key)` rather than a random id, so runs that meet the same
+    key concurrently insert the same document.
+    """
+    _collection: CollectionAdapter
+    _derive_ids: Optional[str]
+    _ids: Dict[tuple, ObjectId]
+    _key_fields: Tuple[str, ...]
+
+    def __init__(self,
+                 collection: CollectionAdapter,
+                 key_fields: Tuple[str, ...],
+                 /,
+                 derive_ids: Optional[str] = None) -> None:
+        self._collection = collection
+        self._derive_ids = derive_ids
+        self._ids = {}
+        self._key_fields = key_fields
+
+    @property
+    def collection(self) -> CollectionAdapter:
+        return self._collection
+
+    def __getitem__(self, key: tuple) -> ObjectId:
+        return self._ids[key]
+
+    def key_filter(self, key: tuple) -> Dict[str, Any]:
+        return dict(zip(self._key_fields, key))
+
+    async def resolve(self, keys: Iterable[tuple]) -> Set[tuple]:
+        """Resolves ids for `keys` and returns the keys that do not exist in the database yet."""
+        missing = [key for key in set(keys) if key not in self._ids]
+
+        for start in range(0, len(missing), _LOOKUP_SLICE):
+            lookup = missing[start:start + _LOOKUP_SLICE]
+            if len(self._key_fields) == 1:
+                query = {self._key_fields[0]: {"$in": [key[0] for key in lookup]}}
+            else:
+                query = {"$or": [self.key_filter(key) for key in lookup]}
+
+            cursor = await self._collection.find_documents(query)
+            async for document in cursor:
+                self._ids[tuple(document.get(field) for field in self._key_fields)] = document["_id"]
+
+        new_keys = {key for key in missing if key not in self._ids}
+        for key in new_keys:
+            self._ids[key] = derive_id(self._derive_ids, *key) if self._derive_ids is not None else ObjectId()
+
+        return new_keys
+
+
+def content_hash(raw: bytes) -> str:
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+class CricsheetIngestor:
+    """Loads Cricsheet match files into every cricket collection using batched, ordered upserts.
+
+    Every loaded file is recorded in the `source_files` manifest with its revision and content hash. When
+    `incremental`, files whose hash and layout match the manifest are skipped before being parsed, and a changed file
+    replaces the stored documents of its match only. With `prune`, matches whose file is no longer at the ingested
+    path are deleted along with their manifest entry.
+    """
+    _chunk_size: int
+    _hashes: Dict[str, str]
+    _incremental: bool
+    _layout: str
+    _prune: bool
+    _sources: List[cricket.SourceFileModel]
+    _written: Dict[str, Set[ObjectId]]
+    _writer: BulkWriter
+
+    def __init__(self,
+                 /,
+                 batch_size: int = 1000,
+                 max_in_flight: int = 4,
+                 chunk_size: int = 100,
+                 layout: str = "both",
+                 incremental: bool = True,
+                 prune: bool = False) -> None:
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout {layout!r}, expected one of {', '.join(LAYOUTS)}")
+
+        self._chunk_size = chunk_size
+        self._hashes = {}
+        self._incremental = incremental
+        self._layout = layout
+        self._prune = prune
+        self._sources = []
+        self._written = {}
+        self._writer = BulkWriter(batch_size=batch_size, max_in_flight=max_in_flight)
+        # Ids are derived from the natural keys, so concurrent or repeated runs agree on them
+        self._series = DimensionResolver(CollectionAdapters.SERIES,
+                                         (coll.Series.NAME, coll.Series.SEASON,
+                                          coll.Series.GENDER, coll.Series.MATCH_TYPE),
+                                         derive_ids="series")
+        self._teams = DimensionResolver(CollectionAdapters.TEAMS, (coll.Teams.NAME, coll.Teams.TEAM_TYPE),
+                                        derive_ids="team")
+        # Venue names repeat across cities (e.g. "Gymkhana Ground"), so a stadium is its name and city
+        self._stadiums = DimensionResolver(CollectionAdapters.STADIUM, (coll.Stadium.NAME, coll.Stadium.CITY),
+                                           derive_ids="stadium")
+        self._players = DimensionResolver(CollectionAdapters.PLAYERS, (coll.Players.CRIC_SHEET_ID,),
+                                          derive_ids="player")
+
+        self.matches = 0
+        self.deliveries = 0
+        self.replaced = 0
+        self.skipped = 0
+        self.deleted = 0
+        self.errors: List[Tuple[str, str]] = []
+
+    @property
+    def writer(self) -> BulkWriter:
+        return self._writer
+
+    async def ingest(self, path: str) -> None:
+        """Ingests every new or changed match file found at `path` and waits until all writes are acknowledged."""
+        known = await self._load_manifest() if self._incremental or self._prune else {}
+        seen = set()
+        chunk = []
+        for match_key, raw in iter_match_files(path):
+            seen.add(match_key)
+            digest = content_hash(raw)
+            # Hashing is far cheaper than decoding, so an unchanged archive is synced without parsing any JSON
+            if self._incremental and known.get(match_key) == (digest, self._layout):
+                self.skipped += 1
+                continue
+
+            try:
+                chunk.append((match_key, json.loads(raw)))
+            except ValueError as exc:
+                self.errors.append((match_key, str(exc)))
+            else:
+                self._hashes[match_key] = digest
+
+            if len(chunk) >= self._chunk_size:
+                await self.ingest_chunk(chunk)
+                chunk = []
+
+        if chunk:
+            await self.ingest_chunk(chunk)
+
+        await self._writer.flush()
+        # Recorded only once the match documents are acknowledged, so a failed run is retried in full next time
+        for source in self._sources:
+            await self._writer.add(CollectionAdapters.SOURCE_FILES,
+                                   UpdateOne({coll.SourceFiles.CRIC_SHEET_ID: source.cric_sheet_id},
+                                             {"$set": _encode(source)}, upsert=True))
+        self._sources = []
+        if self._prune:
+            await self._delete_matches(sorted(set(known) - seen))
+        await self._writer.flush()
+
+    @staticmethod
+    async def _load_manifest() -> Dict[str, Tuple[str, str]]:
+        """Maps the Cricsheet id of every recorded file to its content hash and layout."""
+        cursor = await CollectionAdapters.SOURCE_FILES.find_documents(
+            {}, projection={"_id": 0, coll.SourceFiles.CRIC_SHEET_ID: 1, coll.SourceFiles.CONTENT_HASH: 1,
+                            coll.SourceFiles.LAYOUT: 1})
+        return {document[coll.SourceFiles.CRIC_SHEET_ID]: (document[coll.SourceFiles.CONTENT_HASH],
+                                                           document[coll.SourceFiles.LAYOUT])
+                async for document in cursor}
+
+    @staticmethod
+    async def _stored_ids(collection: CollectionAdapter, field: str, values: List[Any]) -> List[ObjectId]:
+        ids = []
+        for start in range(0, len(values), _LOOKUP_SLICE):
+            cursor = await collection.find_documents({field: {"$in": values[start:start + _LOOKUP_SLICE]}},
+                                                     projection={"_id": 1})
+            ids.extend([document["_id"] async for document in cursor])
+        return ids
+
+    async def _delete_matches(self, match_keys: List[str]) -> None:
+        """Deletes the matches of files that were removed from the source, with everything stored under them."""
+        if not match_keys:
+            return
+
+        self._written = {}
+        await self._remove_stale([derive_id("match", match_key) for match_key in match_keys])
+        for start in range(0, len(match_keys), _LOOKUP_SLICE):
+            keys = match_keys[start:start + _LOOKUP_SLICE]
+            await self._writer.add(CollectionAdapters.MATCHES, DeleteMany({coll.Matches.CRIC_SHEET_ID: {"$in": keys}}))
+            await self._writer.add(CollectionAdapters.SOURCE_FILES,
+                                   DeleteMany({coll.SourceFiles.CRIC_SHEET_ID: {"$in": keys}}))
+        self.deleted += len(match_keys)
+
+    async def _remove_stale(self, match_ids: List[ObjectId]) -> int:
+        """Deletes innings, overs, deliveries, columns and charts stored for these matches that this run did not write,
+        and returns how many of the matches had innings stored.
+
+        Ids are derived from the file, so the upserts replace a re-ingested match in place; only what a new revision
+        dropped, such as overs of a shortened innings, is left over.
+        """
+        innings_ids, stored_matches = [], set()
+        for start in range(0, len(match_ids), _LOOKUP_SLICE):
+            cursor = await CollectionAdapters.INNINGS.find_documents(
+                {coll.Innings.MATCH_ID: {"$in": match_ids[start:start + _LOOKUP_SLICE]}},
+                projection={coll.Innings.MATCH_ID: 1})
+            async for document in cursor:
+                innings_ids.append(document["_id"])
+                stored_matches.add(document[coll.Innings.MATCH_ID])
+        if not innings_ids:
+            return 0
+
+        over_ids = await self._stored_ids(CollectionAdapters.OVERS, coll.Overs.INNINGS_ID, innings_ids)
+        stored = [
+            (CollectionAdapters.INNINGS, innings_ids),
+            (CollectionAdapters.INNINGS_COLUMNS,
+             await self._stored_ids(CollectionAdapters.INNINGS_COLUMNS, coll.InningsColumns.MATCH_ID, match_ids)),
+            (CollectionAdapters.INNINGS_CHARTS,
+             await self._stored_ids(CollectionAdapters.INNINGS_CHARTS, coll.InningsCharts.MATCH_ID, match_ids)),
+            (CollectionAdapters.OVERS, over_ids),
+            (CollectionAdapters.DELIVERIES,
+             await self._stored_ids(CollectionAdapters.DELIVERIES, coll.Deliveries.OVER_ID, over_ids)),
+        ]
+        for collection, ids in stored:
+            written = self._written.get(collection.collection_name, set())
+            stale = [document_id for document_id in ids if document_id not in written]
+            for start in range(0, len(stale), _LOOKUP_SLICE):
+                await self._writer.add(collection, DeleteMany({"_id": {"$in": stale[start:start + _LOOKUP_SLICE]}}))
+        return len(stored_matches)
+
+    async def ingest_chunk(self, chunk: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Resolves the dimensions referenced by a group of matches, then queues every document they produce."""
+        series_keys, team_keys, stadium_keys, player_names = {}, set(), set(), {}
+        for _, data in chunk:
+            info = data["info"]
+            series_keys[self._series_key(info)] = None
+            team_keys.update((team, info.get("team_type", "")) for team in info.get("teams", []))
+            stadium_keys.add(self._stadium_key(info))
+            for name, cric_sheet_id in info.get("registry", {}).get("people", {}).items():
+                player_names.setdefault((cric_sheet_id,), name)
+
+        new_series, new_teams, new_stadiums, new_players = await asyncio.gather(
+            self._series.resolve(series_keys),
+            self._teams.resolve(team_keys),
+            self._stadiums.resolve(stadium_keys),
+            self._players.resolve(player_names),
+        )
+
+        series_teams: Dict[tuple, Set[ObjectId]] = {key: set() for key in series_keys}
+        player_teams: Dict[tuple, Set[ObjectId]] = {key: set() for key in player_names}
+        for _, data in chunk:
+            info = data["info"]
+            registry = info.get("registry", {}).get("people", {})
+            for team, players in info.get("players", {}).items():
+                team_id = self._teams[(team, info.get("team_type", ""))]
+                series_teams[self._series_key(info)].add(team_id)
+                for name in players:
+                    if name in registry:
+                        player_teams[(registry[name],)].add(team_id)
+
+        for key in new_teams:
+            team = cricket.Team(name=key[0], team_type=key[1])
+            await self._insert_dimension(self._teams, key, team)
+
+        for key in new_stadiums:
+            stadium = cricket.Stadium(name=key[0], city=key[1])
+            await self._insert_dimension(self._stadiums, key, stadium)
+
+        for key, team_ids in series_teams.items():
+            series = cricket.Series(**self._series.key_filter(key)) if key in new_series else None
+            await self._merge_teams(self._series, key, series, team_ids)
+
+        for key, team_ids in player_teams.items():
+            # Cricsheet only has the short name ("MS Dhoni"); the full name is left to the profile enrichment
+            player = cricket.Player(cric_sheet_id=key[0], name=player_names[key]) if key in new_players else None
+            await self._merge_teams(self._players, key, player, team_ids)
+
+        built = []
+        self._written = {}
+        for match_key, data in chunk:
+            try:
+                built.append((match_key, data, self._build_match(match_key, data)))
+            except (KeyError, TypeError, ValueError) as exc:
+                self.errors.append((match_key, f"{type(exc).__name__}: {exc}"))
+
+        if built:
+            # Looked up before the new documents are queued, so only what earlier runs stored is seen
+            self.replaced += await self._remove_stale([derive_id("match", match_key) for match_key, _, _ in built])
+
+        ingested_at = datetime.now(timezone.utc)
+        for match_key, data, operations in built:
+            for collection, operation in operations:
+                await self._writer.add(collection, operation)
+            self.matches += 1
+
+            digest = self._hashes.pop(match_key, None)
+            if digest is not None:
+                meta = data.get("meta", {})
+                self._sources.append(cricket.SourceFileModel(cric_sheet_id=match_key,
+                                                             match_id=derive_id("match", match_key),
+                                                             revision=int(meta.get("revision", 0)),
+                                                             data_version=str(meta.get("data_version", "")),
+                                                             content_hash=digest,
+                                                             layout=self._layout,
+                                                             ingested_at=ingested_at))
+
+    async def _insert_dimension(self, resolver: DimensionResolver, key: tuple, model: BaseModel) -> None:
+        document = _encode(model)
+        document["_id"] = resolver[key]
+        operation = UpdateOne(resolver.key_filter(key), {"$setOnInsert": document}, upsert=True)
+        await self._writer.add(resolver.collection, operation)
+
+    async def _merge_teams(self,
+                           resolver: DimensionResolver,
+                           key: tuple,
+                           model: Optional[BaseModel],
+                           team_ids: Set[ObjectId]) -> None:
+        update: Dict[str, Any] = {}
+        if team_ids:
+            update["$addToSet"] = {coll.Series.TEAMS: {"$each": sorted(team_ids)}}
+
+        if model is not None:
+            document = _encode(model)
+            document.pop(coll.Series.TEAMS, None)
+            document["_id"] = resolver[key]
+            update["$setOnInsert"] = document
+
+        if update:
+            await self._writer.add(resolver.collection, UpdateOne(resolver.key_filter(key), update, upsert=True))
+
+    @staticmethod
+    def _series_key(info: Dict[str, Any]) -> tuple:
+        name = info.get("event", {}).get("name") or " v ".join(info.get("teams", []))
+        return name, str(info["season"]), info["gender"], info["match_type"]
+
+    @staticmethod
+    def _stadium_key(info: Dict[str, Any]) -> tuple:
+        return info.get("venue", ""), info.get("city", "")
+
+    def _build_match(self, match_key: str, data: Dict[str, Any]) -> List[Tuple[CollectionAdapter, UpdateOne]]:
+        info = data["info"]
+        registry = info.get("registry", {}).get("people", {})
+        team_type = info.get("team_type", "")
+
+        def player(name: str) -> ObjectId:
+            return self._players[(registry[name],)]
+
+        def team_players(team: str) -> cricket.TeamPlayers:
+            return cricket.TeamPlayers(team_id=self._teams[(team, team_type)],
+                                       players=[player(name) for name in info.get("players", {}).get(team, [])])
+
+        officials = info.get("officials", {})
+        outcome = info.get("outcome", {})
+        winner = outcome.get("winner") or outcome.get("eliminator")
+        player_of_match = info.get("player_of_match", [])
+        team_1, team_2 = info["teams"]
+
+        match_id = derive_id("match", match_key)
+        match = cricket.Match(
+            cric_sheet_id=match_key,
+            dates=[datetime.strptime(day, "%Y-%m-%d") for day in info["dates"]],
+            match_number=int(info.get("event", {}).get("match_number", 0)),
+            outcome=cricket.Outcome(by_runs=outcome.get("by", {}).get("runs"),
+                                    by_wickets=outcome.get("by", {}).get("wickets"),
+                                    is_draw=outcome.get("result") == "draw",
+                                    winner=winner or "") if winner or outcome.get("result") == "draw" else None,
+            player_of_match=player(player_of_match[0]) if player_of_match else None,
+            series=self._series[self._series_key(info)],
+            team_1=team_players(team_1),
+            team_2=team_players(team_2),
+            umpires=cricket.Officials(**{role: [player(name) for name in officials.get(role, [])]
+                                         for role in ("match_referees", "reserve_umpires", "tv_umpires", "umpires")}),
+            venue=self._stadiums[self._stadium_key(info)],
+        )
+
+        operations = [self._upsert(CollectionAdapters.MATCHES, {coll.Matches.CRIC_SHEET_ID: match_key}, match_id,
+                                   match)]
+
+        balls_per_over = info.get("balls_per_over", 6)
+        for innings_number, innings in enumerate(data.get("innings", [])):
+            operations.extend(self._build_innings(match_key, match_id, innings_number, innings,
+                                                  self._teams[(innings["team"], team_type)], player, balls_per_over,
+                                                  player_of_match[0] if player_of_match else None))
+
+        return operations
+
+    def _build_innings(self,
+                       match_key: str,
+                       match_id: ObjectId,
+                       innings_number: int,
+                       innings: Dict[str, Any],
+                       team_id: ObjectId,
+                       player: Callable[[str], ObjectId],
+                       balls_per_over: int,
+                       player_of_match: Optional[str]) -> List[Tuple[CollectionAdapter, UpdateOne]]:
+        innings_id = derive_id("innings", match_key, innings_number)
+        operations = []
+        over_ids = []
+        documents = self._layout != "columnar"
+        # Columns are always packed: the chart series are derived from them even when they are not stored
+        columns = InningsColumnsBuilder()
+        scorecard = ScorecardEngine(innings["team"], balls_per_over=balls_per_over)
+
+        for over in innings.get("overs", []):
+            over_id = derive_id("over", match_key, innings_number, over["over"])
+            delivery_ids = []
+
+            for delivery_number, delivery in enumerate(over["deliveries"], start=1):
+                delivery_id = derive_id("delivery", match_key, innings_number, over["over"], delivery_number)
+                delivery_extras = delivery.get("extras", {})
+                scorecard.add_cricsheet_delivery(over["over"], delivery)
+
+                model = cricket.DeliveryModel(
+                    delivery_id=delivery_id,
+                    over_id=over_id,
+                    delivery_number=delivery_number,
+                    batter=player(delivery["batter"]),
+                    bowler=player(delivery["bowler"]),
+                    non_striker=player(delivery["non_striker"]),
+                    runs=cricket.RunsModel(runs_by_batter=delivery["runs"]["batter"],
+                                           extras=delivery["runs"]["extras"],
+                                           total=delivery["runs"]["total"]),
+                    extras=self._extras(delivery_extras) if delivery_extras else None,
+                    wickets=[cricket.WicketModel(kind=wicket["kind"],
+                                                 player_out=player(wicket["player_out"]),
+                                                 fielders=[player(fielder["name"])
+                                                           for fielder in wicket.get("fielders", [])
+                                                           if "name" in fielder])
+                             for wicket in delivery.get("wickets", [])],
+                )
+
+                columns.append(over["over"], model)
+                if documents:
+                    delivery_ids.append(delivery_id)
+                    operations.append(self._upsert(CollectionAdapters.DELIVERIES,
+                                                   {coll.Deliveries.DELIVERY_ID: delivery_id}, delivery_id, model))
+                self.deliveries += 1
+
+            if documents:
+                over_model = cricket.OverModel(over_id=over_id,
+                                               innings_id=innings_id,
+                                               over_number=over["over"],
+                                               deliveries=delivery_ids)
+                over_ids.append(over_id)
+                operations.append(self._upsert(CollectionAdapters.OVERS, {coll.Overs.OVER_ID: over_id}, over_id,
+                                               over_model))
+
+        powerplays = innings.get("powerplays", [])
+        target = innings.get("target")
+        innings_model = cricket.InningsModel(
+            innings_id=innings_id,
+            match_id=match_id,
+            innings_number=innings_number,
+            team=team_id,
+            overs=over_ids,
+            power_play=cricket.PowerplayModel(from_over=float(powerplays[0]["from"]),
+                                              to_over=float(powerplays[0]["to"]),
+                                              type=powerplays[0].get("type", "")) if powerplays else None,
+            target=cricket.TargetModel(overs=int(target.get("overs", 0)),
+                                       runs=target["runs"]) if target and "runs" in target else None,
+            scoreboard=scorecard.scorecard(player_of_match),
+        )
+        operations.append(self._upsert(CollectionAdapters.INNINGS, {coll.Innings.INNINGS_ID: innings_id}, innings_id,
+                                       innings_model))
+
+        columns_model = columns.build(innings_id, match_id, innings_number, team_id)
+        if self._layout != "documents":
+            operations.append(self._upsert(CollectionAdapters.INNINGS_COLUMNS,
+                                           {coll.InningsColumns.INNINGS_ID: innings_id}, innings_id, columns_model))
+        chart = build_chart(columns_model, balls_per_over=balls_per_over, target=innings_model.target)
+        operations.append(self._upsert(CollectionAdapters.INNINGS_CHARTS,
+                                       {coll.InningsCharts.INNINGS_ID: innings_id}, innings_id, chart))
+        return operations
+
+    @staticmethod
+    def _extras(extras: Dict[str, int]) -> cricket.Extras:
+        return cricket.Extras(byes=extras.get("byes", 0),
+                              leg_byes=extras.get("legbyes", 0),
+                              no_balls=extras.get("noballs", 0),
+                              penalty_runs=extras.get("penalty", 0),
+                              wides=extras.get("wides", 0))
+
+    def _upsert(self,
+                collection: CollectionAdapter,
+                key_filter: Dict[str, Any],
+                document_id: ObjectId,
+                model: BaseModel) -> Tuple[CollectionAdapter, UpdateOne]:
+        self._written.setdefault(collection.collection_name, set()).add(document_id)
+        return collection, UpdateOne(key_filter, {"$set": _encode(model), "$setOnInsert": {"_id": document_id}},
+                                     upsert=True)
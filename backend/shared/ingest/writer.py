@@ -0,0 +1,80 @@
+import asyncio
+from typing import Any, Dict, List, Set
+
+from shared.db_adapters import CollectionAdapter
+
+
+class BulkWriter:
+    """Buffers write operations per collection and flushes them as ordered `bulk_write` batches."""
+    _batch_size: int
+    _buffers: Dict[str, List[Any]]
+    _collections: Dict[str, CollectionAdapter]
+    _failures: List[BaseException]
+    _in_flight: asyncio.Semaphore
+    _tasks: Set[asyncio.Task]
+
+    def __init__(self,
+                 /,
+                 batch_size: int = 1000,
+                 max_in_flight: int = 4) -> None:
+        if batch_size < 1 or max_in_flight < 1:
+            raise ValueError("batch_size and max_in_flight must be positive")
+
+        self._batch_size = batch_size
+        self._buffers = {}
+        self._collections = {}
+        self._failures = []
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._tasks = set()
+        self.operations = 0
+        self.batches = 0
+
+    async def add(self,
+                  collection: CollectionAdapter,
+                  operation: Any,
+                  /) -> None:
+        """Queues an operation, waiting for a free slot when the batch is full and too many are in flight."""
+        name = collection.collection_name
+        self._collections[name] = collection
+        buffer = self._buffers.setdefault(name, [])
+        buffer.append(operation)
+
+        if len(buffer) >= self._batch_size:
+            await self._send(name)
+
+    async def flush(self) -> None:
+        """Sends every buffered operation and waits for all in-flight batches to finish."""
+        for name in list(self._buffers):
+            if self._buffers[name]:
+                await self._send(name)
+
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+        self._raise_failed()
+
+    async def _send(self, name: str) -> None:
+        batch = self._buffers[name]
+        self._buffers[name] = []
+
+        self._raise_failed()
+        # Acquired before the task is created so producers block once `max_in_flight` batches are pending
+        await self._in_flight.acquire()
+
+        task = asyncio.create_task(self._write(self._collections[name], batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, collection: CollectionAdapter, batch: List[Any]) -> None:
+        try:
+            await collection.bulk_write(batch, ordered=True)
+            self.operations += len(batch)
+            self.batches += 1
+        except Exception as exc:
+            self._failures.append(exc)
+        finally:
+            self._in_flight.release()
+
+    def _raise_failed(self) -> None:
+        if self._failures:
+            raise self._failures[0]
@@ -0,0 +1,295 @@
+import asyncio
+import logging
+from datetime import datetime
+from datetime import timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import UpdateOne
+
+from db import collection_structures as coll
+from db.db import CollectionAdapters
+from shared.api.encoding import encode_json
+from shared.models import cricket
+from shared.scoring.scorecard import ScorecardEngine
+
+logger = logging.getLogger(__name__)
+
+# Cricsheet extras keys a live delivery may carry
+EXTRAS_KEYS = frozenset({"byes", "legbyes", "noballs", "penalty", "wides"})
+
+
+def validate_delivery(delivery: Any) -> None:
+    """Checks a delivery has the `innings[].overs[].deliveries[]` shape the scorecard engine reads."""
+    if not isinstance(delivery, dict):
+        raise ValueError(f"Expected a delivery object, got {type(delivery).__name__}")
+
+    for key in ("batter", "bowler", "non_striker"):
+        if not isinstance(delivery.get(key), str) or not delivery[key]:
+            raise ValueError(f"Delivery needs a {key} name")
+
+    runs = delivery.get("runs")
+    if not isinstance(runs, dict) or not all(isinstance(runs.get(key), int) for key in ("batter", "extras", "total")):
+        raise ValueError("Delivery needs integer runs.batter, runs.extras and runs.total")
+
+    extras = delivery.get("extras", {})
+    if not isinstance(extras, dict) or not set(extras) <= EXTRAS_KEYS \
+            or not all(isinstance(value, int) for value in extras.values()):
+        raise ValueError(f"Delivery extras must map {sorted(EXTRAS_KEYS)} to integers")
+
+    for wicket in delivery.get("wickets", []):
+        if not isinstance(wicket, dict) or not isinstance(wicket.get("kind"), str) \
+                or not isinstance(wicket.get("player_out"), str):
+            raise ValueError("Each wicket needs a kind and a player_out")
+
+
+class LiveMatch:
+    """State of one match in progress, shared by every viewer; the scoreboard is encoded once per change."""
+    balls_per_over: int
+    finished: bool
+    match_key: str
+    sequence: int
+    viewers: int
+    _batch_size: int
+    _changed: asyncio.Event
+    _encoded: Optional[Tuple[int, bytes]]
+    _flush_interval: float
+    _flush_task: Optional[asyncio.Task]
+    _flushing: asyncio.Lock
+    _innings: Dict[int, ScorecardEngine]
+    _last_ball: Optional[Dict[str, Any]]
+    _pending: List[UpdateOne]
+
+    def __init__(self,
+                 match_key: str,
+                 /,
+                 balls_per_over: int = 6,
+                 batch_size: int = 12,
+                 flush_interval: float = 1.0) -> None:
+        self.balls_per_over = balls_per_over
+        self.finished = False
+        self.match_key = match_key
+        self.sequence = 0
+        self.viewers = 0
+        self._batch_size = batch_size
+        self._changed = asyncio.Event()
+        self._encoded = None
+        self._flush_interval = flush_interval
+        self._flush_task = None
+        self._flushing = asyncio.Lock()
+        self._innings = {}
+        self._last_ball = None
+        self._pending = []
+
+    def _apply(self, innings_number: int, team: str, over_number: int, delivery: Dict[str, Any]) -> None:
+        engine = self._innings.get(innings_number)
+        if engine is None:
+            engine = self._innings[innings_number] = ScorecardEngine(team, balls_per_over=self.balls_per_over)
+        engine.add_cricsheet_delivery(over_number, delivery)
+        self._last_ball = {"innings_number": innings_number, "over": over_number, "sequence": self.sequence,
+                           "delivery": delivery}
+        self.sequence += 1
+
+    @property
+    def version(self) -> int:
+        """Scoreboard version: one per delivery plus one for the finish, so a restart replays to the same number."""
+        return self.sequence + self.finished
+
+    def _notify(self) -> None:
+        # Waiters hold the old event; replacing it means a slow viewer wakes once however many changes it missed
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def replay(self,
+               deliveries: Sequence[cricket.LiveDeliveryModel],
+               /,
+               finished: bool = False) -> None:
+        """Rebuilds the state from the persisted log, in sequence order, without writing anything."""
+        for stored in deliveries:
+            if stored.sequence != self.sequence:
+                raise ValueError(f"Live log of {self.match_key} has a gap at sequence {self.sequence}")
+            self._apply(stored.innings_number, stored.team, stored.over_number, stored.delivery)
+        self.finished = self.finished or finished
+        if deliveries or finished:
+            self._notify()
+
+    def add_over(self,
+                 innings_number: int,
+                 team: str,
+                 over_number: int,
+                 deliveries: Sequence[Dict[str, Any]],
+                 /,
+                 first_sequence: Optional[int] = None) -> int:
+        """Appends deliveries of one over and returns how many were new.
+
+        With `first_sequence`, the position of the first delivery in the match, deliveries the feed re-sends are
+        skipped, so a feed can retry a batch safely.
+        """
+        if self.finished:
+            raise ValueError(f"Match {self.match_key} is finished")
+        if innings_number < 0 or over_number < 0:
+            raise ValueError("innings and over must not be negative")
+        for delivery in deliveries:
+            validate_delivery(delivery)
+        engine = self._innings.get(innings_number)
+        if engine is not None and engine.team != team:
+            raise ValueError(f"Innings {innings_number} is batted by {engine.team}, not {team}")
+
+        if first_sequence is not None:
+            if first_sequence > self.sequence:
+                raise ValueError(f"Deliveries from {self.sequence} to {first_sequence - 1} are missing")
+            deliveries = deliveries[self.sequence - first_sequence:]
+
+        received_at = datetime.now(timezone.utc)
+        for delivery in deliveries:
+            document = cricket.LiveDeliveryModel(match_key=self.match_key, sequence=self.sequence,
+                                                 innings_number=innings_number, team=team, over_number=over_number,
+                                                 delivery=delivery, received_at=received_at).to_dict()
+            self._pending.append(UpdateOne({coll.LiveDeliveries.MATCH_KEY: self.match_key,
+                                            coll.LiveDeliveries.SEQUENCE: self.sequence},
+                                           {"$setOnInsert": document}, upsert=True))
+            self._apply(innings_number, team, over_number, delivery)
+
+        if deliveries:
+            self._notify()
+            self._schedule_flush()
+        return len(deliveries)
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            delay = 0.0 if len(self._pending) >= self._batch_size else self._flush_interval
+            self._flush_task = asyncio.create_task(self._flush_after(delay))
+
+    async def _flush_after(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Could not persist live deliveries of %s; retrying with the next batch", self.match_key)
+
+    async def flush(self) -> None:
+        """Writes the buffered deliveries; the upserts are keyed by sequence, so a failed batch can be re-sent."""
+        async with self._flushing:
+            while self._pending:
+                batch, self._pending = self._pending[:self._batch_size], self._pending[self._batch_size:]
+                try:
+                    await CollectionAdapters.LIVE_DELIVERIES.bulk_write(batch, ordered=False)
+                except Exception:
+                    self._pending[:0] = batch
+                    raise
+
+    async def finish(self) -> None:
+        """Marks the match as over, sends viewers the final scoreboard and persists what is left.
+
+        The finish is written after the deliveries, so a restart never sees a finished match with a shorter log.
+        """
+        if not self.finished:
+            self.finished = True
+            self._notify()
+        await self.flush()
+        document = cricket.LiveMatchModel(match_key=self.match_key, finished_at=datetime.now(timezone.utc)).to_dict()
+        await CollectionAdapters.LIVE_MATCHES.bulk_write([UpdateOne({coll.LiveMatches.MATCH_KEY: self.match_key},
+                                                                    {"$setOnInsert": document}, upsert=True)])
+
+    def scoreboard(self) -> Dict[str, Any]:
+        innings = []
+        for innings_number, engine in sorted(self._innings.items()):
+            scorecard = engine.scorecard()
+            innings.append({
+                "innings_number": innings_number,
+                "team": engine.team,
+                "score": engine.team_score(),
+                "partnership": engine.current_partnership(),
+                "batting": scorecard.batting_performance,
+                "bowling": scorecard.bowling_performance,
+                "extras": scorecard.extras,
+                "fall_of_wickets": scorecard.fall_of_wickets,
+            })
+        return {"match_key": self.match_key, "version": self.version, "balls": self.sequence,
+                "finished": self.finished, "innings": innings, "last_ball": self._last_ball}
+
+    def encoded(self) -> bytes:
+        """The scoreboard as JSON, built once per version however many viewers ask for it."""
+        if self._encoded is None or self._encoded[0] != self.version:
+            self._encoded = (self.version, encode_json(self.scoreboard()))
+        return self._encoded[1]
+
+    async def updates(self,
+                      /,
+                      after: int = 0,
+                      heartbeat: Optional[float] = None) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+        """Yields `(version, scoreboard)` whenever the match changes after version `after`.
+
+        Viewers that fall behind get the newest scoreboard rather than every intermediate one, so a slow connection
+        never builds a backlog. With `heartbeat`, `(version, None)` is yielded after that many idle seconds. An
+        `after` newer than the match, e.g. from before the feed re-sent a shorter log, gets the scoreboard at once.
+        """
+        self.viewers += 1
+        try:
+            version = after
+            while True:
+                if self.version != version:
+                    version, finished = self.version, self.finished
+                    yield version, self.encoded()
+                    if finished:
+                        return
+                    continue
+
+                try:
+                    await asyncio.wait_for(self._changed.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield version, None
+        finally:
+            self.viewers -= 1
+
+
+class LiveMatches:
+    """Registry with one `LiveMatch` per match key, restored from the live log when first asked for."""
+    _batch_size: int
+    _flush_interval: float
+    _loading: asyncio.Lock
+    _matches: Dict[str, LiveMatch]
+
+    def __init__(self,
+                 /,
+                 batch_size: int = 12,
+                 flush_interval: float = 1.0) -> None:
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._loading = asyncio.Lock()
+        self._matches = {}
+
+    def __len__(self) -> int:
+        return len(self._matches)
+
+    async def get(self,
+                  match_key: str,
+                  /,
+                  create: bool = False) -> Optional[LiveMatch]:
+        """Returns the match, replaying its persisted deliveries if it is not in memory; `None` if unknown."""
+        match = self._matches.get(match_key)
+        if match is not None:
+            return match
+
+        async with self._loading:
+            match = self._matches.get(match_key)
+            if match is not None:
+                return match
+
+            stored = [delivery async for delivery in cricket.LiveDeliveryModel.find(
+                {coll.LiveDeliveries.MATCH_KEY: match_key}, sort=[(coll.LiveDeliveries.SEQUENCE, 1)], trusted=True)]
+            if not stored and not create:
+                return None
+
+            state = await cricket.LiveMatchModel.read_from_db({coll.LiveMatches.MATCH_KEY: match_key}, trusted=True)
+            match = LiveMatch(match_key, batch_size=self._batch_size, flush_interval=self._flush_interval)
+            match.replay(stored, finished=state is not None and state.finished_at is not None)
+            self._matches[match_key] = match
+            return match
+
+    async def close(self) -> None:
+        """Persists every buffered delivery, e.g. on shutdown."""
+        for match in list(self._matches.values()):
+            await match.flush()
+
+
+live_matches = LiveMatches()
@@ -0,0 +1,106 @@
+import sys
+from array import array
+from typing import Dict, Iterable, Tuple
+
+from bson import ObjectId
+
+from shared.models import cricket
+
+# stdlib typecodes for the NumPy dtypes declared on InningsColumnsModel
+_TYPECODES = {"<u1": "B", "<u2": "H"}
+_FLAGS = ("wides", "no_balls", "byes", "leg_byes", "wicket")
+
+
+class InningsColumnsBuilder:
+    """Accumulates the deliveries of one innings and packs them into an `InningsColumnsModel`."""
+    _balls: int
+    _columns: Dict[str, array]
+    _flags: Dict[str, bytearray]
+    _kinds: Dict[str, int]
+    _players: Dict[ObjectId, int]
+
+    def __init__(self) -> None:
+        self._balls = 0
+        self._columns = {
+            name: array(_TYPECODES[field.dtype])
+            for name, field in cricket.InningsColumnsModel._get_fields().items()
+            if isinstance(field, cricket.fields.ArrayField)
+        }
+        self._flags = {name: bytearray() for name in _FLAGS}
+        self._kinds = {}
+        self._players = {}
+
+    @classmethod
+    def from_deliveries(cls,
+                        overs: Iterable[Tuple[int, Iterable[cricket.DeliveryModel]]]) -> "InningsColumnsBuilder":
+        """Builds the columns from stored `(over_number, deliveries)` pairs."""
+        builder = cls()
+        for over_number, deliveries in overs:
+            for delivery in deliveries:
+                builder.append(over_number, delivery)
+        return builder
+
+    def append(self, over_number: int, delivery: cricket.DeliveryModel) -> None:
+        """Adds one delivery; deliveries must be appended in the order they were bowled."""
+        index = self._balls
+        self._balls += 1
+        if index % 8 == 0:
+            for flags in self._flags.values():
+                flags.append(0)
+
+        columns = self._columns
+        columns["over"].append(over_number)
+        columns["ball"].append(delivery.delivery_number)
+        columns["batter"].append(self._player(delivery.batter))
+        columns["bowler"].append(self._player(delivery.bowler))
+        columns["non_striker"].append(self._player(delivery.non_striker))
+        columns["runs_batter"].append(delivery.runs.runs_by_batter)
+        columns["runs_extras"].append(delivery.runs.extras)
+
+        extras = delivery.extras
+        if extras is not None:
+            self._flag("wides", index, extras.wides)
+            self._flag("no_balls", index, extras.no_balls)
+            self._flag("byes", index, extras.byes)
+            self._flag("leg_byes", index, extras.leg_byes)
+
+        for wicket in delivery.wickets or []:
+            self._flag("wicket", index, True)
+            columns["wicket_ball"].append(index)
+            columns["wicket_player"].append(self._player(wicket.player_out))
+            columns["wicket_kind"].append(self._kinds.setdefault(wicket.kind, len(self._kinds)))
+
+    def build(self,
+              innings_id: ObjectId,
+              match_id: ObjectId,
+              innings_number: int,
+              team: ObjectId) -> cricket.InningsColumnsModel:
+        packed = {}
+        for name, values in self._columns.items():
+            if sys.byteorder == "big":
+                values = array(values.typecode, values)
+                values.byteswap()
+            packed[name] = values.tobytes()
+
+        return cricket.InningsColumnsModel(
+            innings_id=innings_id,
+            match_id=match_id,
+            innings_number=innings_number,
+            team=team,
+            balls=self._balls,
+            players=list(self._players),
+            wicket_kinds=list(self._kinds),
+            **packed,
+            **{name: bytes(flags) for name, flags in self._flags.items()},
+        )
+
+    def _player(self, player_id: ObjectId) -> int:
+        index = self._players.setdefault(player_id, len(self._players))
+        if index > 0xFF:
+            raise ValueError("An innings cannot reference more than 256 players")
+        return index
+
+    def _flag(self, name: str, index: int, value) -> None:
+        if value:
+            self._flags[name][index >> 3] |= 1 << (index & 7)
+
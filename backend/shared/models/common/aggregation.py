@@ -0,0 +1,317 @@
+import typing
+
+from shared.models.common.fields import ListField
+from shared.models.common.fields import NestedField
+
+# Rows returned per batch when the caller does not choose
+DEFAULT_BATCH_SIZE = 1000
+
+# Sub-schema of a pipeline field: a model's field table, a plain mapping of names, or None when not checked
+Schema = typing.Optional[typing.Mapping[str, typing.Any]]
+
+
+class Row(dict):
+    """Result document of an aggregation; values read as keys or attributes, e.g. `row.runs` or `row["_id"]`."""
+    __slots__ = ()
+
+    def __getattr__(self, name: str) -> typing.Any:
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class Accumulator:
+    """`$group` accumulator over a field path of the documents entering the group."""
+    operator: str = ""
+    field: typing.Optional[str]
+
+    def __init__(self, field: typing.Optional[str] = None, /) -> None:
+        self.field = field
+
+    def expression(self) -> typing.Dict[str, typing.Any]:
+        return {self.operator: f"${self.field}"}
+
+
+class Sum(Accumulator):
+    operator = "$sum"
+
+
+class Avg(Accumulator):
+    operator = "$avg"
+
+
+class Min(Accumulator):
+    operator = "$min"
+
+
+class Max(Accumulator):
+    operator = "$max"
+
+
+class First(Accumulator):
+    operator = "$first"
+
+
+class Last(Accumulator):
+    operator = "$last"
+
+
+class Push(Accumulator):
+    operator = "$push"
+
+
+class AddToSet(Accumulator):
+    operator = "$addToSet"
+
+
+class Count(Accumulator):
+    """Number of documents in the group."""
+
+    def __init__(self) -> None:
+        super().__init__(None)
+
+    def expression(self) -> typing.Dict[str, typing.Any]:
+        return {"$sum": 1}
+
+
+def _model_schema(model: type) -> typing.Dict[str, typing.Any]:
+    # Documents are stored with `_id`; the `id` attribute of a model never reaches the database
+    schema = {name: field for name, field in model._fields.items() if name != "id"}
+    schema["_id"] = None
+    return schema
+
+
+def _children(descriptor: typing.Any) -> Schema:
+    """Schema below a field, or None when its contents are not described."""
+    if isinstance(descriptor, NestedField):
+        return _model_schema(descriptor.model_class)
+    if isinstance(descriptor, ListField) and descriptor.item_model is not None:
+        return _model_schema(descriptor.item_model)
+    if isinstance(descriptor, type) and hasattr(descriptor, "_fields"):
+        return _model_schema(descriptor)
+    if isinstance(descriptor, dict):
+        return descriptor
+    return None
+
+
+class Pipeline:
+    """Aggregation pipeline over a model's collection that runs on the server and streams back `Row`s.
+
+    Stages are added with chained calls. Field paths are checked against the model definitions, and after a
+    `group`, `project` or `count` against the fields those stages produce, so a typo fails before the query is sent:
+
+        Match.aggregate().match({coll.Matches.SERIES: series_id}) \\
+            .group(coll.Matches.OUTCOME_WINNER, wins=Count()).sort(("wins", -1)).limit(10)
+    """
+    _model: type
+    _schema: Schema
+    _stages: typing.List[typing.Dict[str, typing.Any]]
+
+    def __init__(self, model: type, /) -> None:
+        self._model = model
+        self._schema = _model_schema(model)
+        self._stages = []
+
+    @property
+    def stages(self) -> typing.List[typing.Dict[str, typing.Any]]:
+        return list(self._stages)
+
+    def _check(self, path: str) -> None:
+        schema = self._schema
+        for part in path.split("."):
+            if schema is None or part.isdigit():
+                return
+            if part not in schema:
+                raise ValueError(f"Unknown field {path!r} in pipeline over {self._model.__name__}")
+            schema = _children(schema[part])
+
+    def _check_query(self, query: typing.Dict[str, typing.Any]) -> None:
+        for key, condition in query.items():
+            if key in ("$or", "$and", "$nor"):
+                for branch in condition:
+                    self._check_query(branch)
+            elif not key.startswith("$"):
+                self._check(key)
+
+    def _check_expression(self, expression: typing.Any) -> None:
+        if isinstance(expression, str) and expression.startswith("$"):
+            self._check(expression[1:])
+        elif isinstance(expression, dict):
+            for key, value in expression.items():
+                if key != "$literal":
+                    self._check_expression(value)
+        elif isinstance(expression, list):
+            for item in expression:
+                self._check_expression(item)
+
+    def _descriptor(self, path: str) -> typing.Any:
+        """What is known about the field at `path`, so later stages can still check paths below it."""
+        schema, descriptor = self._schema, None
+        for part in path.split("."):
+            if schema is None or part not in schema:
+                return None
+            descriptor = schema[part]
+            schema = _children(descriptor)
+        return descriptor
+
+    def match(self, query: typing.Dict[str, typing.Any], /) -> "Pipeline":
+        """Filters documents with a find query; put it first so the server can use an index."""
+        self._check_query(query)
+        self._stages.append({"$match": query})
+        return self
+
+    def group(self,
+              by: typing.Union[None, str, typing.Dict[str, str]],
+              /,
+              **accumulators: Accumulator) -> "Pipeline":
+        """Groups by a field path (or a mapping of names to paths, or None for one group) into `_id`."""
+        if isinstance(by, dict):
+            for path in by.values():
+                self._check(path)
+            key: typing.Any = {name: f"${path}" for name, path in by.items()}
+            key_schema: typing.Any = {name: self._descriptor(path) for name, path in by.items()}
+        elif by is not None:
+            self._check(by)
+            key, key_schema = f"${by}", self._descriptor(by)
+        else:
+            key, key_schema = None, None
+
+        specification = {"_id": key}
+        for name, accumulator in accumulators.items():
+            if accumulator.field is not None:
+                self._check(accumulator.field)
+            specification[name] = accumulator.expression()
+
+        self._stages.append({"$group": specification})
+        self._schema = {"_id": key_schema, **dict.fromkeys(accumulators)}
+        return self
+
+    def sort(self, *keys: typing.Union[str, typing.Tuple[str, int]]) -> "Pipeline":
+        """Sorts by field paths, ascending unless given as `(path, -1)`."""
+        order = {}
+        for key in keys:
+            path, direction = (key, 1) if isinstance(key, str) else key
+            self._check(path)
+            order[path] = direction
+        self._stages.append({"$sort": order})
+        return self
+
+    def skip(self, count: int, /) -> "Pipeline":
+        self._stages.append({"$skip": count})
+        return self
+
+    def limit(self, count: int, /) -> "Pipeline":
+        if count < 1:
+            raise ValueError("limit needs a positive count")
+        self._stages.append({"$limit": count})
+        return self
+
+    def unwind(self,
+               path: str,
+               /,
+               keep_empty: bool = False) -> "Pipeline":
+        """Emits one document per element of the array at `path`; `keep_empty` keeps documents without elements."""
+        self._check(path)
+        specification: typing.Any = f"${path}"
+        if keep_empty:
+            specification = {"path": specification, "preserveNullAndEmptyArrays": True}
+        self._stages.append({"$unwind": specification})
+        return self
+
+    def lookup(self,
+               model: type,
+               local_field: str,
+               foreign_field: str,
+               /,
+               into: str) -> "Pipeline":
+        """Joins documents of `model` whose `foreign_field` equals `local_field`, as an array in `into`."""
+        self._check(local_field)
+        if foreign_field != "_id" and foreign_field.split(".")[0] not in model._fields:
+            raise ValueError(f"Unknown field {foreign_field!r} of {model.__name__}")
+
+        self._stages.append({"$lookup": {"from": model._get_collection().collection_name,
+                                         "localField": local_field,
+                                         "foreignField": foreign_field,
+                                         "as": into}})
+        if self._schema is not None:
+            self._schema = {**self._schema, into: model}
+        return self
+
+    def project(self, *paths: str, **expressions: typing.Any) -> "Pipeline":
+        """Keeps `paths` and adds computed fields; an expression given as a string is a field path."""
+        specification: typing.Dict[str, typing.Any] = {}
+        schema: typing.Dict[str, typing.Any] = {}
+        for path in paths:
+            self._check(path)
+            specification[path] = 1
+            schema[path.split(".")[0]] = self._descriptor(path.split(".")[0])
+        for name, expression in expressions.items():
+            if isinstance(expression, str):
+                self._check(expression)
+                schema[name] = self._descriptor(expression)
+                expression = f"${expression}"
+            else:
+                self._check_expression(expression)
+                schema[name] = None
+            specification[name] = expression
+
+        if "_id" not in specification:
+            schema["_id"] = self._descriptor("_id")
+        self._stages.append({"$project": specification})
+        self._schema = schema
+        return self
+
+    def count(self, name: str, /) -> "Pipeline":
+        """Replaces the documents with a single `{name: count}` row."""
+        self._stages.append({"$count": name})
+        self._schema = {name: None}
+        return self
+
+    def run(self,
+            /,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            allow_disk_use: bool = True) -> "AggregateCursor":
+        return AggregateCursor(self._model, self.stages, batch_size=batch_size, allow_disk_use=allow_disk_use)
+
+    async def to_list(self, length: int) -> typing.List[Row]:
+        """Returns at most `length` rows."""
+        return await self.run().to_list(length)
+
+
+class AggregateCursor:
+    """Async iterator over the rows of a pipeline, fetched from the server in batches."""
+
+    def __init__(self,
+                 model: type,
+                 stages: typing.List[typing.Dict[str, typing.Any]],
+                 /,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 allow_disk_use: bool = True) -> None:
+        self._model = model
+        self._stages = stages
+        self._batch_size = batch_size
+        self._allow_disk_use = allow_disk_use
+        self._cursor = None
+
+    async def _get_cursor(self):
+        if self._cursor is None:
+            self._cursor = await self._model._get_collection().aggregate(self._stages,
+                                                                         allow_disk_use=self._allow_disk_use,
+                                                                         batch_size=self._batch_size)
+        return self._cursor
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Row:
+        cursor = await self._get_cursor()
+        return Row(await cursor.__anext__())
+
+    async def to_list(self, length: int) -> typing.List[Row]:
+        """Returns at most `length` rows."""
+        if length < 1:
+            raise ValueError("to_list needs a positive length cap")
+
+        cursor = await self._get_cursor()
+        return [Row(document) for document in await cursor.to_list(length)]
@@ -1,90 +1,605 @@
+import asyncio
+import copy
+import types
 import typing
 from bson import ObjectId
 from db.db import CollectionAdapters
+from shared.db_adapters.keyset import sort_values
+from shared.models.common.aggregation import Pipeline
 from shared.models.common.fields import BaseField
+from shared.models.common.fields import ListField
+from shared.models.common.fields import NestedField
+from shared.models.common.fields import ObjectIdField
+from shared.models.common.identity import current_identity_map
+from shared.models.common.indexes import Index
+from shared.models.common.pagination import DEFAULT_PAGE_SIZE
+from shared.models.common.pagination import Page
+from shared.models.common.pagination import decode_token
+from shared.models.common.pagination import encode_token
+from shared.models.common.pagination import keyset_sort
+
+
+_MISSING = object()
+
+# Names the generated functions rely on; field names may shadow builtins such as `type`
+_COMPILE_GLOBALS = {
+    "_MISSING": _MISSING,
+    "_ObjectId": ObjectId,
+    "_ValueError": ValueError,
+    "_isinstance": isinstance,
+    "_new": object.__new__,
+    "_type": type,
+}
+
+
+class UnloadedFieldError(AttributeError):
+    """Raised when reading a field that the projection of a query left out."""
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+# What to do when a field outside the projection is read
+ON_MISSING = ("raise", "fetch")
+
+
+class _LazyState:
+    """Raw document behind a lazily hydrated or projected instance."""
+    __slots__ = ("document", "fields", "trusted", "on_missing")
+
+    def __init__(self,
+                 document: dict,
+                 fields: typing.Optional[typing.Set[str]],
+                 trusted: bool,
+                 on_missing: str) -> None:
+        self.document = document
+        self.fields = fields
+        self.trusted = trusted
+        self.on_missing = on_missing
+
+    def is_loaded(self, name: str) -> bool:
+        return self.fields is None or name in self.fields or name in self.document
+
+
+def _diff(saved: dict,
+          current: dict,
+          prefix: str,
+          update: typing.Dict[str, dict],
+          fields: typing.Optional[typing.Mapping[str, BaseField]]) -> None:
+    """Adds the update operators that turn `saved` into `current` to `update`, descending into embedded documents."""
+    for name, value in current.items():
+        if name == "_id":
+            continue
+        old = saved.get(name, _MISSING)
+        if old == value:
+            continue
+
+        path = prefix + name
+        field = fields.get(name) if fields is not None else None
+        if isinstance(old, dict) and isinstance(value, dict):
+            _diff(old, value, path + ".", update, field.model_class._fields if isinstance(field, NestedField) else None)
+        elif isinstance(old, list) and isinstance(value, list) and len(old) < len(value) \
+                and value[:len(old)] == old:
+            appended = value[len(old):]
+            # Lists of ids are sets of references; `$addToSet` keeps concurrent writers from adding an id twice
+            as_set = isinstance(field, ListField) and isinstance(field.item_field, ObjectIdField) \
+                and len(set(appended)) == len(appended) and not set(appended).intersection(old)
+            update.setdefault("$addToSet" if as_set else "$push", {})[path] = {"$each": appended}
+        else:
+            update.setdefault("$set", {})[path] = value
+
+    # Keys dropped from an embedded document; top-level fields outside a projection are absent but unchanged
+    if prefix:
+        for name in saved.keys() - current.keys():
+            update.setdefault("$unset", {})[prefix + name] = ""
+
+
+def _compile_function(name: str, lines: typing.List[str], namespace: typing.Dict[str, typing.Any]):
+    exec("\n".join(lines), namespace)
+    return namespace[name]
+
+
+def _collect_fields(cls) -> typing.Dict[str, BaseField]:
+    fields = {}
+    for klass in reversed(cls.__mro__):
+        for attr, value in vars(klass).items():
+            if isinstance(value, BaseField):
+                if attr.startswith("_"):
+                    raise TypeError(f"Field names must not start with an underscore: {cls.__name__}.{attr}")
+                fields[attr] = value
+            elif attr in fields:
+                del fields[attr]
+    return fields
+
+
+def _compile_model(cls) -> None:
+    """Builds the frozen field table and the specialised `__init__`, `to_dict`, `validate` and `_decode` for `cls`."""
+    fields = _collect_fields(cls)
+    cls._fields = types.MappingProxyType(fields)
+
+    namespace = dict(_COMPILE_GLOBALS)
+    params = "".join(f"{name}=_MISSING, " for name in fields)
+    init = [f"def __init__(_self_, *, {params}**_kwargs_):"]
+    validate = ["def validate(_self_):"]
+    to_dict = ["def to_dict(_self_):",
+               "    if '_lazy' in _self_.__dict__:",
+               "        return _self_._lazy_to_dict()",
+               "    data = {" + ", ".join(f"{name!r}: _self_.{name}" for name in fields) + "}"]
+    decode = ["def _decode(_cls_, _data_, _trusted_=False):",
+              "    _self_ = _new(_cls_)",
+              "    _get_ = _data_.get"]
+    # Documents we wrote ourselves are copied wholesale; only defaults and nested values need work
+    trusted = ["    if _trusted_:",
+               "        _d_ = _self_.__dict__",
+               "        _d_.update(_data_)",
+               "        " + ("if '_id' in _d_: _d_['id'] = _d_.pop('_id')" if "id" in fields
+                            else "_d_['id'] = _d_.pop('_id', None)")]
+    decoders = {}
+    encoders = {}
+    if "id" not in fields:
+        init.append("    _self_.id = _kwargs_.get('id')")
+
+    for index, (name, field) in enumerate(fields.items()):
+        prefix = f"_f{index}_"
+        check = field.compile_check(name, namespace, prefix)
+
+        init.append(f"    if {name} is _MISSING:")
+        decode.append(f"    _v_ = _get_({name!r}, _MISSING)")
+        decode.append("    if _v_ is _MISSING:")
+        if field.mandatory:
+            init.append(f"        raise _ValueError('Missing required field: {name}')")
+            init.extend("    " + line for line in check)
+            decode.append(f"        raise _ValueError('Missing required field: {name}')")
+        else:
+            namespace[prefix + "default"] = field.default
+            # Mutable defaults are copied so instances never share the same list or dict
+            copy = ".copy()" if isinstance(field.default, (list, dict, set)) else ""
+            init.append(f"        {name} = {prefix}default{copy}")
+            init.append(f"    if {name} is not None:")
+            init.extend("        " + line for line in check)
+            decode.append(f"        _v_ = {prefix}default{copy}")
+            trusted.append(f"        if {name!r} not in _d_:")
+            trusted.append(f"            _d_[{name!r}] = {prefix}default{copy}")
+        init.append(f"    _self_.{name} = {name}")
+
+        validate.append(f"    {name} = _self_.{name}")
+        if field.mandatory:
+            validate.extend("    " + line for line in check)
+        else:
+            validate.append(f"    if {name} is not None:")
+            validate.extend("        " + line for line in check)
+
+        encoded = field.compile_encode("_v_", namespace, prefix + "enc_")
+        if encoded is not None:
+            to_dict.append(f"    _v_ = data[{name!r}]")
+            to_dict.append("    if _v_ is not None:")
+            to_dict.append(f"        data[{name!r}] = {encoded}")
+            encoders[name] = _compile_function(f"{prefix}encode",
+                                               [f"def {prefix}encode(_v_):", f"    return {encoded}"],
+                                               namespace)
+
+        decoded = field.compile_decode("_v_", namespace, prefix + "dec_")
+        if decoded is not None:
+            decode.append("    elif _v_ is not None:")
+            decode.append(f"        _v_ = {decoded}")
+            trusted.append(f"        _v_ = _d_.get({name!r})")
+            trusted.append("        if _v_ is not None:")
+            trusted.append(f"            _d_[{name!r}] = {decoded}")
+            decoders[name] = _compile_function(f"{prefix}decode",
+                                               [f"def {prefix}decode(_v_, _trusted_):", f"    return {decoded}"],
+                                               namespace)
+        decode.append(f"    _self_.{name} = _v_")
+
+    to_dict.extend(["    if _self_.id:",
+                    "        data['_id'] = _self_.id if _isinstance(_self_.id, _ObjectId) else _ObjectId(_self_.id)",
+                    "    else:",
+                    "        data.pop('id', None)",
+                    "    return data"])
+    if "id" in fields:
+        decode.extend(["    if '_id' in _data_:",
+                       "        _self_.id = _data_['_id']"])
+    else:
+        decode.append("    _self_.id = _get_('_id')")
+    decode.extend(["    _self_.validate()",
+                   "    return _self_"])
+    trusted.append("        return _self_")
+    decode[2:2] = trusted
+    validate.append("    return None")
+    cls._decoders = types.MappingProxyType(decoders)
+    cls._encoders = types.MappingProxyType(encoders)
+
+    for name, lines in (("__init__", init), ("to_dict", to_dict), ("validate", validate), ("_decode", decode)):
+        if name not in vars(cls):
+            function = _compile_function(name, lines, namespace)
+            function.__qualname__ = f"{cls.__qualname__}.{name}"
+            function.__doc__ = getattr(BaseModel, name).__doc__
+            setattr(cls, name, classmethod(function) if name == "_decode" else function)
 
 
 class BaseModel:
     collection_name: typing.ClassVar[str]
+    indexes: typing.ClassVar[typing.List[Index]] = []
+    # Dotted path of an ObjectId (or list of them) to the name of the stored model it points at, see `ReferenceLoader`
+    references: typing.ClassVar[typing.Dict[str, str]] = {}
+    # Called as `listener(instance, deleted)` after an instance was written through `save_to_db`, `update_in_db`,
+    # `delete_from_db` or a `UnitOfWork` flush; the name search index keeps itself current this way
+    write_listeners: typing.ClassVar[typing.List[typing.Callable[[typing.Any, bool], None]]] = []
+    _fields: typing.ClassVar[typing.Mapping[str, BaseField]] = types.MappingProxyType({})
+    _decoders: typing.ClassVar[typing.Mapping[str, typing.Callable]] = types.MappingProxyType({})
+    _encoders: typing.ClassVar[typing.Mapping[str, typing.Callable]] = types.MappingProxyType({})
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _compile_model(cls)
+        for path in cls.references:
+            if path.split(".")[0] not in cls._fields:
+                raise TypeError(f"Reference to an unknown field: {cls.__name__}.{path}")
 
     def __init__(self, **kwargs):
         """Initializes the model and assigns values dynamically."""
         self.id = kwargs.get("id")  # Ensure id is optional
 
-        for field_name, field in self._get_fields().items():
-            if field.mandatory and field_name not in kwargs:
-                raise ValueError(f"Missing required field: {field_name}")
-
-            value = kwargs.get(field_name, field.default)
-            field.validate(value)
-            setattr(self, field_name, value)  # Store values as attributes
-
     def to_dict(self):
-        """Converts the instance to a dictionary, handling ObjectId fields."""
-        data = {field: getattr(self, field) for field in self._get_fields()}
+        """Converts the instance to its BSON document, encoding nested models recursively."""
+        data = {}
 
         # Remove `None` id to avoid inserting it
         if self.id:
             data["_id"] = self.id if isinstance(self.id, ObjectId) else ObjectId(self.id)
-        else:
-            data.pop("id", None)
 
         return data
 
+    def validate(self):
+        """Validates the current field values, raising `ValueError` on the first invalid one."""
+
+    @classmethod
+    def _decode(cls, data: dict, trusted: bool = False):
+        """Builds an instance from its BSON document; `trusted` skips validation for documents we wrote ourselves."""
+        instance = cls.__new__(cls)
+        instance.id = data.get("_id")
+        return instance
+
     @classmethod
     def _get_fields(cls):
-        """Returns a dictionary of fields for the model."""
-        return {
-            attr: value for attr, value in cls.__dict__.items()
-            if isinstance(value, BaseField)
-        }
+        """Returns the compiled, read-only field table for the model."""
+        return cls._fields
 
     @classmethod
-    async def read_from_db(cls, query: dict):
-        """Fetches a single document from the database and returns an instance of the model."""
-        collection = getattr(CollectionAdapters, cls.collection_name, None)
+    def _get_collection(cls):
+        """Returns the collection adapter the model is stored in."""
+        collection = getattr(CollectionAdapters, getattr(cls, "collection_name", ""), None)
         if not collection:
             raise ValueError(f"Collection name not set for {cls.__name__}")
 
-        data = await collection.find_one(query)
-        if data:
-            data["id"] = data["_id"]  # Assign MongoDB `_id` to `id`
-        return cls(**data) if data else None
+        return collection
+
+    @classmethod
+    def _from_document(cls,
+                       data: dict,
+                       fields: typing.Optional[typing.Sequence[str]] = None,
+                       trusted: bool = False,
+                       lazy: bool = False,
+                       on_missing: str = "raise"):
+        """Builds an instance from a stored document.
+
+        With a projection (`fields`) or `lazy`, the raw document is kept and fields are decoded on first access;
+        reading a field outside the projection raises `UnloadedFieldError` or, with `on_missing="fetch"` and only
+        outside an event loop (e.g. in scripts), fetches that field from the database.
+        """
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            existing = identity_map.get(cls, data["_id"])
+            if existing is not None:
+                return existing
+
+        if fields is None and not lazy:
+            instance = cls._decode(data, trusted)
+            if identity_map is not None:
+                # Remembered first: a `UnitOfWork` treats instances without a stored state as new
+                instance._remember()
+                identity_map.add(instance)
+            return instance
+
+        instance = cls.__new__(cls)
+        instance.id = data["_id"]
+        instance._lazy = _LazyState(data, set(fields) if fields is not None else None, trusted, on_missing)
+        if fields is None:
+            if identity_map is not None:
+                instance._remember(data)
+                identity_map.add(instance)
+        elif not lazy:
+            for name in fields:
+                instance._load_field(name)
+
+        return instance
+
+    def _load_field(self, name: str):
+        """Decodes a field from the raw document on first access and keeps the result on the instance."""
+        state = self.__dict__.get("_lazy")
+        if state is None:
+            raise AttributeError(f"{type(self).__name__} has no value for {name}")
+
+        if not state.is_loaded(name):
+            hint = f"`await instance.load_fields({name!r})` first"
+            if state.on_missing != "fetch":
+                raise UnloadedFieldError(f"{type(self).__name__}.{name} was not part of the projection; {hint}")
+            if _in_event_loop():
+                # Attribute access cannot await, and a blocking round trip would stall every task on the loop
+                raise UnloadedFieldError(f"{type(self).__name__}.{name} cannot be fetched on access inside an "
+                                         f"event loop; {hint}")
+
+            document = self._get_collection().find_one_blocking({"_id": self.id}, projection={name: 1})
+            state.document.update(document or {})
+            state.fields.add(name)
+
+        field = self._fields[name]
+        value = state.document.get(name, _MISSING)
+        if value is _MISSING:
+            if field.mandatory and not state.trusted:
+                raise ValueError(f"Missing required field: {name}")
+            value = field.default.copy() if isinstance(field.default, (list, dict, set)) else field.default
+        elif value is not None:
+            decoder = self._decoders.get(name)
+            if decoder is not None:
+                value = decoder(value, state.trusted)
+            if not state.trusted:
+                field.validate(value)
+
+        self.__dict__[name] = value
+        return value
+
+    async def load_fields(self, *names: str) -> None:
+        """Fetches fields that the projection left out in a single round trip."""
+        state = self.__dict__.get("_lazy")
+        if state is None:
+            return
+
+        missing = [name for name in names if not state.is_loaded(name)]
+        if missing:
+            document = await self._get_collection().find_one({"_id": self.id},
+                                                             projection=dict.fromkeys(missing, 1))
+            state.document.update(document or {})
+            state.fields.update(missing)
+
+    def _lazy_to_dict(self) -> dict:
+        """Encodes touched fields and passes untouched values of the raw document through unchanged."""
+        state = self._lazy
+        values = self.__dict__
+        data = {}
+        for name in self._fields:
+            if name in values:
+                value = values[name]
+                encoder = self._encoders.get(name)
+                data[name] = encoder(value) if encoder is not None and value is not None else value
+            elif name in state.document:
+                data[name] = state.document[name]
+            elif state.fields is None:
+                data[name] = self._load_field(name)
+
+        if self.id:
+            data["_id"] = self.id
+        return data
+
+    @classmethod
+    async def read_from_db(cls,
+                           query: dict,
+                           /,
+                           trusted: bool = False,
+                           fields: typing.Optional[typing.Sequence[str]] = None,
+                           lazy: bool = False,
+                           on_missing: str = "raise"):
+        """Fetches a single document from the database and returns an instance of the model."""
+        cls._check_projection(fields, on_missing)
+        collection = cls._get_collection()
+
+        identity_map = current_identity_map()
+        if identity_map is not None and len(query) == 1 and isinstance(query.get("_id"), ObjectId):
+            existing = identity_map.get(cls, query["_id"])
+            if existing is not None:
+                return existing
+
+        projection = dict.fromkeys(fields, 1) if fields is not None else None
+        data = await collection.find_one(query, projection=projection)
+        return cls._from_document(data, fields, trusted, lazy, on_missing) if data else None
+
+    @classmethod
+    def find(cls,
+             query: typing.Optional[dict] = None,
+             /,
+             fields: typing.Optional[typing.Sequence[str]] = None,
+             sort: typing.Optional[typing.Sequence[typing.Tuple[str, int]]] = None,
+             limit: int = 0,
+             batch_size: int = 100,
+             trusted: bool = False,
+             lazy: bool = False,
+             on_missing: str = "raise") -> "ModelCursor":
+        """Streams matching documents as model instances, fetching only `fields` when given."""
+        cls._check_projection(fields, on_missing)
+        return ModelCursor(cls, query or {}, fields=fields, sort=sort, limit=limit, batch_size=batch_size,
+                           trusted=trusted, lazy=lazy, on_missing=on_missing)
+
+    @classmethod
+    async def page(cls,
+                   query: typing.Optional[dict] = None,
+                   /,
+                   sort: typing.Optional[typing.Sequence[typing.Tuple[str, int]]] = None,
+                   limit: int = DEFAULT_PAGE_SIZE,
+                   after: typing.Optional[str] = None,
+                   fields: typing.Optional[typing.Sequence[str]] = None,
+                   trusted: bool = False) -> Page:
+        """Returns up to `limit` matching instances in keyset order, continuing after the `after` token of the
+        previous page.
+
+        Each page seeks the index from the last sort key and `_id` of the page before, so page 10,000 costs the same as
+        page 1 and documents inserted meanwhile do not shift the pages. The query's equality fields followed by `sort`
+        must be covered by a declared index, see `keyset_sort`.
+        """
+        cls._check_projection(fields, "raise")
+        if limit < 1:
+            raise ValueError("A page needs a positive limit")
+
+        query = query or {}
+        order = keyset_sort(cls, query, sort)
+        projection = None
+        if fields is not None:
+            # The sort keys of the last document go into the token even when the caller does not read them
+            projection = dict.fromkeys([*fields, *(path for path, _ in order)], 1)
+
+        cursor = await cls._get_collection().find_documents(query,
+                                                            projection=projection,
+                                                            sort=order,
+                                                            limit=limit + 1,
+                                                            batch_size=limit + 1,
+                                                            after=decode_token(after, order) if after else None)
+        documents = await cursor.to_list(limit + 1)
+        next_token = encode_token(order, sort_values(documents[limit - 1], order)) if len(documents) > limit else None
+        return Page([cls._from_document(data, fields, trusted) for data in documents[:limit]], next_token)
+
+    @classmethod
+    def aggregate(cls) -> Pipeline:
+        """Starts an aggregation pipeline over the model's collection, see `Pipeline`."""
+        return Pipeline(cls)
+
+    @classmethod
+    def _check_projection(cls, fields: typing.Optional[typing.Sequence[str]], on_missing: str) -> None:
+        if on_missing not in ON_MISSING:
+            raise ValueError(f"on_missing must be one of {', '.join(ON_MISSING)}, got {on_missing!r}")
+
+        if fields is not None:
+            unknown = [name for name in fields if name not in cls._fields]
+            if unknown:
+                raise ValueError(f"Unknown fields for {cls.__name__}: {', '.join(unknown)}")
+
+    def _stored_document(self) -> dict:
+        """The document as stored; the `id` attribute is written as `_id` only."""
+        data = self.to_dict()
+        data.pop("id", None)
+        return data
+
+    def _remember(self, document: typing.Optional[dict] = None) -> None:
+        """Keeps a copy of the stored state so `changes` can tell which fields were modified since."""
+        self.__dict__["_saved"] = copy.deepcopy(document if document is not None else self._stored_document())
+
+    def _written(self, deleted: bool = False) -> None:
+        for listener in BaseModel.write_listeners:
+            listener(self, deleted)
+
+    def changes(self) -> typing.Optional[dict]:
+        """Update operators for the fields changed since the instance was loaded in an `IdentityMap` or last written,
+        e.g. `{"$addToSet": {"teams": {"$each": [team_id]}}}`; None when nothing changed.
+
+        When the stored state is not known every field is `$set`.
+        """
+        current = self._stored_document()
+        saved = self.__dict__.get("_saved")
+        if saved is None:
+            current.pop("_id", None)
+            return {"$set": current}
+
+        update: typing.Dict[str, dict] = {}
+        _diff(saved, current, "", update, self._fields)
+        return update or None
 
     async def save_to_db(self):
         """Inserts the current instance into the database and assigns an ID."""
-        collection = getattr(CollectionAdapters, self.collection_name, None)
-        if not collection:
-            raise ValueError(f"Collection name not set for {self.__class__.__name__}")
+        collection = self._get_collection()
 
-        data = self.to_dict()
+        data = self._stored_document()
         data.pop("_id", None)
 
         inserted_id = await collection.insert_one(data)
         self.id = inserted_id
+        self._remember()
+        self._written()
+
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.add(self)
 
     async def update_in_db(self):
-        """Updates the existing document in the database."""
-        collection = getattr(CollectionAdapters, self.collection_name, None)
-        if not collection:
-            raise ValueError(f"Collection name not set for {self.__class__.__name__}")
+        """Writes the fields changed since the instance was loaded or saved, see `changes`."""
+        collection = self._get_collection()
 
         if not self.id:
             raise ValueError("Cannot update an unsaved document")
 
-        data = self.to_dict()
-        query = {"_id": data.pop("id")}
-        update_data = {"$set": data}
+        update = self.changes()
+        if update is None:
+            return
 
-        await collection.update_one(query, update_data)
+        await collection.update_one({"_id": self.id}, update)
+        self._remember()
+        self._written()
 
     async def delete_from_db(self):
         """Deletes the document from the database."""
-        collection = getattr(CollectionAdapters, self.collection_name, None)
-        if not collection:
-            raise ValueError(f"Collection name not set for {self.__class__.__name__}")
+        collection = self._get_collection()
 
         if not self.id:
             raise ValueError("Cannot delete an unsaved document")
 
         await collection.delete_one({"_id": self.id})
+        self._written(deleted=True)
+
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.discard(self)
+
+
+class ModelCursor:
+    """Async iterator that hydrates documents into model instances as the server returns each batch."""
+
+    def __init__(self,
+                 model: typing.Type[BaseModel],
+                 query: dict,
+                 /,
+                 fields: typing.Optional[typing.Sequence[str]] = None,
+                 sort: typing.Optional[typing.Sequence[typing.Tuple[str, int]]] = None,
+                 limit: int = 0,
+                 batch_size: int = 100,
+                 trusted: bool = False,
+                 lazy: bool = False,
+                 on_missing: str = "raise") -> None:
+        self._model = model
+        self._query = query
+        self._fields = list(fields) if fields is not None else None
+        self._sort = sort
+        self._limit = limit
+        self._batch_size = batch_size
+        self._trusted = trusted
+        self._lazy = lazy
+        self._on_missing = on_missing
+        self._cursor = None
+
+    async def _get_cursor(self):
+        if self._cursor is None:
+            projection = dict.fromkeys(self._fields, 1) if self._fields is not None else None
+            self._cursor = await self._model._get_collection().find_documents(self._query,
+                                                                              projection=projection,
+                                                                              sort=self._sort,
+                                                                              limit=self._limit,
+                                                                              batch_size=self._batch_size)
+        return self._cursor
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        cursor = await self._get_cursor()
+        data = await cursor.__anext__()
+        return self._model._from_document(data, self._fields, self._trusted, self._lazy, self._on_missing)
+
+    async def to_list(self, length: int) -> typing.List[BaseModel]:
+        """Returns at most `length` instances."""
+        if length < 1:
+            raise ValueError("to_list needs a positive length cap")
+
+        cursor = await self._get_cursor()
+        documents = await cursor.to_list(length)
+        return [self._model._from_document(data, self._fields, self._trusted, self._lazy, self._on_missing)
+                for data in documents]
@@ -1,5 +1,6 @@
 from datetime import date
 from datetime import datetime
+from typing import Any, Dict, List, Optional
 
 from bson import ObjectId
 
@@ -10,10 +11,39 @@ class BaseField:
         self.desc = desc
         self.mandatory = mandatory
         self.default = None if mandatory else default  # Default is only applied if mandatory=False
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        # Only reached when the instance has no value yet, i.e. it was loaded lazily or with a projection
+        if instance is None:
+            return self
+        return instance._load_field(self.name)
 
     def validate(self, value):
         raise NotImplementedError("Subclasses must implement validate method")
 
+    def compile_check(self, var: str, namespace: Dict[str, Any], prefix: str) -> List[str]:
+        """Returns source lines that validate `var`; fields override this to inline their check."""
+        namespace[prefix + "validate"] = self.validate
+        return [f"{prefix}validate({var})"]
+
+    def compile_encode(self, var: str, namespace: Dict[str, Any], prefix: str) -> Optional[str]:
+        """Returns an expression converting a non-None `var` to its BSON form, or None when it is stored as is."""
+        return None
+
+    def compile_decode(self, var: str, namespace: Dict[str, Any], prefix: str) -> Optional[str]:
+        """Returns an expression rebuilding the value from a non-None BSON `var`, or None when it is read as is."""
+        return None
+
+    @staticmethod
+    def _compile_isinstance(var: str, expected: Any, label: str, namespace: Dict[str, Any], prefix: str) -> List[str]:
+        namespace[prefix + "type"] = expected
+        return [f"if not _isinstance({var}, {prefix}type):",
+                f"    raise _ValueError({'Expected ' + label + ', got '!r} + _type({var}).__name__)"]
+
 
 class StringField(BaseField):
 
@@ -24,6 +54,9 @@ class StringField(BaseField):
         if not isinstance(value, str):
             raise ValueError(f"Expected string, got {type(value).__name__}")
 
+    def compile_check(self, var, namespace, prefix):
+        return self._compile_isinstance(var, str, "string", namespace, prefix)
+
 
 class IntegerField(BaseField):
 
@@ -34,6 +67,9 @@ class IntegerField(BaseField):
         if not isinstance(value, int):
             raise ValueError(f"Expected integer, got {type(value).__name__}")
 
+    def compile_check(self, var, namespace, prefix):
+        return self._compile_isinstance(var, int, "integer", namespace, prefix)
+
 
 class FloatField(BaseField):
 
@@ -42,7 +78,10 @@ class FloatField(BaseField):
 
     def validate(self, value):
         if not isinstance(value, float):
-            raise ValueError(f"Expected integer, got {type(value).__name__}")
+            raise ValueError(f"Expected float, got {type(value).__name__}")
+
+    def compile_check(self, var, namespace, prefix):
+        return self._compile_isinstance(var, float, "float", namespace, prefix)
 
 
 class BooleanField(BaseField):
@@ -54,20 +93,65 @@ class BooleanField(BaseField):
         if not isinstance(value, bool):
             raise ValueError(f"Expected boolean, got {type(value).__name__}")
 
+    def compile_check(self, var, namespace, prefix):
+        return self._compile_isinstance(var, bool, "boolean", namespace, prefix)
+
 
 class ListField(BaseField):
     def __init__(self, item_type, desc="", mandatory=False, default=None):
         super().__init__(desc, mandatory, default if not mandatory else None)
         self.item_type = item_type
+        # Items declared as a field class (e.g. ObjectIdField) are validated by that field
+        self.item_field = item_type() if isinstance(item_type, type) and issubclass(item_type, BaseField) else None
+        # Items declared as a model are stored as embedded documents
+        self.item_model = item_type if isinstance(item_type, type) and hasattr(item_type, "_decode") else None
 
     def validate(self, value):
         if not isinstance(value, list):
             raise ValueError(f"Expected list, got {type(value).__name__}")
 
+        if self.item_field is not None:
+            for item in value:
+                self.item_field.validate(item)
+            return
+
         for item in value:
             if not isinstance(item, self.item_type):
                 raise ValueError(f"Expected list of {self.item_type.__name__}, got {type(item).__name__}")
 
+    def compile_check(self, var, namespace, prefix):
+        lines = self._compile_isinstance(var, list, "list", namespace, prefix)
+        if self.item_field is not None:
+            item_check = self.item_field.compile_check("_item", namespace, prefix + "item_")
+        else:
+            namespace[prefix + "item_type"] = self.item_type
+            item_check = [f"if not _isinstance(_item, {prefix}item_type):",
+                          f"    raise _ValueError({'Expected list of ' + self.item_type.__name__ + ', got '!r}"
+                          f" + _type(_item).__name__)"]
+
+        return lines + [f"for _item in {var}:"] + ["    " + line for line in item_check]
+
+    def compile_encode(self, var, namespace, prefix):
+        if self.item_model is not None:
+            return f"[_item.to_dict() for _item in {var}]"
+
+        if self.item_field is not None:
+            item = self.item_field.compile_encode("_item", namespace, prefix + "item_")
+            if item is not None:
+                return f"[None if _item is None else {item} for _item in {var}]"
+        return None
+
+    def compile_decode(self, var, namespace, prefix):
+        if self.item_model is not None:
+            namespace[prefix + "model"] = self.item_model
+            return f"[{prefix}model._decode(_item, _trusted_) for _item in {var}]"
+
+        if self.item_field is not None:
+            item = self.item_field.compile_decode("_item", namespace, prefix + "item_")
+            if item is not None:
+                return f"[None if _item is None else {item} for _item in {var}]"
+        return None
+
 
 class DictField(BaseField):
 
@@ -78,6 +162,9 @@ class DictField(BaseField):
         if not isinstance(value, dict):
             raise ValueError(f"Expected dict, got {type(value).__name__}")
 
+    def compile_check(self, var, namespace, prefix):
+        return self._compile_isinstance(var, dict, "dict", namespace, prefix)
+
 
 class NestedField(BaseField):
 
@@ -89,6 +176,17 @@ class NestedField(BaseField):
         if not isinstance(value, self.model_class):
             raise ValueError(f"Expected {self.model_class.__name__} instance, got {type(value).__name__}")
 
+    def compile_check(self, var, namespace, prefix):
+        return self._compile_isinstance(var, self.model_class, f"{self.model_class.__name__} instance",
+                                        namespace, prefix)
+
+    def compile_encode(self, var, namespace, prefix):
+        return f"{var}.to_dict()"
+
+    def compile_decode(self, var, namespace, prefix):
+        namespace[prefix + "model"] = self.model_class
+        return f"{prefix}model._decode({var}, _trusted_)"
+
 
 class DateTimeField(BaseField):
 
@@ -99,6 +197,9 @@ class DateTimeField(BaseField):
         if not isinstance(value, datetime):
             raise ValueError(f"Expected datetime, got {type(value).__name__}")
 
+    def compile_check(self, var, namespace, prefix):
+        return self._compile_isinstance(var, datetime, "datetime", namespace, prefix)
+
 
 class DateField(BaseField):
 
@@ -109,8 +210,63 @@ class DateField(BaseField):
         if not isinstance(value, date):
             raise ValueError(f"Expected date, got {type(value).__name__}")
 
+    def compile_check(self, var, namespace, prefix):
+        return self._compile_isinstance(var, date, "date", namespace, prefix)
+
+    def compile_encode(self, var, namespace, prefix):
+        # BSON only has datetimes, dates are stored at midnight
+        namespace[prefix + "datetime"] = datetime
+        return f"{prefix}datetime({var}.year, {var}.month, {var}.day)"
+
+    def compile_decode(self, var, namespace, prefix):
+        namespace[prefix + "datetime"] = datetime
+        return f"{var}.date() if _isinstance({var}, {prefix}datetime) else {var}"
+
 
 class ObjectIdField(BaseField):
     def validate(self, value):
         if value is not None and not isinstance(value, ObjectId):
             raise ValueError(f"Expected valid ObjectId, got {type(value).__name__}")
+
+    def compile_check(self, var, namespace, prefix):
+        lines = self._compile_isinstance(var, ObjectId, "valid ObjectId", namespace, prefix)
+        return [f"if {var} is not None:"] + ["    " + line for line in lines]
+
+
+class ArrayField(BaseField):
+    """Packed little-endian numeric array stored as raw bytes, `dtype` uses NumPy notation (e.g. "<u2")."""
+
+    def __init__(self, dtype, desc="", mandatory=False, default=None):
+        super().__init__(desc, mandatory, default if not mandatory else None)
+        self.dtype = dtype
+        self.itemsize = int(dtype[2:])
+
+    def validate(self, value):
+        if not isinstance(value, bytes):
+            raise ValueError(f"Expected bytes, got {type(value).__name__}")
+
+        if len(value) % self.itemsize:
+            raise ValueError(f"Expected a multiple of {self.itemsize} bytes, got {len(value)}")
+
+    def compile_check(self, var, namespace, prefix):
+        lines = self._compile_isinstance(var, bytes, "bytes", namespace, prefix)
+        if self.itemsize == 1:
+            return lines
+
+        return lines + [f"if len({var}) % {self.itemsize}:",
+                        f"    raise _ValueError('Expected a multiple of {self.itemsize} bytes, got '"
+                        f" + str(len({var})))"]
+
+
+class BitsetField(BaseField):
+    """One flag per element packed eight to a byte, least significant bit first."""
+
+    def __init__(self, desc="", mandatory=False, default=None):
+        super().__init__(desc, mandatory, default if not mandatory else None)
+
+    def validate(self, value):
+        if not isinstance(value, bytes):
+            raise ValueError(f"Expected bytes, got {type(value).__name__}")
+
+    def compile_check(self, var, namespace, prefix):
+        return self._compile_isinstance(var, bytes, "bytes", namespace, prefix)
@@ -0,0 +1,47 @@
+import contextvars
+import typing
+
+from bson import ObjectId
+
+_current: contextvars.ContextVar = contextvars.ContextVar("identity_map", default=None)
+
+
+class IdentityMap:
+    """Unit-of-work scope in which each stored document is represented by exactly one model instance."""
+    _instances: typing.Dict[typing.Tuple[type, ObjectId], typing.Any]
+    _tokens: typing.List[contextvars.Token]
+
+    def __init__(self) -> None:
+        self._instances = {}
+        self._tokens = []
+
+    def get(self, model: type, document_id: ObjectId) -> typing.Optional[typing.Any]:
+        return self._instances.get((model, document_id))
+
+    def add(self, instance) -> None:
+        if instance.id is not None:
+            self._instances[(type(instance), instance.id)] = instance
+
+    def discard(self, instance) -> None:
+        self._instances.pop((type(instance), instance.id), None)
+
+    def __len__(self) -> int:
+        return len(self._instances)
+
+    def __enter__(self) -> "IdentityMap":
+        self._tokens.append(_current.set(self))
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _current.reset(self._tokens.pop())
+
+    async def __aenter__(self) -> "IdentityMap":
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.__exit__(*exc_info)
+
+
+def current_identity_map() -> typing.Optional[IdentityMap]:
+    """Returns the identity map of the running unit of work, if any."""
+    return _current.get()
@@ -0,0 +1,62 @@
+import typing
+
+from pymongo import ASCENDING
+from pymongo import IndexModel
+
+
+class Index:
+    """Index declared on a model; keys are field names (ascending) or `(field, direction)` pairs."""
+    keys: typing.List[typing.Tuple[str, typing.Any]]
+    name: str
+    sparse: bool
+    unique: bool
+
+    def __init__(self,
+                 *keys: typing.Union[str, typing.Tuple[str, typing.Any]],
+                 unique: bool = False,
+                 sparse: bool = False,
+                 name: typing.Optional[str] = None) -> None:
+        if not keys:
+            raise ValueError("An index needs at least one key")
+
+        self.keys = [(key, ASCENDING) if isinstance(key, str) else tuple(key) for key in keys]
+        self.unique = unique
+        self.sparse = sparse
+        self.name = name or "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+    def to_index_model(self) -> IndexModel:
+        options = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.sparse:
+            options["sparse"] = True
+        return IndexModel(self.keys, **options)
+
+    def __repr__(self) -> str:
+        return f"Index({self.keys!r}, unique={self.unique}, sparse={self.sparse})"
+
+
+def stored_models(base: type) -> typing.List[type]:
+    """Returns every subclass of `base` that is stored in its own collection."""
+    models, pending = [], list(base.__subclasses__())
+    while pending:
+        model = pending.pop(0)
+        pending.extend(model.__subclasses__())
+        if getattr(model, "collection_name", None) and model not in models:
+            models.append(model)
+    return models
+
+
+async def ensure_indexes(models: typing.Optional[typing.Iterable[type]] = None) -> typing.Dict[str, typing.List[str]]:
+    """Creates the declared indexes of `models` (all stored models by default); safe to call on every start."""
+    if models is None:
+        from shared.models.common.base import BaseModel
+        models = stored_models(BaseModel)
+
+    created = {}
+    for model in models:
+        if model.indexes:
+            collection = model._get_collection()
+            created[collection.collection_name] = await collection.create_indexes(
+                [index.to_index_model() for index in model.indexes])
+    return created
@@ -0,0 +1,171 @@
+import asyncio
+import typing
+
+from bson import ObjectId
+
+from shared.models.common.identity import current_identity_map
+from shared.models.common.indexes import stored_models
+
+# Ids sent in one `$in` query; larger batches are split so a query stays well below the 16 MB command limit
+MAX_IDS_PER_QUERY = 1000
+
+# Levels of references `resolve` follows before it stops, as a guard against reference cycles
+MAX_DEPTH = 8
+
+
+def _referenced_ids(value: typing.Any, path: typing.List[str]) -> typing.Iterator[ObjectId]:
+    """ObjectIds found at a dotted path, stepping through nested models and lists of them."""
+    if value is None:
+        return
+    if isinstance(value, list):
+        for item in value:
+            yield from _referenced_ids(item, path)
+    elif not path:
+        if isinstance(value, ObjectId):
+            yield value
+    else:
+        yield from _referenced_ids(getattr(value, path[0], None), path[1:])
+
+
+class ReferenceLoader:
+    """Batches reference lookups DataLoader style.
+
+    Every `load` made before the event loop gets to run its next callback is collected, deduplicated and answered
+    with one `{"_id": {"$in": [...]}}` query per collection; results are kept, so asking again costs nothing.
+    `resolve` follows the `references` the models declare level by level, so a match with its innings, overs,
+    deliveries, players, officials and venue loads in a handful of queries instead of one per id:
+
+        loader = ReferenceLoader(trusted=True)
+        match = await loader.load(Match, match_id)
+        await loader.resolve([match])
+        venue = loader.get(Stadium, match.venue)
+    """
+    _expanded: typing.Set[typing.Tuple[type, ObjectId]]
+    _futures: typing.Dict[typing.Tuple[type, ObjectId], asyncio.Future]
+    _models: typing.Optional[typing.Dict[str, type]]
+    _pending: typing.Dict[type, typing.List[ObjectId]]
+    _tasks: typing.Set[asyncio.Task]
+    _trusted: bool
+
+    def __init__(self,
+                 /,
+                 trusted: bool = False) -> None:
+        self._expanded = set()
+        self._futures = {}
+        self._models = None
+        self._pending = {}
+        self._tasks = set()
+        self._trusted = trusted
+
+    def load(self,
+             model: type,
+             document_id: ObjectId,
+             /) -> "asyncio.Future":
+        """Future of the `model` instance stored under `document_id`, or of None when there is none."""
+        key = (model, document_id)
+        future = self._futures.get(key)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = self._futures[key] = loop.create_future()
+        identity_map = current_identity_map()
+        existing = identity_map.get(model, document_id) if identity_map is not None else None
+        if existing is not None:
+            future.set_result(existing)
+            return future
+
+        if not self._pending:
+            # Runs after the callbacks already queued, i.e. once every task woken in this tick asked for its ids
+            loop.call_soon(self._dispatch)
+        self._pending.setdefault(model, []).append(document_id)
+        return future
+
+    async def load_many(self,
+                        model: type,
+                        document_ids: typing.Iterable[ObjectId],
+                        /) -> typing.List[typing.Optional[typing.Any]]:
+        """Instances for `document_ids` in the same order, None where nothing is stored."""
+        return list(await asyncio.gather(*(self.load(model, document_id) for document_id in document_ids)))
+
+    def get(self,
+            model: type,
+            document_id: ObjectId,
+            /) -> typing.Optional[typing.Any]:
+        """Instance already loaded for `document_id`, without a query; None when it is not (yet) loaded."""
+        future = self._futures.get((model, document_id))
+        if future is None or not future.done() or future.exception() is not None:
+            return None
+        return future.result()
+
+    def loaded(self,
+               model: type,
+               /) -> typing.List[typing.Any]:
+        """Every `model` instance loaded so far, in the order they were first asked for."""
+        return [instance for (kind, document_id) in list(self._futures)
+                if kind is model and (instance := self.get(model, document_id)) is not None]
+
+    def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._fetch(pending))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, pending: typing.Dict[type, typing.List[ObjectId]]) -> None:
+        await asyncio.gather(*(self._fetch_model(model, document_ids) for model, document_ids in pending.items()))
+
+    async def _fetch_model(self, model: type, document_ids: typing.List[ObjectId]) -> None:
+        try:
+            for start in range(0, len(document_ids), MAX_IDS_PER_QUERY):
+                chunk = document_ids[start:start + MAX_IDS_PER_QUERY]
+                cursor = model.find({"_id": {"$in": chunk}}, batch_size=len(chunk), trusted=self._trusted)
+                for instance in await cursor.to_list(len(chunk)):
+                    future = self._futures[(model, instance.id)]
+                    if not future.done():
+                        future.set_result(instance)
+        except Exception as error:
+            for document_id in document_ids:
+                future = self._futures[(model, document_id)]
+                if not future.done():
+                    future.set_exception(error)
+            # Each waiter sees the error; forget the failed ids so a later `load` asks again
+            for document_id in document_ids:
+                self._futures.pop((model, document_id), None)
+            return
+
+        for document_id in document_ids:
+            future = self._futures[(model, document_id)]
+            if not future.done():
+                future.set_result(None)
+
+    def _model(self, name: str) -> type:
+        if self._models is None:
+            from shared.models.common.base import BaseModel
+            self._models = {model.__name__: model for model in stored_models(BaseModel)}
+        model = self._models.get(name)
+        if model is None:
+            raise ValueError(f"References point at unknown stored model {name!r}")
+        return model
+
+    async def resolve(self,
+                      instances: typing.Iterable[typing.Any],
+                      /,
+                      depth: int = MAX_DEPTH) -> None:
+        """Loads everything `instances` reference, then everything those reference, and so on for up to `depth`
+        levels; each level costs one query per referenced collection. Read the results with `get` or `loaded`."""
+        level = [instance for instance in instances if instance is not None]
+        for _ in range(depth):
+            loads = []
+            for instance in level:
+                key = (type(instance), instance.id)
+                if key in self._expanded:
+                    continue
+                self._expanded.add(key)
+                for path, target in type(instance).references.items():
+                    model = self._model(target)
+                    loads.extend(self.load(model, document_id)
+                                 for document_id in _referenced_ids(instance, path.split(".")))
+            if not loads:
+                return
+            level = [instance for instance in await asyncio.gather(*loads) if instance is not None]
@@ -0,0 +1,111 @@
+import base64
+import binascii
+import typing
+
+import bson
+from bson.errors import BSONError
+from pymongo import ASCENDING
+
+# Items per page when the caller does not choose
+DEFAULT_PAGE_SIZE = 100
+
+# Sort specification as passed to `find`: `(field path, 1 or -1)` pairs
+Sort = typing.Sequence[typing.Tuple[str, int]]
+
+
+class InvalidPageToken(ValueError):
+    """Raised for a continuation token that is malformed or was issued for another listing."""
+
+
+class Page:
+    """One page of a keyset-paginated listing; pass `next_token` as `after` to read the page behind it."""
+    items: typing.List[typing.Any]
+    next_token: typing.Optional[str]
+
+    def __init__(self, items: typing.List[typing.Any], next_token: typing.Optional[str]) -> None:
+        self.items = items
+        self.next_token = next_token
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        return {"items": self.items, "next": self.next_token}
+
+
+def encode_token(sort: Sort, values: typing.Sequence[typing.Any]) -> str:
+    """Opaque continuation token holding the sort keys and the values of the last document of a page."""
+    for (path, _), value in zip(sort, values):
+        if value is None or isinstance(value, (list, dict)):
+            raise ValueError(f"Cannot continue after a document whose {path!r} is not a single value")
+
+    document = bson.encode({"k": [path for path, _ in sort], "v": list(values)})
+    return base64.urlsafe_b64encode(document).rstrip(b"=").decode("ascii")
+
+
+def decode_token(token: str, sort: Sort) -> typing.List[typing.Any]:
+    """Values to continue after; raises `InvalidPageToken` for a malformed token or one issued for another order."""
+    try:
+        document = bson.decode(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (BSONError, binascii.Error, ValueError):
+        raise InvalidPageToken("Malformed page token") from None
+
+    keys, values = document.get("k"), document.get("v")
+    if keys != [path for path, _ in sort] or not isinstance(values, list) or len(values) != len(keys):
+        raise InvalidPageToken("Page token does not belong to this listing")
+    if any(value is None or isinstance(value, (list, dict)) for value in values):
+        raise InvalidPageToken("Malformed page token")
+    return values
+
+
+def _equality_fields(query: typing.Dict[str, typing.Any]) -> typing.Set[str]:
+    return {field for field, condition in query.items()
+            if not field.startswith("$")
+            and not (isinstance(condition, dict) and any(key.startswith("$") for key in condition))}
+
+
+def keyset_sort(model: type,
+                query: typing.Dict[str, typing.Any],
+                sort: typing.Optional[Sort]) -> typing.List[typing.Tuple[str, int]]:
+    """Sort order for keyset pages: `sort` without keys the query pins to one value, with `_id` appended to break
+    ties unless the index is unique.
+
+    Raises `ValueError` unless a declared index starts with the query's equality fields followed by the sort keys
+    (and `_id`), so each page is an index seek rather than a scan over the pages before it.
+    """
+    equal = _equality_fields(query)
+    order = [(path, direction) for path, direction in (sort or ()) if path not in equal]
+    tie_direction = order.pop()[1] if order and order[-1][0] == "_id" else ASCENDING
+    if any(path == "_id" for path, _ in order):
+        raise ValueError("_id can only be the last sort key")
+
+    # Without sort keys the documents are read in `_id` order; every collection has that index
+    candidates = [(index.keys, index.unique) for index in model.indexes]
+    if not equal:
+        candidates.append(([("_id", ASCENDING)], True))
+
+    for keys, unique in candidates:
+        prefix = 0
+        while prefix < len(keys) and keys[prefix][0] in equal:
+            prefix += 1
+        if prefix < len(equal):
+            continue
+
+        served = keys[prefix:prefix + len(order)]
+        rest = keys[prefix + len(order):]
+        if [path for path, _ in served] != [path for path, _ in order]:
+            continue
+
+        # An index serves a sort in its own direction or entirely reversed
+        flips = {direction == index_direction for (_, direction), (_, index_direction) in zip(order, served)}
+        if len(flips) > 1:
+            continue
+        reversed_ = flips == {False}
+
+        if rest and rest[0][0] == "_id":
+            if order:
+                tie_direction = -rest[0][1] if reversed_ else rest[0][1]
+            return order + [("_id", tie_direction)]
+        if not rest and unique and order:
+            return order
+
+    fields = ", ".join(sorted(equal)) or "nothing"
+    sorted_by = ", ".join(path for path, _ in order) or "_id"
+    raise ValueError(f"No index of {model.__name__} serves pages filtered on {fields} and sorted by {sorted_by}")
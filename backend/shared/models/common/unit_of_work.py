@@ -0,0 +1,106 @@
+import asyncio
+import typing
+
+from bson import ObjectId
+from pymongo import DeleteOne
+from pymongo import InsertOne
+from pymongo import UpdateOne
+from pymongo.results import BulkWriteResult
+
+from shared.models.common.identity import IdentityMap
+
+# Collection adapter, its write requests and the instance behind each request
+_Batch = typing.Tuple[typing.Any, typing.List[typing.Any], typing.List[typing.Any]]
+
+
+class UnitOfWork(IdentityMap):
+    """Identity map that also collects writes and sends them together.
+
+    Instances loaded inside it are tracked: `flush` writes only the fields they changed (see `BaseModel.changes`).
+    Instances passed to `add` are inserted and those passed to `delete` removed. Everything goes out as one ordered
+    `bulk_write` per collection, inserts first, then updates, then deletes. Leaving an `async with` block without an
+    error flushes:
+
+        async with UnitOfWork() as unit:
+            series = await Series.read_from_db(query)
+            team = unit.add(Team(name=name, team_type=team_type))
+            series.teams.append(team.id)
+        # one insert into teams and one `$addToSet` on the series
+    """
+    # Pending instances keyed by `id()`, in the order they were scheduled
+    _deleted: typing.Dict[int, typing.Any]
+    _new: typing.Dict[int, typing.Any]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._deleted = {}
+        self._new = {}
+
+    def add(self, instance) -> typing.Any:
+        """Schedules a new instance for insertion; an id is assigned now so other documents can refer to it."""
+        if instance.id is None:
+            instance.id = ObjectId()
+        if "_saved" not in instance.__dict__:
+            self._new[id(instance)] = instance
+        super().add(instance)
+        return instance
+
+    def delete(self, instance) -> None:
+        """Schedules a stored instance for deletion; an instance added but not yet flushed is simply dropped."""
+        if self._new.pop(id(instance), None) is None:
+            self._deleted[id(instance)] = instance
+        self.discard(instance)
+
+    def _requests(self) -> typing.Dict[str, _Batch]:
+        """Write requests grouped by collection, with the instances whose stored state they change."""
+        batches: typing.Dict[str, _Batch] = {}
+
+        def queue(instance, request) -> None:
+            collection = instance._get_collection()
+            _, requests, written = batches.setdefault(collection.collection_name, (collection, [], []))
+            requests.append(request)
+            written.append(instance)
+
+        for instance in self._new.values():
+            queue(instance, InsertOne(instance._stored_document()))
+        for instance in list(self._instances.values()):
+            if "_saved" in instance.__dict__:
+                update = instance.changes()
+                if update is not None:
+                    queue(instance, UpdateOne({"_id": instance.id}, update))
+        for instance in self._deleted.values():
+            queue(instance, DeleteOne({"_id": instance.id}))
+        return batches
+
+    async def flush(self) -> typing.Dict[str, BulkWriteResult]:
+        """Writes the pending inserts, updates and deletes, one ordered `bulk_write` per collection."""
+        batches = self._requests()
+        results = await asyncio.gather(*(collection.bulk_write(requests, ordered=True)
+                                         for collection, requests, _ in batches.values()),
+                                       return_exceptions=True)
+
+        written = {}
+        for (name, (_, _, instances)), result in zip(batches.items(), results):
+            if isinstance(result, BaseException):
+                continue
+            written[name] = result
+            for instance in instances:
+                if self._deleted.pop(id(instance), None) is None:
+                    self._new.pop(id(instance), None)
+                    instance._remember()
+                    instance._written()
+                else:
+                    instance._written(deleted=True)
+
+        for result in results:
+            if isinstance(result, BaseException):
+                # Collections written before the failure stay written; what failed is still pending
+                raise result
+        return written
+
+    async def __aexit__(self, exc_type, *exc_info) -> None:
+        try:
+            if exc_type is None:
+                await self.flush()
+        finally:
+            self.__exit__(exc_type, *exc_info)
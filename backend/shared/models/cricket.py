@@ -1,13 +1,19 @@
+import itertools
 import typing
 from datetime import datetime
 
+import numpy as np
+
+from db import collection_structures as coll
 from db.db import Collections
 from shared.models.common import fields
 from shared.models.common.base import BaseModel
+from shared.models.common.indexes import Index
 
 
 class Team(BaseModel):
     collection_name = Collections.TEAMS.upper()
+    indexes = [Index(coll.Teams.NAME, coll.Teams.TEAM_TYPE, unique=True)]
 
     country: typing.Optional[str]
     name: str
@@ -21,14 +27,21 @@ class Team(BaseModel):
 
 class Player(BaseModel):
     collection_name = Collections.PLAYERS.upper()
+    indexes = [
+        Index(coll.Players.CRIC_SHEET_ID, unique=True),
+        # `_id` breaks ties between namesakes so name listings page from the index
+        Index(coll.Players.NAME, "_id"),
+        Index(coll.Players.PROFILE_FETCHED_AT),
+    ]
 
     age: typing.Optional[str]
     batting_style: typing.Optional[str]
     bowling_style: typing.Optional[str]
     cric_sheet_id: str
     date_of_birth: typing.Optional[datetime]
-    full_name: str
+    full_name: typing.Optional[str]
     name: str
+    profile_fetched_at: typing.Optional[datetime]
     role: typing.Optional[str]
     teams: typing.List[str]
 
@@ -38,14 +51,16 @@ class Player(BaseModel):
     bowling_style = fields.StringField(desc="Bowling style (Off-spin, Leg-spin, etc.)")
     cric_sheet_id = fields.StringField(desc="Id of the player in cricsheet", mandatory=True)
     date_of_birth = fields.DateTimeField(desc="Date of birth of the player")
-    full_name = fields.StringField(desc="Full name of the player", mandatory=True)
+    full_name = fields.StringField(desc="Full name of the player, filled from the profile source")
     name = fields.StringField(desc="Full name of the player", mandatory=True)
+    profile_fetched_at = fields.DateTimeField(desc="When the profile fields were last looked up")
     role = fields.StringField(desc="Player's role in the team")
     teams = fields.ListField(fields.ObjectIdField, desc="Associated team IDs")
 
 
 class Stadium(BaseModel):
     collection_name = Collections.STADIUM.upper()
+    indexes = [Index(coll.Stadium.NAME, coll.Stadium.CITY, unique=True)]
 
     capacity: typing.Optional[int]
     city: str
@@ -57,8 +72,21 @@ class Stadium(BaseModel):
     name = fields.StringField(desc="Full name of the stadium", mandatory=True)
 
 
+# Fields series listings filter on
+SERIES_FILTERS = (coll.Series.SEASON, coll.Series.MATCH_TYPE, coll.Series.GENDER)
+
+
 class Series(BaseModel):
     collection_name = Collections.SERIES.upper()
+    indexes = [
+        Index(coll.Series.NAME, coll.Series.SEASON, coll.Series.GENDER, coll.Series.MATCH_TYPE, unique=True),
+        # Listings filter on any combination of season, match type and gender and page by name; each combination
+        # leads one index, so every page is a seek
+        *(Index(*filters, coll.Series.NAME, "_id")
+          for size in range(4)
+          for filters in itertools.combinations(SERIES_FILTERS, size)),
+    ]
+    references = {coll.Series.TEAMS: "Team"}
 
     gender: str
     match_type: str
@@ -107,6 +135,30 @@ class TeamPlayers(BaseModel):
 
 
 class Match(BaseModel):
+    collection_name = Collections.MATCHES.upper()
+    indexes = [
+        Index(coll.Matches.CRIC_SHEET_ID, unique=True),
+        Index(coll.Matches.SERIES, coll.Matches.DATES),
+        Index(coll.Matches.VENUE),
+        Index(coll.Matches.TEAM_1),
+        Index(coll.Matches.TEAM_2),
+        Index(coll.Matches.OUTCOME_WINNER, sparse=True),
+    ]
+    references = {
+        coll.Matches.SERIES: "Series",
+        coll.Matches.VENUE: "Stadium",
+        coll.Matches.PLAYER_OF_MATCH: "Player",
+        coll.Matches.TEAM_1: "Team",
+        "team_1.players": "Player",
+        coll.Matches.TEAM_2: "Team",
+        "team_2.players": "Player",
+        "umpires.match_referees": "Player",
+        "umpires.reserve_umpires": "Player",
+        "umpires.tv_umpires": "Player",
+        "umpires.umpires": "Player",
+    }
+
+    cric_sheet_id: str
     dates: typing.List[datetime]
     match_number: int
     outcome: typing.Optional[Outcome]
@@ -117,6 +169,7 @@ class Match(BaseModel):
     umpires: Officials
     venue: str
 
+    cric_sheet_id = fields.StringField(desc="Id of the match in cricsheet", mandatory=True)
     dates = fields.ListField(datetime, desc="List of match dates", mandatory=True)
     match_number = fields.IntegerField(desc="Number of the match", mandatory=True)
     outcome = fields.NestedField(Outcome, desc="Match outcome details")
@@ -227,8 +280,16 @@ class TargetModel(BaseModel):
 
 
 class InningsModel(BaseModel):
+    collection_name = Collections.INNINGS.upper()
+    indexes = [
+        Index(coll.Innings.INNINGS_ID, unique=True),
+        Index(coll.Innings.MATCH_ID, coll.Innings.INNINGS_NUMBER, unique=True),
+    ]
+    references = {coll.Innings.TEAM: "Team", coll.Innings.OVERS: "OverModel"}
+
     innings_id = fields.ObjectIdField(desc="Unique innings identifier", mandatory=True)
     match_id = fields.ObjectIdField(desc="Reference to the match", mandatory=True)
+    innings_number = fields.IntegerField(desc="Position of the innings in the match", mandatory=True)
     team = fields.ObjectIdField(desc="Team playing the innings", mandatory=True)
     overs = fields.ListField(fields.ObjectIdField, desc="References to over documents", mandatory=True)
     power_play = fields.NestedField(PowerplayModel, desc="Powerplay details", mandatory=False)
@@ -237,6 +298,13 @@ class InningsModel(BaseModel):
 
 
 class OverModel(BaseModel):
+    collection_name = Collections.OVERS.upper()
+    indexes = [
+        Index(coll.Overs.OVER_ID, unique=True),
+        Index(coll.Overs.INNINGS_ID, coll.Overs.OVER_NUMBER),
+    ]
+    references = {coll.Overs.DELIVERIES: "DeliveryModel"}
+
     over_id = fields.ObjectIdField(desc="Unique over identifier", mandatory=True)
     innings_id = fields.ObjectIdField(desc="Reference to innings", mandatory=True)
     over_number = fields.IntegerField(desc="Over number", mandatory=True)
@@ -249,7 +317,29 @@ class RunsModel(BaseModel):
     total = fields.IntegerField(desc="Total runs scored on the delivery", mandatory=True)
 
 
+class WicketModel(BaseModel):
+    kind = fields.StringField(desc="Mode of dismissal (caught, bowled, run out, etc.)", mandatory=True)
+    player_out = fields.ObjectIdField(desc="Batter dismissed", mandatory=True)
+    fielders = fields.ListField(fields.ObjectIdField, desc="Fielders involved in the dismissal", default=[])
+
+
 class DeliveryModel(BaseModel):
+    collection_name = Collections.DELIVERIES.upper()
+    indexes = [
+        Index(coll.Deliveries.DELIVERY_ID, unique=True),
+        Index(coll.Deliveries.OVER_ID, coll.Deliveries.DELIVERY_NUMBER),
+        # Trailing `_id` keeps a player's deliveries in a stable order for keyset pages
+        Index(coll.Deliveries.BATTER, "_id"),
+        Index(coll.Deliveries.BOWLER, "_id"),
+    ]
+    references = {
+        coll.Deliveries.BATTER: "Player",
+        coll.Deliveries.BOWLER: "Player",
+        coll.Deliveries.NON_STRIKER: "Player",
+        "wickets.player_out": "Player",
+        "wickets.fielders": "Player",
+    }
+
     delivery_id = fields.ObjectIdField(desc="Unique delivery identifier", mandatory=True)
     over_id = fields.ObjectIdField(desc="Reference to over", mandatory=True)
     delivery_number = fields.IntegerField(desc="Sequence number of the delivery within the over", mandatory=True)
@@ -257,3 +347,145 @@ class DeliveryModel(BaseModel):
     bowler = fields.ObjectIdField(desc="Bowler delivering the ball", mandatory=True)
     non_striker = fields.ObjectIdField(desc="Non-striker batter", mandatory=True)
     runs = fields.NestedField(RunsModel, desc="Runs details for this delivery", mandatory=True)
+    extras = fields.NestedField(Extras, desc="Breakdown of extras conceded on this delivery")
+    wickets = fields.ListField(WicketModel, desc="Wickets that fell on this delivery", default=[])
+
+
+class InningsColumnsModel(BaseModel):
+    """Whole innings stored as parallel packed arrays, one element per delivery in bowling order."""
+    collection_name = Collections.INNINGS_COLUMNS.upper()
+    indexes = [
+        Index(coll.InningsColumns.INNINGS_ID, unique=True),
+        Index(coll.InningsColumns.MATCH_ID, coll.InningsColumns.INNINGS_NUMBER),
+        Index(coll.InningsColumns.PLAYERS),
+    ]
+
+    innings_id = fields.ObjectIdField(desc="Innings the columns belong to", mandatory=True)
+    match_id = fields.ObjectIdField(desc="Reference to the match", mandatory=True)
+    innings_number = fields.IntegerField(desc="Position of the innings in the match", mandatory=True)
+    team = fields.ObjectIdField(desc="Team playing the innings", mandatory=True)
+    balls = fields.IntegerField(desc="Number of deliveries, including extras", mandatory=True)
+    players = fields.ListField(fields.ObjectIdField, desc="Player table the index columns point into", mandatory=True)
+    wicket_kinds = fields.ListField(str, desc="Dismissal kinds the wicket_kind column points into", default=[])
+
+    over = fields.ArrayField("<u2", desc="Over number of each delivery", mandatory=True)
+    ball = fields.ArrayField("<u1", desc="Sequence number of the delivery within the over", mandatory=True)
+    batter = fields.ArrayField("<u1", desc="Player table index of the batter on strike", mandatory=True)
+    bowler = fields.ArrayField("<u1", desc="Player table index of the bowler", mandatory=True)
+    non_striker = fields.ArrayField("<u1", desc="Player table index of the non-striker", mandatory=True)
+    runs_batter = fields.ArrayField("<u1", desc="Runs scored by the batter", mandatory=True)
+    runs_extras = fields.ArrayField("<u1", desc="Extra runs on the delivery", mandatory=True)
+
+    wides = fields.BitsetField(desc="Deliveries that were wides", mandatory=True)
+    no_balls = fields.BitsetField(desc="Deliveries that were no-balls", mandatory=True)
+    byes = fields.BitsetField(desc="Deliveries with byes", mandatory=True)
+    leg_byes = fields.BitsetField(desc="Deliveries with leg byes", mandatory=True)
+    wicket = fields.BitsetField(desc="Deliveries on which a wicket fell", mandatory=True)
+
+    wicket_ball = fields.ArrayField("<u2", desc="Delivery index of each wicket", mandatory=True)
+    wicket_player = fields.ArrayField("<u1", desc="Player table index of each dismissed batter", mandatory=True)
+    wicket_kind = fields.ArrayField("<u1", desc="Index into wicket_kinds for each wicket", mandatory=True)
+
+    def column(self, name: str) -> np.ndarray:
+        """Returns a read-only NumPy view of a packed column; bitsets are expanded to one bool per delivery."""
+        field = self._fields[name]
+        data = getattr(self, name)
+
+        if isinstance(field, fields.BitsetField):
+            return np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=self.balls, bitorder="little").view(bool)
+
+        if isinstance(field, fields.ArrayField):
+            return np.frombuffer(data, dtype=field.dtype)
+
+        raise ValueError(f"{name} is not a column of {type(self).__name__}")
+
+    def arrays(self) -> typing.Dict[str, np.ndarray]:
+        """Returns every column keyed by field name."""
+        return {
+            name: self.column(name) for name, field in self._fields.items()
+            if isinstance(field, (fields.ArrayField, fields.BitsetField))
+        }
+
+    def runs_total(self) -> np.ndarray:
+        """Total runs per delivery."""
+        return self.column("runs_batter").astype(np.int16) + self.column("runs_extras")
+
+    def legal(self) -> np.ndarray:
+        """Mask of deliveries that count towards the over."""
+        return ~(self.column("wides") | self.column("no_balls"))
+
+
+class InningsChartModel(BaseModel):
+    """Chart series of an innings, derived when the innings is stored so no page view rebuilds them from deliveries.
+
+    Per-delivery series are indexed like the innings columns; per-over series have one element per over number.
+    """
+    collection_name = Collections.INNINGS_CHARTS.upper()
+    indexes = [
+        Index(coll.InningsCharts.INNINGS_ID, unique=True),
+        Index(coll.InningsCharts.MATCH_ID, coll.InningsCharts.INNINGS_NUMBER),
+    ]
+
+    innings_id = fields.ObjectIdField(desc="Innings the series belong to", mandatory=True)
+    match_id = fields.ObjectIdField(desc="Reference to the match", mandatory=True)
+    innings_number = fields.IntegerField(desc="Position of the innings in the match", mandatory=True)
+    team = fields.ObjectIdField(desc="Team playing the innings", mandatory=True)
+    balls_per_over = fields.IntegerField(desc="Legal deliveries in an over", mandatory=True)
+    target_runs = fields.IntegerField(desc="Runs the innings chased, if any")
+    target_overs = fields.IntegerField(desc="Overs available for the chase, if any")
+
+    legal_balls = fields.ArrayField("<u2", desc="Legal deliveries bowled up to each delivery (worm x axis)",
+                                    mandatory=True)
+    score = fields.ArrayField("<i2", desc="Team score after each delivery (worm y axis)", mandatory=True)
+    wicket_ball = fields.ArrayField("<u2", desc="Delivery index of each wicket", mandatory=True)
+    over_runs = fields.ArrayField("<i2", desc="Runs scored in each over (Manhattan)", mandatory=True)
+    over_wickets = fields.ArrayField("<u1", desc="Wickets that fell in each over", mandatory=True)
+    run_rate = fields.ArrayField("<f4", desc="Runs per over of the innings so far, at the end of each over",
+                                 mandatory=True)
+    required_rate = fields.ArrayField("<f4", desc="Runs per over still needed at the end of each over; empty "
+                                                  "without a target", mandatory=True)
+
+    def column(self, name: str) -> np.ndarray:
+        """Returns a read-only NumPy view of a series."""
+        field = self._fields[name]
+        if not isinstance(field, fields.ArrayField):
+            raise ValueError(f"{name} is not a series of {type(self).__name__}")
+        return np.frombuffer(getattr(self, name), dtype=field.dtype)
+
+
+class LiveDeliveryModel(BaseModel):
+    """Delivery received from a live feed, kept as sent so a match in progress can be replayed after a restart."""
+    collection_name = Collections.LIVE_DELIVERIES.upper()
+    indexes = [Index(coll.LiveDeliveries.MATCH_KEY, coll.LiveDeliveries.SEQUENCE, unique=True)]
+
+    match_key = fields.StringField(desc="Identifier the feed uses for the match", mandatory=True)
+    sequence = fields.IntegerField(desc="Position of the delivery in the match, from 0", mandatory=True)
+    innings_number = fields.IntegerField(desc="Position of the innings in the match", mandatory=True)
+    team = fields.StringField(desc="Batting team", mandatory=True)
+    over_number = fields.IntegerField(desc="Over the delivery was bowled in, from 0", mandatory=True)
+    delivery = fields.DictField(desc="Delivery in the Cricsheet `overs[].deliveries[]` shape", mandatory=True)
+    received_at = fields.DateTimeField(desc="When the delivery was received", mandatory=True)
+
+
+class LiveMatchModel(BaseModel):
+    """State of a live match that its delivery log cannot give, so it survives a restart."""
+    collection_name = Collections.LIVE_MATCHES.upper()
+    indexes = [Index(coll.LiveMatches.MATCH_KEY, unique=True)]
+
+    match_key = fields.StringField(desc="Identifier the feed uses for the match", mandatory=True)
+    finished_at = fields.DateTimeField(desc="When the feed marked the match as over")
+
+
+class SourceFileModel(BaseModel):
+    """Manifest entry for an ingested Cricsheet file, so unchanged files are skipped on the next run."""
+    collection_name = Collections.SOURCE_FILES.upper()
+    indexes = [Index(coll.SourceFiles.CRIC_SHEET_ID, unique=True)]
+
+    cric_sheet_id = fields.StringField(desc="Cricsheet id of the match, the file name without extension",
+                                       mandatory=True)
+    match_id = fields.ObjectIdField(desc="Match stored from the file", mandatory=True)
+    revision = fields.IntegerField(desc="`meta.revision` of the file", default=0)
+    data_version = fields.StringField(desc="`meta.data_version` of the file", default="")
+    content_hash = fields.StringField(desc="BLAKE2b digest of the raw file", mandatory=True)
+    layout = fields.StringField(desc="Layout the deliveries were stored in", mandatory=True)
+    ingested_at = fields.DateTimeField(desc="When the file was last loaded", mandatory=True)
@@ -0,0 +1,288 @@
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from bson import ObjectId
+
+from shared.models import cricket
+
+# Dismissals credited to the bowler
+BOWLER_WICKETS = frozenset({"bowled", "caught", "caught and bowled", "lbw", "stumped", "hit wicket"})
+# Dismissals that do not count as a wicket falling
+NOT_OUT_DISMISSALS = frozenset({"retired hurt", "retired not out"})
+
+# Cricsheet extras keys mapped to the field names used by `cricket.Extras`
+_EXTRAS_FIELDS = {"byes": "byes", "legbyes": "leg_byes", "noballs": "no_balls", "penalty": "penalty_runs",
+                  "wides": "wides"}
+
+
+def overs_notation(balls: int, balls_per_over: int = 6) -> float:
+    """Converts legal balls to the conventional overs.balls float, e.g. 29 balls -> 4.5."""
+    return balls // balls_per_over + balls % balls_per_over / 10
+
+
+class _Batting:
+    __slots__ = ("player", "runs", "balls", "fours", "sixes", "dismissal", "bowler", "fielder")
+
+    def __init__(self, player: Hashable) -> None:
+        self.player = player
+        self.runs = self.balls = self.fours = self.sixes = 0
+        self.dismissal = self.bowler = self.fielder = None
+
+
+class _Bowling:
+    __slots__ = ("player", "balls", "runs", "wickets", "maidens", "wides", "no_balls")
+
+    def __init__(self, player: Hashable) -> None:
+        self.player = player
+        self.balls = self.runs = self.wickets = self.maidens = self.wides = self.no_balls = 0
+
+
+class _Partnership:
+    __slots__ = ("batsmen", "runs", "balls")
+
+    def __init__(self, batsmen: Tuple[Hashable, Hashable]) -> None:
+        self.batsmen = batsmen
+        self.runs = self.balls = 0
+
+
+class ScorecardEngine:
+    """Builds an innings scorecard one delivery at a time; each appended ball costs O(1)."""
+
+    def __init__(self,
+                 team: str,
+                 /,
+                 balls_per_over: int = 6,
+                 name_of: Callable[[Hashable], str] = str) -> None:
+        self.team = team
+        self.balls_per_over = balls_per_over
+        self._name_of = name_of
+
+        self.total_runs = 0
+        self.wickets = 0
+        self.legal_balls = 0
+        self.extras = dict.fromkeys(_EXTRAS_FIELDS.values(), 0)
+
+        self._batting: Dict[Hashable, _Batting] = {}
+        self._bowling: Dict[Hashable, _Bowling] = {}
+        self._fall_of_wickets: List[Tuple[int, int, float, Hashable]] = []
+        self._partnerships: List[_Partnership] = []
+        self._partnership_closed = True
+
+        # Runs conceded and legal balls of the over in progress, used to detect maidens
+        self._over: Optional[Any] = None
+        self._over_bowler: Optional[_Bowling] = None
+        self._over_runs = 0
+        self._over_balls = 0
+
+    def add_ball(self,
+                 over_number: Any,
+                 batter: Hashable,
+                 bowler: Hashable,
+                 non_striker: Hashable,
+                 runs_batter: int,
+                 extras: Dict[str, int],
+                 wickets: Sequence[Tuple[str, Hashable, Optional[Hashable]]] = (),
+                 boundary: bool = True) -> None:
+        """Adds a delivery; `extras` uses Cricsheet keys and `wickets` holds `(kind, player_out, fielder)`."""
+        if over_number != self._over:
+            self._close_over()
+            self._over = over_number
+
+        wide = extras.get("wides", 0)
+        no_ball = extras.get("noballs", 0)
+        legal = not wide and not no_ball
+        extra_runs = 0
+        for kind, runs in extras.items():
+            self.extras[_EXTRAS_FIELDS[kind]] += runs
+            extra_runs += runs
+        total = runs_batter + extra_runs
+
+        striker = self._batter(batter)
+        self._batter(non_striker)
+        if not wide:
+            striker.balls += 1
+        striker.runs += runs_batter
+        if boundary and runs_batter == 4:
+            striker.fours += 1
+        elif boundary and runs_batter == 6:
+            striker.sixes += 1
+
+        figures = self._bowling.get(bowler)
+        if figures is None:
+            figures = self._bowling[bowler] = _Bowling(bowler)
+        conceded = runs_batter + wide + no_ball
+        figures.runs += conceded
+        figures.wides += 1 if wide else 0
+        figures.no_balls += 1 if no_ball else 0
+        self._over_bowler = figures
+        self._over_runs += conceded
+        if legal:
+            figures.balls += 1
+            self.legal_balls += 1
+            self._over_balls += 1
+
+        partnership = self._partnership(batter, non_striker)
+        partnership.runs += total
+        if not wide:
+            partnership.balls += 1
+
+        self.total_runs += total
+        for kind, player_out, fielder in wickets:
+            dismissed = self._batter(player_out)
+            dismissed.dismissal = kind
+            dismissed.fielder = fielder
+            if kind in BOWLER_WICKETS:
+                dismissed.bowler = bowler
+                figures.wickets += 1
+            if kind not in NOT_OUT_DISMISSALS:
+                self.wickets += 1
+                self._fall_of_wickets.append((self.wickets, self.total_runs,
+                                              overs_notation(self.legal_balls, self.balls_per_over), player_out))
+            self._partnership_closed = True
+
+    def add_cricsheet_delivery(self, over_number: int, delivery: Dict[str, Any]) -> None:
+        """Adds a delivery in the shape of `innings[].overs[].deliveries[]` of a Cricsheet match file."""
+        runs = delivery["runs"]
+        self.add_ball(over_number,
+                      delivery["batter"],
+                      delivery["bowler"],
+                      delivery["non_striker"],
+                      runs["batter"],
+                      delivery.get("extras", {}),
+                      [(wicket["kind"], wicket["player_out"],
+                        next((fielder["name"] for fielder in wicket.get("fielders", []) if "name" in fielder), None))
+                       for wicket in delivery.get("wickets", [])],
+                      boundary=not runs.get("non_boundary", False))
+
+    def add_delivery(self, over_number: int, delivery: cricket.DeliveryModel) -> None:
+        """Adds a stored delivery; players are keyed by their ObjectId."""
+        extras = {}
+        if delivery.extras is not None:
+            for kind, field in _EXTRAS_FIELDS.items():
+                runs = getattr(delivery.extras, field)
+                if runs:
+                    extras[kind] = runs
+
+        self.add_ball(over_number,
+                      delivery.batter,
+                      delivery.bowler,
+                      delivery.non_striker,
+                      delivery.runs.runs_by_batter,
+                      extras,
+                      [(wicket.kind, wicket.player_out, wicket.fielders[0] if wicket.fielders else None)
+                       for wicket in delivery.wickets or []])
+
+    def team_score(self) -> cricket.TeamScore:
+        return cricket.TeamScore(team=self.team,
+                                 total_runs=self.total_runs,
+                                 wickets_lost=self.wickets,
+                                 overs_played=float(overs_notation(self.legal_balls, self.balls_per_over)))
+
+    def scorecard(self, player_of_match: Optional[str] = None) -> cricket.Scorecard:
+        """Materialises the aggregates as a `cricket.Scorecard`; the engine can keep taking deliveries after."""
+        name = self._name_of
+        maidens = {}
+        if self._over_bowler is not None and self._over_runs == 0 and self._over_balls >= self.balls_per_over:
+            maidens[self._over_bowler.player] = 1
+
+        return cricket.Scorecard(
+            team=self.team,
+            batting_performance=[
+                cricket.BattingPerformance(
+                    player=name(batting.player),
+                    runs=batting.runs,
+                    balls_faced=batting.balls,
+                    fours=batting.fours,
+                    sixes=batting.sixes,
+                    strike_rate=round(batting.runs * 100 / batting.balls, 2) if batting.balls else 0.0,
+                    dismissal=batting.dismissal,
+                    bowler=name(batting.bowler) if batting.bowler is not None else None,
+                    fielder=name(batting.fielder) if batting.fielder is not None else None,
+                )
+                for batting in self._batting.values()
+            ],
+            bowling_performance=[
+                cricket.BowlingPerformance(
+                    player=name(bowling.player),
+                    overs=float(overs_notation(bowling.balls, self.balls_per_over)),
+                    maidens=bowling.maidens + maidens.get(bowling.player, 0),
+                    runs_conceded=bowling.runs,
+                    wickets=bowling.wickets,
+                    economy=round(bowling.runs * self.balls_per_over / bowling.balls, 2) if bowling.balls else 0.0,
+                    wides=bowling.wides,
+                    no_balls=bowling.no_balls,
+                )
+                for bowling in self._bowling.values()
+            ],
+            extras=cricket.Extras(**self.extras),
+            fall_of_wickets=[
+                cricket.FallOfWickets(wicket_number=number, runs_at_fall=runs, over_at_fall=float(over),
+                                      batsman=name(player))
+                for number, runs, over, player in self._fall_of_wickets
+            ],
+            partnerships=[
+                cricket.Partnership(batsmen=[name(player) for player in partnership.batsmen],
+                                    runs=partnership.runs,
+                                    balls=partnership.balls)
+                for partnership in self._partnerships
+            ],
+            final_score=self.team_score(),
+            player_of_match=player_of_match,
+        )
+
+    def current_partnership(self) -> Optional[cricket.Partnership]:
+        if not self._partnerships or self._partnership_closed:
+            return None
+        partnership = self._partnerships[-1]
+        return cricket.Partnership(batsmen=[self._name_of(player) for player in partnership.batsmen],
+                                   runs=partnership.runs,
+                                   balls=partnership.balls)
+
+    def _batter(self, player: Hashable) -> _Batting:
+        batting = self._batting.get(player)
+        if batting is None:
+            batting = self._batting[player] = _Batting(player)
+        return batting
+
+    def _partnership(self, batter: Hashable, non_striker: Hashable) -> _Partnership:
+        if not self._partnership_closed:
+            current = self._partnerships[-1]
+            if batter in current.batsmen and non_striker in current.batsmen:
+                return current
+
+        partnership = _Partnership((batter, non_striker))
+        self._partnerships.append(partnership)
+        self._partnership_closed = False
+        return partnership
+
+    def _close_over(self) -> None:
+        if self._over_bowler is not None and self._over_runs == 0 and self._over_balls >= self.balls_per_over:
+            self._over_bowler.maidens += 1
+        self._over_bowler = None
+        self._over_runs = 0
+        self._over_balls = 0
+
+
+def scorecard_from_cricsheet(innings: Dict[str, Any],
+                             /,
+                             balls_per_over: int = 6,
+                             player_of_match: Optional[str] = None) -> cricket.Scorecard:
+    """Computes the scorecard of one Cricsheet innings in a single pass over its deliveries."""
+    engine = ScorecardEngine(innings["team"], balls_per_over=balls_per_over)
+    for over in innings.get("overs", []):
+        for delivery in over["deliveries"]:
+            engine.add_cricsheet_delivery(over["over"], delivery)
+    return engine.scorecard(player_of_match)
+
+
+def scorecard_from_deliveries(team: str,
+                              overs: Iterable[Tuple[int, Iterable[cricket.DeliveryModel]]],
+                              player_names: Dict[ObjectId, str],
+                              /,
+                              balls_per_over: int = 6) -> cricket.Scorecard:
+    """Computes the scorecard from stored `(over_number, deliveries)` pairs, naming players via `player_names`."""
+    engine = ScorecardEngine(team, balls_per_over=balls_per_over,
+                             name_of=lambda player: player_names.get(player, str(player)))
+    for over_number, deliveries in overs:
+        for delivery in deliveries:
+            engine.add_delivery(over_number, delivery)
+    return engine.scorecard()
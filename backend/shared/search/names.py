@@ -0,0 +1,293 @@
+import bisect
+import string
+import typing
+import unicodedata
+
+import numpy as np
+from bson import ObjectId
+
+from db import collection_structures as coll
+from db.db import CollectionAdapters
+from db.db import Collections
+from shared.models.common.base import UnloadedFieldError
+
+# Searched collections: result kind and the name fields indexed for it, the first being the display name
+SOURCES = {
+    Collections.PLAYERS.upper(): ("player", (coll.Players.NAME, coll.Players.FULL_NAME)),
+    Collections.TEAMS.upper(): ("team", (coll.Teams.NAME,)),
+    Collections.STADIUM.upper(): ("venue", (coll.Stadium.NAME,)),
+}
+KINDS = tuple(kind for kind, _ in SOURCES.values())
+DISPLAY_FIELDS = {kind: fields[0] for kind, fields in SOURCES.values()}
+
+# Trigram similarity below which a name is not a fuzzy match. It is shared / (shared + missing query trigrams + a
+# `NAME_WEIGHT` share of the name's other trigrams), so a misspelt word scores about the same on its own as inside a
+# longer name: "chenai" matches "chennai super kings" nearly as well as "chennai"
+MIN_SIMILARITY = 0.3
+NAME_WEIGHT = 0.1
+# Added to the similarity when every query word starts a word of the name, and again when the first query word
+# starts the name, so type-ahead matches rank above merely similar names
+PREFIX_BONUS = 1.0
+FIRST_WORD_BONUS = 0.5
+
+# Share of dead entries at which the index is rebuilt from its live names
+COMPACT_RATIO = 0.5
+
+# Index entity: result kind and document id
+Key = typing.Tuple[str, ObjectId]
+
+
+# Maps ASCII punctuation to spaces for the common all-ASCII name
+_ASCII_PUNCTUATION = str.maketrans({char: " " for char in string.punctuation})
+
+
+def normalize(text: str) -> str:
+    """Casefolded words without accents or punctuation, e.g. "Zaheer-Khan O'Brien" -> "zaheer khan o brien"."""
+    if text.isascii():
+        return " ".join(text.lower().translate(_ASCII_PUNCTUATION).split())
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    letters = "".join(char if char.isalnum() else " " for char in decomposed if not unicodedata.combining(char))
+    return " ".join(letters.split())
+
+
+def trigrams(normalized: str) -> typing.Set[str]:
+    """Distinct trigrams of the words, each padded like `"  word "` so word starts weigh more than endings."""
+    grams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        grams.update(padded[start:start + 3] for start in range(len(padded) - 2))
+    return grams
+
+
+class NameIndex:
+    """In-memory trigram and word-prefix index over player, team and venue names for type-ahead search.
+
+    Every indexed name is an entry. Trigram posting lists give each entry's similarity to the query with one
+    `bincount`, and a sorted word list answers prefixes with a binary search per query word, so a lookup costs
+    the same whatever the spelling and never scans the collections. Entries are appended; a renamed or deleted
+    document leaves dead entries behind until enough accumulate to rebuild.
+    """
+    _alive: typing.List[bool]
+    _arrays: typing.Optional[typing.Tuple[np.ndarray, np.ndarray, np.ndarray]]
+    _dead: int
+    _entries: typing.Dict[Key, typing.List[int]]
+    _keys: typing.List[Key]
+    _names: typing.Dict[Key, typing.Dict[str, str]]
+    _postings: typing.Dict[str, typing.List[int]]
+    _posting_arrays: typing.Dict[str, np.ndarray]
+    _sizes: typing.List[int]
+    _texts: typing.List[str]
+    _word_arrays: typing.Optional[typing.Tuple[np.ndarray, np.ndarray]]
+    _word_entries: typing.List[int]
+    _word_first: typing.List[bool]
+    _words: typing.List[str]
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self) -> None:
+        self._alive = []
+        self._arrays = None
+        self._dead = 0
+        self._entries = {}
+        self._keys = []
+        self._names = {}
+        self._postings = {}
+        self._posting_arrays = {}
+        self._sizes = []
+        self._texts = []
+        self._word_arrays = None
+        self._word_entries = []
+        self._word_first = []
+        self._words = []
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    async def load(self) -> None:
+        """Rebuilds the index from the searched collections."""
+        names: typing.Dict[Key, typing.Dict[str, str]] = {}
+        for collection_name, (kind, fields) in SOURCES.items():
+            adapter = getattr(CollectionAdapters, collection_name)
+            cursor = await adapter.find_documents({}, projection={field: 1 for field in fields}, batch_size=5000)
+            async for document in cursor:
+                names[(kind, document["_id"])] = {field: document[field] for field in fields
+                                                  if isinstance(document.get(field), str)}
+        self._rebuild(names)
+
+    def _rebuild(self, names: typing.Dict[Key, typing.Dict[str, str]]) -> None:
+        self.clear()
+        words = []
+        for key, fields in names.items():
+            self._names[key] = fields
+            words.extend(self._add_entries(key, fields))
+        # Sorting once is much cheaper than inserting every word in order
+        words.sort()
+        self._words = [word for word, _, _ in words]
+        self._word_entries = [entry for _, entry, _ in words]
+        self._word_first = [first for _, _, first in words]
+
+    def _add_entries(self, key: Key, fields: typing.Dict[str, str]) -> typing.List[typing.Tuple[str, int, bool]]:
+        """Appends an entry per distinct name of `key`; returns the `(word, entry, is first word)` to index."""
+        words = []
+        entries = self._entries.setdefault(key, [])
+        postings = self._postings
+        seen = set()
+        for text in fields.values():
+            normalized = normalize(text)
+            if not normalized or normalized in seen:
+                continue
+            seen.add(normalized)
+
+            entry = len(self._keys)
+            entries.append(entry)
+            self._keys.append(key)
+            self._texts.append(text)
+            self._alive.append(True)
+            grams = trigrams(normalized)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(entry)
+            words.extend((word, entry, position == 0) for position, word in enumerate(normalized.split()))
+        self._arrays = None
+        return words
+
+    def put(self, kind: str, document_id: ObjectId, fields: typing.Dict[str, typing.Optional[str]]) -> None:
+        """Indexes the names of a document, replacing what was indexed for it; None values are not indexed."""
+        key = (kind, document_id)
+        fields = {field: text for field, text in fields.items() if isinstance(text, str)}
+        if self._names.get(key) == fields:
+            return
+        self.remove(kind, document_id)
+        self._names[key] = fields
+        # Posting arrays are rebuilt as searches need them again
+        self._posting_arrays.clear()
+        for word, entry, first in self._add_entries(key, fields):
+            position = bisect.bisect_left(self._words, word)
+            self._words.insert(position, word)
+            self._word_entries.insert(position, entry)
+            self._word_first.insert(position, first)
+        self._word_arrays = None
+
+    def remove(self, kind: str, document_id: ObjectId) -> None:
+        key = (kind, document_id)
+        self._names.pop(key, None)
+        for entry in self._entries.pop(key, ()):
+            self._alive[entry] = False
+            self._dead += 1
+        self._arrays = None
+        if self._dead > COMPACT_RATIO * len(self._keys):
+            self._rebuild(dict(self._names))
+
+    def written(self, instance: typing.Any, deleted: bool) -> None:
+        """`BaseModel.write_listeners` hook keeping the index in step with the models written in this process."""
+        source = SOURCES.get(getattr(instance, "collection_name", None))
+        if source is None or instance.id is None:
+            return
+        kind, fields = source
+        if deleted:
+            self.remove(kind, instance.id)
+            return
+
+        names = dict(self._names.get((kind, instance.id), {}))
+        for field in fields:
+            try:
+                names[field] = getattr(instance, field)
+            except UnloadedFieldError:
+                # Loaded with a projection that left the field out; keep what was indexed for it
+                pass
+        self.put(kind, instance.id, names)
+
+    def _posting(self, gram: str) -> np.ndarray:
+        array = self._posting_arrays.get(gram)
+        if array is None:
+            array = self._posting_arrays[gram] = np.array(self._postings[gram], dtype=np.int32)
+        return array
+
+    def _entry_arrays(self) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._arrays is None:
+            kinds = {kind: code for code, kind in enumerate(KINDS)}
+            self._arrays = (np.array(self._alive, dtype=bool),
+                            np.array(self._sizes, dtype=np.float64),
+                            np.array([kinds[kind] for kind, _ in self._keys], dtype=np.int8))
+        return self._arrays
+
+    def _prefixed(self, words: typing.List[str]) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Entries where every query word starts one of their words, and those whose first word the first query
+        word starts."""
+        if self._word_arrays is None:
+            self._word_arrays = (np.array(self._word_entries, dtype=np.int32), np.array(self._word_first, dtype=bool))
+        word_entries, word_first = self._word_arrays
+
+        matched = None
+        first = np.zeros(0, dtype=np.int32)
+        for position, word in enumerate(words):
+            start = bisect.bisect_left(self._words, word)
+            end = bisect.bisect_left(self._words, word + "\U0010ffff", lo=start)
+            entries = word_entries[start:end]
+            if position == 0:
+                first = entries[word_first[start:end]]
+            matched = np.unique(entries) if matched is None else np.intersect1d(matched, entries)
+            if not len(matched):
+                break
+        return (matched if matched is not None else np.zeros(0, dtype=np.int32)), first
+
+    def search(self,
+               text: str,
+               /,
+               kinds: typing.Optional[typing.Iterable[str]] = None,
+               limit: int = 10) -> typing.List[typing.Dict[str, typing.Any]]:
+        """Best matching documents for a partial or misspelt name, at most one row per document.
+
+        Rows are `{"kind", "id", "name", "matched", "score"}`, `name` being the display name and `matched` the
+        indexed name that matched, e.g. a player's full name.
+        """
+        query = normalize(text)
+        if not query or not self._keys:
+            return []
+
+        alive, sizes, entry_kinds = self._entry_arrays()
+        scores = np.zeros(len(alive), dtype=np.float64)
+
+        grams = trigrams(query)
+        postings = [self._posting(gram) for gram in grams if gram in self._postings]
+        if postings:
+            shared = np.bincount(np.concatenate(postings), minlength=len(alive))
+            similarity = shared / (len(grams) + NAME_WEIGHT * (sizes - shared))
+            scores[similarity >= MIN_SIMILARITY] = similarity[similarity >= MIN_SIMILARITY]
+
+        prefixed, first = self._prefixed(query.split())
+        scores[prefixed] += PREFIX_BONUS
+        scores[first[np.isin(first, prefixed)]] += FIRST_WORD_BONUS
+
+        scores[~alive] = 0
+        if kinds is not None:
+            scores[~np.isin(entry_kinds, [KINDS.index(kind) for kind in kinds])] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        # Documents can match through several names, so take enough entries to still fill `limit` rows
+        wanted = min(len(candidates), limit * 2)
+        if wanted < len(candidates):
+            candidates = candidates[np.argpartition(-scores[candidates], wanted - 1)[:wanted]]
+        ranked = sorted(candidates.tolist(), key=lambda entry: (-scores[entry], len(self._texts[entry])))
+
+        rows = []
+        seen = set()
+        for entry in ranked:
+            key = self._keys[entry]
+            if key in seen:
+                continue
+            seen.add(key)
+            kind, document_id = key
+            names = self._names[key]
+            rows.append({"kind": kind,
+                         "id": str(document_id),
+                         "name": names.get(DISPLAY_FIELDS[kind], self._texts[entry]),
+                         "matched": self._texts[entry],
+                         "score": round(float(scores[entry]), 3)})
+            if len(rows) == limit:
+                break
+        return rows
+
+
+name_index = NameIndex()
@@ -0,0 +1,47 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from db.db import Caches  # noqa: E402
+from db.db import DatabaseAdapter  # noqa: E402
+from shared.db_adapters.memory import MemoryDatabase  # noqa: E402
+from shared.models import cricket  # noqa: E402,F401  (registers the stored models for ensure_indexes)
+from shared.models.common.indexes import ensure_indexes  # noqa: E402
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def database(loop):
+    """Points the cricket collections at a fresh in-memory database."""
+    db = MemoryDatabase("gameviz_tests")
+    previous = DatabaseAdapter.CRICKET._db
+    DatabaseAdapter.CRICKET.use(db)
+    Caches.DIMENSIONS.clear()
+    loop.run_until_complete(ensure_indexes())
+    yield db
+    DatabaseAdapter.CRICKET._db = previous
+    Caches.DIMENSIONS.clear()
+
+
+@pytest.fixture
+def client(database):
+    """The API on the in-memory database, with an empty response cache."""
+    from fastapi.testclient import TestClient
+
+    from bin.main import app
+    from shared.api.responses import response_cache
+
+    response_cache.clear()
+    with TestClient(app) as client:
+        yield client
+    response_cache.clear()
@@ -0,0 +1,136 @@
+import asyncio
+import json
+from datetime import datetime
+from datetime import timezone
+from typing import Dict, List
+
+import httpx
+import pytest
+
+from db import collection_structures as coll
+from db.db import CollectionAdapters
+from shared.enrichment.players import PlayerEnricher
+
+BASE_URL = "http://profiles.test/players"
+
+PROFILES = {
+    "aaaa0001": {"full_name": "Mahendra Singh Dhoni", "batting_style": "Right hand Bat", "bowling_style": "Right arm Offbreak", "role": "Allrounder",
+                 "date_of_birth": "1981-07-07"},
+    "cccc0003": {"batting_style": "Left hand Bat", "role": "Batter"},
+}
+
+
+class ProfileServer:
+    """`httpx.MockTransport` handler serving `PROFILES` with ETags; unknown ids are 404s."""
+
+    def __init__(self, /, rate_limited: int = 0) -> None:
+        # Requests for cccc0003 answered 429 before the profile is served
+        self.rate_limited = rate_limited
+        self.requests: List[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        cric_sheet_id = request.url.path.rsplit("/", 1)[1]
+        profile = PROFILES.get(cric_sheet_id)
+        if profile is None:
+            return httpx.Response(404, text="{}")
+
+        if cric_sheet_id == "cccc0003" and self.rate_limited:
+            self.rate_limited -= 1
+            return httpx.Response(429, headers={"Retry-After": "3"})
+
+        etag = f'"{cric_sheet_id}-1"'
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(200, text=json.dumps(profile), headers={"ETag": etag})
+
+    def requested(self) -> List[str]:
+        return sorted(request.url.path.rsplit("/", 1)[1] for request in self.requests)
+
+
+@pytest.fixture
+def players(loop, database):
+    for cric_sheet_id, name in (("aaaa0001", "MS Dhoni"), ("bbbb0002", "A Nobody"), ("cccc0003", "SK Raina")):
+        loop.run_until_complete(CollectionAdapters.PLAYERS.insert_one({coll.Players.CRIC_SHEET_ID: cric_sheet_id,
+                                                                       coll.Players.NAME: name}))
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> List[float]:
+    """Records the delays the fetcher waits for instead of sleeping through them."""
+    delays = []
+    sleep = asyncio.sleep
+
+    async def record(delay, *args, **kwargs):
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", record)
+    return delays
+
+
+def _enricher(server: ProfileServer, cache_dir) -> PlayerEnricher:
+    return PlayerEnricher(BASE_URL, cache_dir=str(cache_dir), concurrency=2, rate=1000.0,
+                          transport=httpx.MockTransport(server))
+
+
+def _stored(loop) -> Dict[str, dict]:
+    async def load():
+        cursor = await CollectionAdapters.PLAYERS.find_documents({})
+        return {document[coll.Players.CRIC_SHEET_ID]: document async for document in cursor}
+
+    return loop.run_until_complete(load())
+
+
+def test_enrich_fills_profiles(loop, players, sleeps, tmp_path):
+    server = ProfileServer(rate_limited=1)
+    enricher = _enricher(server, tmp_path)
+    loop.run_until_complete(enricher.enrich())
+
+    stored = _stored(loop)
+    assert stored["aaaa0001"][coll.Players.ROLE] == "Allrounder"
+    assert stored["aaaa0001"][coll.Players.FULL_NAME] == "Mahendra Singh Dhoni"
+    assert stored["aaaa0001"][coll.Players.DATE_OF_BIRTH] == datetime(1981, 7, 7)
+    # 404: looked up, nothing to fill
+    assert stored["bbbb0002"].get(coll.Players.ROLE) is None
+    assert stored["bbbb0002"][coll.Players.PROFILE_FETCHED_AT] is not None
+    # 429: retried after the Retry-After delay, then filled
+    assert stored["cccc0003"][coll.Players.BATTING_STYLE] == "Left hand Bat"
+    assert 3.0 in sleeps
+
+    assert (enricher.players, enricher.updated, enricher.not_found, enricher.errors) == (3, 2, 1, [])
+    assert enricher.fetcher.retries == 1
+    assert server.requested() == ["aaaa0001", "bbbb0002", "cccc0003", "cccc0003"]
+
+
+def test_enrich_revalidates_cached_profiles(loop, players, sleeps, tmp_path):
+    loop.run_until_complete(_enricher(ProfileServer(), tmp_path).enrich())
+
+    server = ProfileServer()
+    enricher = _enricher(server, tmp_path)
+    loop.run_until_complete(enricher.enrich(refresh=True))
+
+    # Players with a missing field are looked up again, sending the cached ETag; 304s reuse the cached body
+    revalidated = {request.url.path.rsplit("/", 1)[1]: request.headers.get("if-none-match")
+                   for request in server.requests}
+    assert revalidated == {"bbbb0002": None, "cccc0003": '"cccc0003-1"'}
+    assert enricher.fetcher.not_modified == 1
+    assert _stored(loop)["cccc0003"][coll.Players.BATTING_STYLE] == "Left hand Bat"
+
+
+def test_enrich_resumes_after_profile_fetched_at(loop, players, sleeps, tmp_path):
+    # As if an interrupted run had already looked up the first player
+    fetched_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    loop.run_until_complete(CollectionAdapters.PLAYERS.update_one(
+        {coll.Players.CRIC_SHEET_ID: "aaaa0001"}, {"$set": {coll.Players.PROFILE_FETCHED_AT: fetched_at}}))
+
+    server = ProfileServer()
+    loop.run_until_complete(_enricher(server, tmp_path).enrich())
+    assert server.requested() == ["bbbb0002", "cccc0003"]
+    assert _stored(loop)["aaaa0001"].get(coll.Players.ROLE) is None
+
+    # Everyone has been looked up now, so a plain re-run has nothing to fetch
+    server = ProfileServer()
+    enricher = _enricher(server, tmp_path)
+    loop.run_until_complete(enricher.enrich())
+    assert server.requests == [] and enricher.players == 0
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from shared.ingest.cricsheet import CricsheetIngestor
+
+pytest.importorskip("pyarrow")
+
+from shared.analytics.export import ParquetExporter  # noqa: E402
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "tools", "ipl.json")
+
+
+def test_export_writes_columnar_deliveries(loop, database, tmp_path):
+    loop.run_until_complete(CricsheetIngestor(layout="both").ingest(SAMPLE))
+    exporter = ParquetExporter(str(tmp_path))
+    loop.run_until_complete(exporter.export())
+    assert exporter.exported == 1 and exporter.deliveries > 200
+
+
+def test_export_refuses_document_layout(loop, database, tmp_path):
+    loop.run_until_complete(CricsheetIngestor(layout="documents").ingest(SAMPLE))
+    with pytest.raises(ValueError, match="no innings_columns"):
+        loop.run_until_complete(ParquetExporter(str(tmp_path)).export())
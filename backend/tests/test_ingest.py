@@ -0,0 +1,155 @@
+import json
+import os
+from typing import Dict, List
+
+import pytest
+
+from db import collection_structures as coll
+from db.db import Caches
+from db.db import CollectionAdapters
+from db.db import DatabaseAdapter
+from shared.db_adapters.memory import MemoryDatabase
+from shared.ingest.cricsheet import CricsheetIngestor
+from shared.models.common.indexes import ensure_indexes
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "tools", "ipl.json")
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """A directory holding two copies of the sample match under different Cricsheet ids."""
+    with open(SAMPLE) as file:
+        data = json.load(file)
+    for match_key in ("1001", "1002"):
+        _write(tmp_path, match_key, data)
+    return tmp_path
+
+
+def _write(directory, match_key: str, data: dict) -> None:
+    with open(os.path.join(directory, f"{match_key}.json"), "w") as file:
+        json.dump(data, file)
+
+
+def _ingest(loop, path, /, **options) -> CricsheetIngestor:
+    ingestor = CricsheetIngestor(batch_size=100, **options)
+    loop.run_until_complete(ingestor.ingest(str(path)))
+    assert ingestor.errors == []
+    return ingestor
+
+
+def _stored(loop) -> Dict[str, List[dict]]:
+    async def load():
+        stored = {}
+        for collection in (CollectionAdapters.MATCHES, CollectionAdapters.INNINGS, CollectionAdapters.OVERS,
+                           CollectionAdapters.DELIVERIES, CollectionAdapters.INNINGS_COLUMNS,
+                           CollectionAdapters.INNINGS_CHARTS, CollectionAdapters.SOURCE_FILES):
+            cursor = await collection.find_documents({})
+            stored[collection.collection_name] = [document async for document in cursor]
+        return stored
+
+    return loop.run_until_complete(load())
+
+
+def _assert_no_orphans(stored: Dict[str, List[dict]]) -> None:
+    def ids(name: str) -> set:
+        return {document["_id"] for document in stored[name]}
+
+    matches, innings, overs = ids("matches"), ids("innings"), ids("overs")
+    assert {document[coll.Innings.MATCH_ID] for document in stored["innings"]} <= matches
+    assert {document[coll.Overs.INNINGS_ID] for document in stored["overs"]} <= innings
+    assert {document[coll.Deliveries.OVER_ID] for document in stored["deliveries"]} <= overs
+    assert {document[coll.InningsColumns.MATCH_ID] for document in stored["innings_columns"]} <= matches
+    assert {document[coll.InningsCharts.MATCH_ID] for document in stored["innings_charts"]} <= matches
+    assert {document[coll.SourceFiles.MATCH_ID] for document in stored["source_files"]} <= matches
+
+
+def _counts(stored: Dict[str, List[dict]]) -> Dict[str, int]:
+    return {name: len(documents) for name, documents in stored.items()}
+
+
+def test_unchanged_files_are_skipped(loop, database, archive):
+    first = _ingest(loop, archive)
+    assert (first.matches, first.skipped) == (2, 0)
+    stored = _stored(loop)
+
+    second = _ingest(loop, archive)
+    assert (second.matches, second.skipped, second.replaced, second.deliveries) == (0, 2, 0, 0)
+    assert _stored(loop) == stored
+
+
+def test_new_revision_replaces_match_in_place(loop, database, archive):
+    _ingest(loop, archive)
+    before = _counts(_stored(loop))
+
+    # The republished file drops the last five overs of the second innings
+    with open(os.path.join(archive, "1002.json")) as file:
+        data = json.load(file)
+    data["meta"]["revision"] += 1
+    dropped = data["innings"][1]["overs"][-5:]
+    del data["innings"][1]["overs"][-5:]
+    _write(archive, "1002", data)
+
+    ingestor = _ingest(loop, archive)
+    assert (ingestor.matches, ingestor.skipped, ingestor.replaced) == (1, 1, 1)
+
+    stored = _stored(loop)
+    _assert_no_orphans(stored)
+    assert _counts(stored) == {**before,
+                               "overs": before["overs"] - 5,
+                               "deliveries": before["deliveries"] - sum(len(over["deliveries"]) for over in dropped)}
+    revisions = {document[coll.SourceFiles.CRIC_SHEET_ID]: document[coll.SourceFiles.REVISION]
+                 for document in stored["source_files"]}
+    assert revisions == {"1001": data["meta"]["revision"] - 1, "1002": data["meta"]["revision"]}
+
+
+def test_deleted_file_is_kept_unless_pruned(loop, database, archive):
+    _ingest(loop, archive)
+    before = _counts(_stored(loop))
+    os.remove(os.path.join(archive, "1002.json"))
+
+    ingestor = _ingest(loop, archive)
+    assert (ingestor.skipped, ingestor.deleted) == (1, 0)
+    assert _counts(_stored(loop)) == before
+
+    ingestor = _ingest(loop, archive, prune=True)
+    assert (ingestor.skipped, ingestor.deleted) == (1, 1)
+    stored = _stored(loop)
+    _assert_no_orphans(stored)
+    assert _counts(stored) == {name: count // 2 for name, count in before.items()}
+    assert [document[coll.Matches.CRIC_SHEET_ID] for document in stored["matches"]] == ["1001"]
+
+
+def test_dimension_ids_are_derived_from_natural_keys(loop, database, archive):
+    def dimensions() -> Dict[str, Dict[tuple, object]]:
+        async def load():
+            found = {}
+            for collection, key_fields in ((CollectionAdapters.SERIES, (coll.Series.NAME, coll.Series.SEASON)),
+                                           (CollectionAdapters.TEAMS, (coll.Teams.NAME,)),
+                                           (CollectionAdapters.STADIUM, (coll.Stadium.NAME, coll.Stadium.CITY)),
+                                           (CollectionAdapters.PLAYERS, (coll.Players.CRIC_SHEET_ID,))):
+                cursor = await collection.find_documents({})
+                found[collection.collection_name] = {tuple(document[field] for field in key_fields): document["_id"]
+                                                     async for document in cursor}
+            return found
+
+        return loop.run_until_complete(load())
+
+    _ingest(loop, archive)
+    first = dimensions()
+    players = _stored_players(loop)
+    assert players and all(player.get(coll.Players.FULL_NAME) is None for player in players)
+
+    # A separate database loaded from the same files gets the same ids
+    DatabaseAdapter.CRICKET.use(MemoryDatabase("gameviz_tests_copy"))
+    Caches.DIMENSIONS.clear()
+    loop.run_until_complete(ensure_indexes())
+    _ingest(loop, archive)
+    assert dimensions() == first and all(first.values())
+
+
+def _stored_players(loop) -> List[dict]:
+    async def load():
+        cursor = await CollectionAdapters.PLAYERS.find_documents({})
+        return [document async for document in cursor]
+
+    return loop.run_until_complete(load())
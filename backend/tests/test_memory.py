@@ -0,0 +1,78 @@
+import pytest
+from pymongo import IndexModel
+from pymongo import InsertOne
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.errors import DuplicateKeyError
+
+from db.db import CollectionAdapters
+from shared.db_adapters.memory import MemoryDatabase
+
+VENUES = [{"name": "Gymkhana Ground", "city": "Mumbai"}, {"name": "Gymkhana Ground", "city": "Bulawayo"}]
+
+
+@pytest.fixture
+def stadiums(loop):
+    collection = MemoryDatabase("gameviz_tests").get_collection("stadium")
+    loop.run_until_complete(collection.create_indexes([IndexModel([("name", 1), ("city", 1)], unique=True),
+                                                       IndexModel([("capacity", -1)])]))
+    for venue in VENUES:
+        loop.run_until_complete(collection.insert_one(dict(venue)))
+    return collection
+
+
+def _names(loop, collection) -> list:
+    return sorted((document["name"], document["city"])
+                  for document in loop.run_until_complete(collection.find({}).to_list(None)))
+
+
+def test_compound_unique_index(loop, stadiums):
+    with pytest.raises(DuplicateKeyError, match="name_1_city_1"):
+        loop.run_until_complete(stadiums.insert_one(dict(VENUES[0])))
+    with pytest.raises(DuplicateKeyError):
+        loop.run_until_complete(stadiums.update_one({"city": "Bulawayo"}, {"$set": {"city": "Mumbai"}}))
+    # A key that only repeats one of the fields is not a duplicate
+    loop.run_until_complete(stadiums.insert_one({"name": "Eden Gardens", "city": "Mumbai"}))
+
+    assert _names(loop, stadiums) == [("Eden Gardens", "Mumbai"), ("Gymkhana Ground", "Bulawayo"),
+                                      ("Gymkhana Ground", "Mumbai")]
+    assert loop.run_until_complete(stadiums.find({"name": "Gymkhana Ground"}).explain())[
+        "queryPlanner"]["winningPlan"]["stage"] == "IXSCAN"
+
+
+def test_unique_index_over_duplicates_is_refused(loop):
+    collection = MemoryDatabase("gameviz_tests").get_collection("stadium")
+    for venue in (VENUES[0], VENUES[0]):
+        loop.run_until_complete(collection.insert_one(dict(venue)))
+    with pytest.raises(DuplicateKeyError):
+        loop.run_until_complete(collection.create_indexes([IndexModel([("name", 1), ("city", 1)], unique=True)]))
+
+
+def test_index_information_uses_mongo_names(loop, stadiums, database):
+    assert loop.run_until_complete(stadiums.index_information()) == {
+        "_id_": {"key": [("_id", 1)]},
+        "name_1_city_1": {"key": [("name", 1), ("city", 1)], "unique": True},
+        "capacity_-1": {"key": [("capacity", -1)]},
+    }
+    # The declared model indexes, as `ensure_indexes` created them
+    information = loop.run_until_complete(CollectionAdapters.SERIES.get_collection().index_information())
+    assert information["season_1_match_type_1_name_1__id_1"] == {
+        "key": [("season", 1), ("match_type", 1), ("name", 1), ("_id", 1)]}
+
+
+@pytest.mark.parametrize("ordered, inserted", [(True, [("Gymkhana Ground", "Bulawayo"), ("Gymkhana Ground", "Mumbai"),
+                                                       ("Wankhede", "Mumbai")]),
+                                               (False, [("Eden Gardens", "Kolkata"), ("Gymkhana Ground", "Bulawayo"),
+                                                        ("Gymkhana Ground", "Mumbai"), ("Wankhede", "Mumbai")])])
+def test_bulk_write_errors(loop, stadiums, ordered, inserted):
+    requests = [InsertOne({"name": "Wankhede", "city": "Mumbai"}),
+                InsertOne(dict(VENUES[1])),
+                UpdateOne({"name": "Eden Gardens"}, {"$set": {"city": "Kolkata"}}, upsert=True)]
+    with pytest.raises(BulkWriteError) as raised:
+        loop.run_until_complete(stadiums.bulk_write(requests, ordered=ordered))
+
+    # An ordered batch stops at the failed write, an unordered one applies everything else
+    details = raised.value.details
+    assert [(error["index"], error["code"]) for error in details["writeErrors"]] == [(1, 11000)]
+    assert (details["nInserted"], details["nUpserted"]) == (1, 0 if ordered else 1)
+    assert _names(loop, stadiums) == inserted
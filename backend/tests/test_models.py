@@ -0,0 +1,112 @@
+import base64
+
+import bson
+import pytest
+from bson import ObjectId
+
+from db import collection_structures as coll
+from shared.models import cricket
+from shared.models.common.base import UnloadedFieldError
+from shared.models.common.pagination import InvalidPageToken
+from shared.models.common.pagination import decode_token
+from shared.models.common.pagination import encode_token
+
+
+@pytest.fixture
+def player(loop, database) -> cricket.Player:
+    player = cricket.Player(cric_sheet_id="aaaa0001", name="MS Dhoni", full_name="Mahendra Singh Dhoni")
+    loop.run_until_complete(player.save_to_db())
+    return player
+
+
+@pytest.mark.parametrize("on_missing", ["raise", "fetch"])
+def test_unloaded_field_in_event_loop_points_to_load_fields(loop, player, on_missing):
+    async def read():
+        projected = await cricket.Player.read_from_db({"_id": player.id}, fields=["name"], on_missing=on_missing)
+        assert projected.name == "MS Dhoni"
+        with pytest.raises(UnloadedFieldError, match=r"load_fields\('full_name'\)"):
+            projected.full_name
+
+        await projected.load_fields("full_name")
+        return projected.full_name
+
+    assert loop.run_until_complete(read()) == "Mahendra Singh Dhoni"
+
+
+def test_fetch_on_access_outside_event_loop(loop, player):
+    projected = loop.run_until_complete(
+        cricket.Player.read_from_db({"_id": player.id}, fields=["name"], on_missing="fetch"))
+    assert projected.full_name == "Mahendra Singh Dhoni"
+
+
+@pytest.fixture
+def namesakes(loop, database) -> list:
+    """Players sorted by name and `_id`; three share the name "RG Sharma"."""
+    players = []
+    for index, name in enumerate(["A Kumble", "RG Sharma", "RG Sharma", "RG Sharma", "Z Khan"]):
+        player = cricket.Player(cric_sheet_id=f"p{index}", name=name, full_name=name)
+        loop.run_until_complete(player.save_to_db())
+        players.append(player)
+    return sorted(players, key=lambda player: (player.name, player.id))
+
+
+def _pages(loop, query: dict, /, limit: int, sort=None) -> list:
+    async def read():
+        pages, after = [], None
+        while True:
+            page = await cricket.Player.page(query, sort=sort, limit=limit, after=after)
+            pages.append([player.id for player in page.items])
+            if page.next_token is None:
+                return pages
+            after = page.next_token
+
+    return loop.run_until_complete(read())
+
+
+def test_page_tokens_round_trip(loop, namesakes):
+    order = [(coll.Players.NAME, 1), ("_id", 1)]
+    values = ["RG Sharma", namesakes[2].id]
+    assert decode_token(encode_token(order, values), order) == values
+
+    pages = _pages(loop, {}, limit=2, sort=[(coll.Players.NAME, 1)])
+    assert pages == [[player.id for player in namesakes[start:start + 2]] for start in range(0, 5, 2)]
+
+
+def test_page_breaks_ties_on_the_sort_key_by_id(loop, namesakes):
+    # Every page boundary falls between players of the same name
+    pages = _pages(loop, {coll.Players.NAME: "RG Sharma"}, limit=1)
+    assert pages == [[player.id] for player in namesakes[1:4]]
+
+    pages = _pages(loop, {}, limit=1, sort=[(coll.Players.NAME, -1)])
+    assert [ids[0] for ids in pages] == [player.id for player in
+                                         sorted(namesakes, key=lambda player: (player.name, player.id), reverse=True)]
+
+
+@pytest.mark.parametrize("token", [
+    "not a token!",
+    "AAAA",
+    # Issued for a listing sorted by another key
+    encode_token([(coll.Players.CRIC_SHEET_ID, 1)], ["p1"]),
+    # Edited to continue after a list
+    base64.urlsafe_b64encode(bson.encode({"k": [coll.Players.NAME, "_id"], "v": [["RG Sharma"], 1]})).decode(),
+    # Truncated
+    encode_token([(coll.Players.NAME, 1), ("_id", 1)], ["RG Sharma", ObjectId()])[:-8],
+])
+def test_page_rejects_invalid_tokens(loop, namesakes, token):
+    with pytest.raises(InvalidPageToken):
+        loop.run_until_complete(cricket.Player.page({}, sort=[(coll.Players.NAME, 1)], after=token))
+
+
+def test_list_routes_are_paged(loop, client):
+    for name in ("Indian Premier League", "Big Bash League", "Pakistan Super League"):
+        loop.run_until_complete(cricket.Series(name=name, season="2023", gender="male", match_type="T20").save_to_db())
+
+    first = client.get("/series", params={"season": "2023", "limit": 2}).json()
+    second = client.get("/series", params={"season": "2023", "limit": 2, "after": first["next"]}).json()
+    assert [series["name"] for series in first["items"] + second["items"]] == [
+        "Big Bash League", "Indian Premier League", "Pakistan Super League"]
+    assert second["next"] is None
+    assert client.get("/series", params={"after": first["next"][::-1]}).status_code == 400
+
+    innings = client.get(f"/matches/{ObjectId()}/innings").json()
+    assert innings == {"items": [], "next": None}
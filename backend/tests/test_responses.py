@@ -0,0 +1,44 @@
+from db import collection_structures as coll
+from db.db import CollectionAdapters
+from db.db import Collections
+from shared.analytics import summaries
+from shared.db_adapters import track_reads
+from shared.models import cricket
+
+
+def _player(loop, name: str) -> str:
+    player = cricket.Player(cric_sheet_id=name.lower().replace(" ", ""), name=name, full_name=name)
+    loop.run_until_complete(player.save_to_db())
+    return str(player.id)
+
+
+def test_write_changes_the_etag(loop, client):
+    player_id = _player(loop, "V Kohli")
+    first = client.get(f"/players/{player_id}")
+    etag = first.headers["etag"]
+    assert client.get(f"/players/{player_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    loop.run_until_complete(CollectionAdapters.PLAYERS.update_one(
+        {coll.Players.CRIC_SHEET_ID: "vkohli"}, {"$set": {coll.Players.FULL_NAME: "Virat Kohli"}}))
+
+    second = client.get(f"/players/{player_id}", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.headers["etag"] != etag
+    assert second.json()[coll.Players.FULL_NAME] == "Virat Kohli"
+    assert client.get(f"/players/{player_id}", headers={"If-None-Match": second.headers["etag"]}).status_code == 304
+
+
+def test_unrelated_write_keeps_the_etag(loop, client):
+    player_id = _player(loop, "MS Dhoni")
+    etag = client.get(f"/players/{player_id}").headers["etag"]
+
+    loop.run_until_complete(CollectionAdapters.TEAMS.insert_one({coll.Teams.NAME: "Chennai Super Kings"}))
+
+    assert client.get(f"/players/{player_id}", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_aggregation_tracks_joined_collections(loop, database):
+    # `top_run_scorers` reads series and matches and joins innings, so a write to any of them retires its body
+    with track_reads() as reads:
+        loop.run_until_complete(summaries.top_run_scorers("2023"))
+    assert set(reads) == {Collections.SERIES, Collections.MATCHES, Collections.INNINGS}
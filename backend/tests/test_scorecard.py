@@ -0,0 +1,115 @@
+from typing import Optional
+
+from shared.scoring.scorecard import ScorecardEngine
+from shared.scoring.scorecard import scorecard_from_cricsheet
+
+
+def _ball(batter: str, non_striker: str, bowler: str, runs: int = 0, /,
+          extras: Optional[dict] = None, wicket: Optional[dict] = None) -> dict:
+    extras = extras or {}
+    delivery = {"batter": batter, "bowler": bowler, "non_striker": non_striker,
+                "runs": {"batter": runs, "extras": sum(extras.values()), "total": runs + sum(extras.values())}}
+    if extras:
+        delivery["extras"] = extras
+    if wicket:
+        delivery["wickets"] = [wicket]
+    return delivery
+
+
+# Over 0: a wide, a four, leg byes and a catch; over 1: byes and a run-out in a maiden; over 2: a no-ball
+INNINGS = {
+    "team": "Chennai Super Kings",
+    "overs": [
+        {"over": 0, "deliveries": [
+            _ball("Opener", "Partner", "Seamer", 1),
+            _ball("Partner", "Opener", "Seamer", extras={"wides": 1}),
+            _ball("Partner", "Opener", "Seamer", 4),
+            _ball("Partner", "Opener", "Seamer", extras={"legbyes": 1}),
+            _ball("Opener", "Partner", "Seamer"),
+            _ball("Opener", "Partner", "Seamer",
+                  wicket={"kind": "caught", "player_out": "Opener", "fielders": [{"name": "Keeper"}]}),
+            _ball("Three", "Partner", "Seamer"),
+        ]},
+        {"over": 1, "deliveries": [
+            _ball("Three", "Partner", "Spinner", extras={"byes": 4}),
+            _ball("Three", "Partner", "Spinner"),
+            _ball("Three", "Partner", "Spinner"),
+            _ball("Three", "Partner", "Spinner",
+                  wicket={"kind": "run out", "player_out": "Partner", "fielders": [{"name": "Cover"}]}),
+            _ball("Three", "Four", "Spinner"),
+            _ball("Four", "Three", "Spinner"),
+        ]},
+        {"over": 2, "deliveries": [
+            _ball("Four", "Three", "Seamer", 2, extras={"noballs": 1}),
+        ]},
+    ],
+}
+
+
+def _batting(player, runs, balls, strike_rate, /, fours=0, dismissal=None, bowler=None, fielder=None) -> dict:
+    return {"balls_faced": balls, "bowler": bowler, "dismissal": dismissal, "fielder": fielder, "fours": fours,
+            "player": player, "runs": runs, "sixes": 0, "strike_rate": strike_rate}
+
+
+def test_scorecard_matches_hand_computed_figures():
+    scorecard = scorecard_from_cricsheet(INNINGS, player_of_match="Spinner")
+
+    assert scorecard.to_dict() == {
+        "team": "Chennai Super Kings",
+        "batting_performance": [
+            _batting("Opener", 1, 3, 33.33, dismissal="caught", bowler="Seamer", fielder="Keeper"),
+            # The wide is not a ball faced and the leg bye is not a run scored
+            _batting("Partner", 4, 2, 200.0, fours=1, dismissal="run out", fielder="Cover"),
+            _batting("Three", 0, 6, 0.0),
+            # A no-ball is faced
+            _batting("Four", 2, 2, 100.0),
+        ],
+        "bowling_performance": [
+            # Byes and leg byes are not charged to the bowler, wides and no-balls are
+            {"economy": 9.0, "maidens": 0, "no_balls": 1, "overs": 1.0, "player": "Seamer", "runs_conceded": 9,
+             "wides": 1, "wickets": 1},
+            # Four byes and a run-out: still a maiden, and no wicket
+            {"economy": 0.0, "maidens": 1, "no_balls": 0, "overs": 1.0, "player": "Spinner", "runs_conceded": 0,
+             "wides": 0, "wickets": 0},
+        ],
+        "extras": {"byes": 4, "leg_byes": 1, "no_balls": 1, "penalty_runs": 0, "wides": 1},
+        "fall_of_wickets": [
+            {"wicket_number": 1, "runs_at_fall": 7, "over_at_fall": 0.5, "batsman": "Opener"},
+            {"wicket_number": 2, "runs_at_fall": 11, "over_at_fall": 1.4, "batsman": "Partner"},
+        ],
+        "partnerships": [
+            {"batsmen": ["Opener", "Partner"], "runs": 7, "balls": 5},
+            {"batsmen": ["Three", "Partner"], "runs": 4, "balls": 5},
+            {"batsmen": ["Three", "Four"], "runs": 3, "balls": 3},
+        ],
+        "final_score": {"team": "Chennai Super Kings", "total_runs": 14, "wickets_lost": 2, "overs_played": 2.0},
+        "player_of_match": "Spinner",
+    }
+
+
+def test_maiden_counted_once_whether_over_is_open_or_closed():
+    engine = ScorecardEngine("Chennai Super Kings")
+    for over in INNINGS["overs"][:2]:
+        for delivery in over["deliveries"]:
+            engine.add_cricsheet_delivery(over["over"], delivery)
+
+    def maidens():
+        return {bowling.player: bowling.maidens for bowling in engine.scorecard().bowling_performance}
+
+    # The maiden over has not been closed by a following ball yet
+    assert maidens() == {"Seamer": 0, "Spinner": 1}
+    assert maidens() == {"Seamer": 0, "Spinner": 1}
+
+    engine.add_cricsheet_delivery(2, INNINGS["overs"][2]["deliveries"][0])
+    assert maidens() == {"Seamer": 0, "Spinner": 1}
+
+
+def test_partnership_resets_after_wicket():
+    engine = ScorecardEngine("Chennai Super Kings")
+    for delivery in INNINGS["overs"][0]["deliveries"][:6]:
+        engine.add_cricsheet_delivery(0, delivery)
+    assert engine.current_partnership() is None
+
+    engine.add_cricsheet_delivery(0, INNINGS["overs"][0]["deliveries"][6])
+    partnership = engine.current_partnership()
+    assert (partnership.batsmen, partnership.runs, partnership.balls) == (["Three", "Partner"], 0, 1)
@@ -0,0 +1,52 @@
+import os
+import shutil
+from typing import List
+
+import pytest
+
+from shared.analytics.store import DeliveryFilter
+from shared.analytics.store import load_columns
+from shared.db_adapters import CollectionAdapter
+from shared.ingest.cricsheet import CricsheetIngestor
+from shared.ingest.cricsheet import derive_id
+from shared.models import cricket
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "tools", "ipl.json")
+
+
+@pytest.fixture
+def ingested(loop, database, tmp_path):
+    shutil.copy(SAMPLE, tmp_path / "1001.json")
+    loop.run_until_complete(CricsheetIngestor().ingest(str(tmp_path)))
+    return derive_id("match", "1001")
+
+
+@pytest.fixture
+def queries(monkeypatch) -> List[str]:
+    """Collections read through `find_documents`, in order."""
+    names = []
+    find_documents = CollectionAdapter.find_documents
+
+    async def record(self, *args, **kwargs):
+        names.append(self.collection_name)
+        return await find_documents(self, *args, **kwargs)
+
+    monkeypatch.setattr(CollectionAdapter, "find_documents", record)
+    return names
+
+
+@pytest.mark.parametrize("delivery_filter", [DeliveryFilter(), DeliveryFilter(season="2007/08", match_type="T20")])
+def test_load_columns_reads_matches_once(loop, ingested, queries, delivery_filter):
+    innings, powerplays, match_types = loop.run_until_complete(load_columns(delivery_filter))
+
+    assert match_types == {ingested: "T20"}
+    assert [columns.innings_number for columns in innings] == [0, 1]
+    assert all(isinstance(columns, cricket.InningsColumnsModel) for columns in innings)
+    assert set(powerplays) == {columns.innings_id for columns in innings}
+    assert queries.count("matches") == 1
+    assert queries.count("series") == 1
+
+
+def test_load_columns_without_matches(loop, ingested):
+    _, _, match_types = loop.run_until_complete(load_columns(DeliveryFilter(season="1999")))
+    assert match_types == {}
@@ -0,0 +1,130 @@
+from datetime import datetime
+from typing import List
+
+import pytest
+from bson import ObjectId
+
+from db.db import CollectionAdapters
+from shared.db_adapters import CollectionAdapter
+from shared.models import cricket
+from shared.models.common.unit_of_work import UnitOfWork
+
+PLAYERS = [ObjectId() for _ in range(3)]
+
+
+@pytest.fixture
+def writes(monkeypatch) -> List[tuple]:
+    """Records the `(collection, requests)` of every `bulk_write`."""
+    calls = []
+    bulk_write = CollectionAdapter.bulk_write
+
+    async def record(self, requests, *args, **kwargs):
+        calls.append((self.collection_name, list(requests)))
+        return await bulk_write(self, requests, *args, **kwargs)
+
+    monkeypatch.setattr(CollectionAdapter, "bulk_write", record)
+    return calls
+
+
+@pytest.fixture
+def match(loop, database) -> cricket.Match:
+    match = cricket.Match(cric_sheet_id="1001", dates=[datetime(2023, 4, 1)], match_number=1,
+                          outcome=cricket.Outcome(by_runs=10, winner="Chennai Super Kings"),
+                          series=ObjectId(), venue=ObjectId(),
+                          team_1=cricket.TeamPlayers(players=PLAYERS[:2], team_id=ObjectId()),
+                          team_2=cricket.TeamPlayers(players=[], team_id=ObjectId()),
+                          umpires=cricket.Officials(umpires=[]))
+    loop.run_until_complete(match.save_to_db())
+    return match
+
+
+def _stored(loop, collection, document_id: ObjectId) -> dict:
+    return loop.run_until_complete(collection.find_one({"_id": document_id}))
+
+
+def test_nested_and_list_mutations(loop, match, writes):
+    async def mutate():
+        async with UnitOfWork():
+            loaded = await cricket.Match.read_from_db({"_id": match.id})
+            loaded.outcome.by_runs = None
+            loaded.outcome.by_wickets = 5
+            loaded.team_1.players.append(PLAYERS[2])
+            loaded.dates.append(datetime(2023, 4, 2))
+            loaded.umpires.umpires = [PLAYERS[0]]
+            loaded.team_2.team_id = PLAYERS[1]
+            return loaded.changes()
+
+    assert loop.run_until_complete(mutate()) == {
+        "$set": {"outcome.by_runs": None, "outcome.by_wickets": 5, "team_2.team_id": PLAYERS[1]},
+        # Ids appended to a list of references are added as a set, other items pushed
+        "$addToSet": {"team_1.players": {"$each": [PLAYERS[2]]}, "umpires.umpires": {"$each": [PLAYERS[0]]}},
+        "$push": {"dates": {"$each": [datetime(2023, 4, 2)]}},
+    }
+    assert [len(requests) for _, requests in writes] == [1]
+
+    stored = _stored(loop, CollectionAdapters.MATCHES, match.id)
+    assert stored["outcome"] == {"by_runs": None, "by_wickets": 5, "is_draw": False, "winner": "Chennai Super Kings"}
+    assert stored["team_1"]["players"] == PLAYERS
+    assert stored["dates"] == [datetime(2023, 4, 1), datetime(2023, 4, 2)]
+
+
+def test_removals_set_the_list_and_unset_dropped_keys(loop, database):
+    series = cricket.Series(name="Indian Premier League", season="2023", gender="male", match_type="T20",
+                            teams=PLAYERS[:2])
+    live = cricket.LiveDeliveryModel(match_key="live-1", sequence=0, innings_number=0, team="Chennai Super Kings",
+                                     over_number=0, received_at=datetime(2023, 4, 1),
+                                     delivery={"batter": "RD Gaikwad", "runs": {"batter": 0, "total": 1},
+                                               "extras": {"wides": 1}})
+    loop.run_until_complete(series.save_to_db())
+    loop.run_until_complete(live.save_to_db())
+
+    async def mutate():
+        async with UnitOfWork():
+            loaded_series = await cricket.Series.read_from_db({"_id": series.id})
+            loaded_live = await cricket.LiveDeliveryModel.read_from_db({"_id": live.id})
+            loaded_series.teams.pop()
+            del loaded_live.delivery["extras"]
+            loaded_live.delivery["runs"]["batter"] = loaded_live.delivery["runs"]["total"] = 4
+            return loaded_series.changes(), loaded_live.changes()
+
+    assert loop.run_until_complete(mutate()) == (
+        {"$set": {"teams": PLAYERS[:1]}},
+        {"$set": {"delivery.runs.batter": 4, "delivery.runs.total": 4}, "$unset": {"delivery.extras": ""}},
+    )
+    assert _stored(loop, CollectionAdapters.SERIES, series.id)["teams"] == PLAYERS[:1]
+    assert _stored(loop, CollectionAdapters.LIVE_DELIVERIES, live.id)["delivery"] == {
+        "batter": "RD Gaikwad", "runs": {"batter": 4, "total": 4}}
+
+
+def test_unchanged_instances_are_not_written(loop, match, writes):
+    async def read():
+        async with UnitOfWork() as unit:
+            loaded = await cricket.Match.read_from_db({"_id": match.id})
+            # Reassigning equal values is not a change
+            loaded.match_number = 1
+            loaded.outcome = cricket.Outcome(by_runs=10, winner="Chennai Super Kings")
+            assert loaded.changes() is None
+            return await unit.flush()
+
+    assert loop.run_until_complete(read()) == {}
+    assert writes == []
+
+
+def test_flush_resets_the_saved_state(loop, match, writes):
+    async def mutate():
+        async with UnitOfWork() as unit:
+            loaded = await cricket.Match.read_from_db({"_id": match.id})
+            loaded.match_number = 2
+            await unit.flush()
+            assert loaded.changes() is None
+            assert loaded.__dict__["_saved"] == loaded._stored_document()
+
+            loaded.outcome.winner = "Gujarat Titans"
+            assert loaded.changes() == {"$set": {"outcome.winner": "Gujarat Titans"}}
+
+    loop.run_until_complete(mutate())
+    # The flush on leaving the block sends only what changed after the first one
+    assert [[request._doc for request in requests] for _, requests in writes] == [
+        [{"$set": {"match_number": 2}}], [{"$set": {"outcome.winner": "Gujarat Titans"}}]]
+    stored = _stored(loop, CollectionAdapters.MATCHES, match.id)
+    assert (stored["match_number"], stored["outcome"]["winner"]) == (2, "Gujarat Titans")
@@ -0,0 +1,83 @@
+import itertools
+
+from bson import ObjectId
+
+from db.db import CollectionAdapters
+
+# Latency is reported as a rate; 1e6 / rate gives microseconds per call
+
+
+def bench_insert_one(bench, database):
+    counter = itertools.count()
+    bench.run_async("adapter.insert_one",
+                    lambda: CollectionAdapters.OVERS.insert_one({"over_id": ObjectId(), "innings_id": None,
+                                                                 "over_number": next(counter), "deliveries": []}))
+
+
+def bench_find_one_by_id(bench, database, loop):
+    inserted = loop.run_until_complete(CollectionAdapters.OVERS.insert_one({"over_number": 1, "deliveries": []}))
+    bench.run_async("adapter.find_one._id", lambda: CollectionAdapters.OVERS.find_one({"_id": inserted}))
+
+
+def bench_find_one_cached(bench, database, loop):
+    inserted = loop.run_until_complete(CollectionAdapters.PLAYERS.insert_one({"cric_sheet_id": "4a8a2e3b",
+                                                                              "name": "MS Dhoni"}))
+    bench.run_async("adapter.find_one.cached", lambda: CollectionAdapters.PLAYERS.find_one({"_id": inserted}))
+
+
+def bench_find_documents(bench, database, loop):
+    innings_id = ObjectId()
+    for number in range(20):
+        loop.run_until_complete(CollectionAdapters.OVERS.insert_one({"over_id": ObjectId(), "innings_id": innings_id,
+                                                                     "over_number": number, "deliveries": []}))
+
+    async def read_innings():
+        cursor = await CollectionAdapters.OVERS.find_documents({"innings_id": innings_id},
+                                                               sort=[("innings_id", 1), ("over_number", 1)])
+        return await cursor.to_list(100)
+
+    bench.run_async("adapter.find_documents.20", read_innings, items=20, unit="documents/s")
+
+
+def bench_find_documents_after(bench, database, loop):
+    batter = ObjectId()
+    inserted = [loop.run_until_complete(CollectionAdapters.DELIVERIES.insert_one({"delivery_id": ObjectId(),
+                                                                                  "batter": batter,
+                                                                                  "runs": {"batter": 0}}))
+                for _ in range(2000)]
+    # A keyset page deep into the listing; with the (batter, _id) index it costs the same as the first page
+    after = [sorted(inserted)[1900]]
+
+    async def read_deep_page():
+        cursor = await CollectionAdapters.DELIVERIES.find_documents({"batter": batter}, sort=[("_id", 1)], limit=20,
+                                                                    after=after)
+        return await cursor.to_list(20)
+
+    bench.run_async("adapter.find_documents.after", read_deep_page, items=20, unit="documents/s")
+
+
+def bench_update_one(bench, database, loop):
+    inserted = loop.run_until_complete(CollectionAdapters.OVERS.insert_one({"over_number": 1, "deliveries": []}))
+    counter = itertools.count()
+    bench.run_async("adapter.update_one",
+                    lambda: CollectionAdapters.OVERS.update_one({"_id": inserted},
+                                                                {"$set": {"over_number": next(counter)}}))
+
+
+def bench_aggregate_group(bench, database, loop):
+    innings_ids = [ObjectId() for _ in range(10)]
+    for number in range(200):
+        loop.run_until_complete(CollectionAdapters.OVERS.insert_one({"over_id": ObjectId(),
+                                                                     "innings_id": innings_ids[number % 10],
+                                                                     "over_number": number // 10,
+                                                                     "deliveries": []}))
+
+    async def overs_per_innings():
+        cursor = await CollectionAdapters.OVERS.aggregate([
+            {"$match": {"innings_id": {"$in": innings_ids}}},
+            {"$group": {"_id": "$innings_id", "overs": {"$sum": 1}, "last": {"$max": "$over_number"}}},
+            {"$sort": {"overs": -1}},
+        ])
+        return await cursor.to_list(None)
+
+    bench.run_async("adapter.aggregate.group.200", overs_per_innings, items=200, unit="documents/s")
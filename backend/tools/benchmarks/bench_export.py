@@ -0,0 +1,51 @@
+import pytest
+
+import samples
+from shared.analytics.store import DeliveryFilter
+from shared.analytics.store import load_frame
+from shared.ingest.cricsheet import CricsheetIngestor
+
+pytest.importorskip("pyarrow")
+
+from shared.analytics.export import ParquetExporter  # noqa: E402
+from shared.analytics.mapped import load_mapped_frame  # noqa: E402
+
+MATCHES = 50
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("cricsheet")
+    _, deliveries = samples.synthetic_corpus(str(directory), MATCHES)
+    return str(directory), deliveries
+
+
+@pytest.fixture
+def export(tmp_path, loop, database, corpus):
+    path, deliveries = corpus
+    loop.run_until_complete(CricsheetIngestor(layout="columnar").ingest(path))
+    loop.run_until_complete(ParquetExporter(str(tmp_path)).export())
+    return str(tmp_path), deliveries
+
+
+def bench_export_unchanged(bench, export):
+    root, _ = export
+
+    async def sync():
+        exporter = ParquetExporter(root)
+        await exporter.export()
+        assert not exporter.exported
+
+    bench.run_async("export.unchanged.partitions", sync)
+
+
+def bench_load_frame(bench, export):
+    _, deliveries = export
+    bench.run_async("analytics.load_frame.deliveries", lambda: load_frame(DeliveryFilter()), items=deliveries,
+                    unit="deliveries/s")
+
+
+def bench_load_mapped_frame(bench, export):
+    root, deliveries = export
+    bench.run("analytics.load_mapped_frame.deliveries", lambda: load_mapped_frame(root, DeliveryFilter()),
+              items=deliveries, unit="deliveries/s")
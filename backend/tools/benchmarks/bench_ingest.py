@@ -0,0 +1,39 @@
+import pytest
+
+import samples
+from shared.ingest.cricsheet import CricsheetIngestor
+from shared.ingest.cricsheet import LAYOUTS
+
+MATCHES = 50
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("cricsheet")
+    matches, deliveries = samples.synthetic_corpus(str(directory), MATCHES)
+    return str(directory), matches, deliveries
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def bench_ingest(bench, database, corpus, layout):
+    path, matches, deliveries = corpus
+
+    async def ingest():
+        ingestor = CricsheetIngestor(layout=layout, incremental=False)
+        await ingestor.ingest(path)
+        assert not ingestor.errors, ingestor.errors
+
+    result = bench.run_async(f"ingest.{layout}.deliveries", ingest, items=deliveries, unit="deliveries/s")
+    bench.record(f"ingest.{layout}.matches", result, scale=matches / deliveries, unit="matches/s")
+
+
+def bench_ingest_unchanged(bench, loop, database, corpus):
+    path, matches, _ = corpus
+    loop.run_until_complete(CricsheetIngestor().ingest(path))
+
+    async def sync():
+        ingestor = CricsheetIngestor()
+        await ingestor.ingest(path)
+        assert ingestor.skipped == matches, (ingestor.skipped, ingestor.errors)
+
+    bench.run_async("ingest.unchanged.files", sync, items=matches, unit="files/s")
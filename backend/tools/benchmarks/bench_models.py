@@ -0,0 +1,63 @@
+import pytest
+
+import samples
+from shared.models import cricket
+
+SAMPLE = samples.load_sample()
+
+# Factories of fully populated instances, from flat value objects to the innings with its embedded scorecard
+MODELS = {
+    "RunsModel": samples.runs,
+    "DeliveryModel": samples.delivery,
+    "Series": samples.series,
+    "Player": samples.player,
+    "Match": samples.match,
+    "InningsModel": lambda: samples.innings(SAMPLE),
+    "InningsColumnsModel": lambda: samples.innings_columns(SAMPLE),
+}
+
+
+@pytest.mark.parametrize("model", MODELS)
+def bench_init(bench, model):
+    instance = MODELS[model]()
+    values = {name: getattr(instance, name) for name in instance._fields}
+    bench.run(f"model.{model}.__init__", lambda: type(instance)(**values))
+
+
+@pytest.mark.parametrize("model", MODELS)
+def bench_to_dict(bench, model):
+    bench.run(f"model.{model}.to_dict", MODELS[model]().to_dict)
+
+
+@pytest.mark.parametrize("model", MODELS)
+def bench_validate(bench, model):
+    bench.run(f"model.{model}.validate", MODELS[model]().validate)
+
+
+@pytest.mark.parametrize("model", MODELS)
+def bench_changes(bench, model):
+    # Diffing an unchanged instance against its stored state, the cost a unit of work pays per tracked instance
+    instance = MODELS[model]()
+    instance._remember()
+    bench.run(f"model.{model}.changes", instance.changes)
+
+
+@pytest.mark.parametrize("trusted", [False, True], ids=["validated", "trusted"])
+@pytest.mark.parametrize("model", MODELS)
+def bench_decode(bench, model, trusted):
+    instance = MODELS[model]()
+    document = instance.to_dict()
+    document["_id"] = samples.IDS[5]
+    model_class = type(instance)
+    bench.run(f"model.{model}.decode.{'trusted' if trusted else 'validated'}",
+              lambda: model_class._from_document(document, trusted=trusted))
+
+
+def bench_lazy_decode(bench):
+    document = samples.innings_document(SAMPLE)
+
+    def read_two_fields():
+        innings = cricket.InningsModel._from_document(document, lazy=True)
+        return innings.innings_number, innings.team
+
+    bench.run("model.InningsModel.decode.lazy_two_fields", read_two_fields)
@@ -0,0 +1,67 @@
+import random
+import string
+import time
+
+import pytest
+from pymongo import InsertOne
+
+from db.db import CollectionAdapters
+from shared.search.names import NameIndex
+
+PLAYERS = 40000
+# Type-ahead latency target at the 99th percentile
+P99_TARGET = 0.005
+
+
+def _word(rng: random.Random, shortest: int, longest: int) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(shortest, longest))).title()
+
+
+@pytest.fixture
+def players(loop, database):
+    """Cricsheet style short names with full names, e.g. "AB Smith" and "Alan Bob Smith"."""
+    rng = random.Random(7)
+    first = [_word(rng, 3, 9) for _ in range(3000)]
+    last = [_word(rng, 4, 10) for _ in range(8000)]
+    documents = []
+    for index in range(PLAYERS):
+        given, middle, family = rng.choice(first), rng.choice(first), rng.choice(last)
+        documents.append({"name": f"{given[0]}{middle[0]} {family}", "full_name": f"{given} {middle} {family}",
+                          "cric_sheet_id": f"{index:08x}"})
+    loop.run_until_complete(CollectionAdapters.PLAYERS.bulk_write([InsertOne(document) for document in documents]))
+    return documents
+
+
+def bench_name_index_load(bench, loop, players):
+    bench.run_async("search.load.names", NameIndex().load, items=len(players), unit="players/s")
+
+
+def bench_name_index_search(bench, loop, players):
+    index = NameIndex()
+    loop.run_until_complete(index.load())
+
+    # Type-ahead prefixes of full names, a third of them with a letter dropped
+    rng = random.Random(11)
+    queries = []
+    for _ in range(1000):
+        name = rng.choice(players)["full_name"]
+        query = name[:rng.randint(1, len(name))]
+        if len(query) > 3 and rng.random() < 0.3:
+            dropped = rng.randrange(len(query))
+            query = query[:dropped] + query[dropped + 1:]
+        queries.append(query)
+
+    def search_all():
+        for query in queries:
+            index.search(query)
+
+    bench.run("search.type_ahead.queries", search_all, items=len(queries), unit="queries/s")
+
+    latencies = []
+    for _ in range(3):
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query)
+            latencies.append(time.perf_counter() - started)
+    p99 = bench.latency("search.type_ahead.p99", latencies)
+    assert p99 < P99_TARGET, f"p99 type-ahead latency {p99 * 1000:.2f} ms over {len(players):,} players"
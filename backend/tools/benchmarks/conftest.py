@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Sequence
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from db.db import Caches  # noqa: E402
+from db.db import DatabaseAdapter  # noqa: E402
+from shared.db_adapters import DatabaseAdapterBuilder  # noqa: E402
+from shared.db_adapters.memory import MemoryDatabase  # noqa: E402
+from shared.models import cricket  # noqa: E402,F401  (registers the stored models for ensure_indexes)
+from shared.models.common.indexes import ensure_indexes  # noqa: E402
+import results  # noqa: E402
+
+_RESULTS: Dict[str, Dict[str, Any]] = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmarks")
+    group.addoption("--bench-json", help="Write the results to this file")
+    group.addoption("--bench-baseline", help="Fail when a result regresses against this results file")
+    group.addoption("--bench-threshold", type=float, default=0.1, help="Allowed slowdown, 0.1 for 10%")
+    group.addoption("--bench-rounds", type=int, default=5, help="Measured rounds per benchmark")
+    group.addoption("--bench-round-time", type=float, default=0.2, help="Minimum seconds per round")
+
+
+class Bench:
+    """Runs a callable in calibrated rounds and records the median rate under a stable name; latency percentiles are
+    recorded too, flagged as lower is better."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, rounds: int, round_time: float) -> None:
+        self._loop = loop
+        self._rounds = rounds
+        self._round_time = round_time
+
+    def _measure(self, name: str, timed: Callable[[int], float], items: int, unit: str) -> Dict[str, Any]:
+        timed(1)  # warm-up
+        number = 1
+        while timed(number) < self._round_time:
+            number *= 2
+
+        rates = [number * items / timed(number) for _ in range(self._rounds)]
+        _RESULTS[name] = results.summarise(rates, unit)
+        return _RESULTS[name]
+
+    def run(self, name: str, func: Callable[[], Any], /, items: int = 1, unit: str = "ops/s") -> Dict[str, Any]:
+        def timed(number: int) -> float:
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            return time.perf_counter() - started
+
+        return self._measure(name, timed, items, unit)
+
+    def run_async(self, name: str, func: Callable[[], Any], /, items: int = 1,
+                  unit: str = "ops/s") -> Dict[str, Any]:
+        async def repeat(number: int) -> float:
+            started = time.perf_counter()
+            for _ in range(number):
+                await func()
+            return time.perf_counter() - started
+
+        return self._measure(name, lambda number: self._loop.run_until_complete(repeat(number)), items, unit)
+
+    def record(self, name: str, result: Dict[str, Any], /, scale: float, unit: str) -> Dict[str, Any]:
+        """Stores a rate derived from another measurement, e.g. matches/s from deliveries/s."""
+        _RESULTS[name] = {**result, "unit": unit,
+                          **{key: result[key] * scale for key in ("median", "min", "max")}}
+        return _RESULTS[name]
+
+    def latency(self, name: str, seconds: Sequence[float], /, percentile: float = 99) -> float:
+        """Stores the `percentile` of per-call latencies in microseconds and returns it in seconds."""
+        value = float(np.percentile(seconds, percentile))
+        _RESULTS[name] = {"unit": f"us p{percentile:g}", "median": value * 1e6, "min": min(seconds) * 1e6,
+                          "max": max(seconds) * 1e6, "rounds": len(seconds), "lower_is_better": True}
+        return value
+
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def bench(request, loop) -> Bench:
+    return Bench(loop, request.config.getoption("--bench-rounds"), request.config.getoption("--bench-round-time"))
+
+
+@pytest.fixture
+def database(loop):
+    """Points the cricket collections at `$BENCH_MONGO_URI` (a throwaway database) or an in-memory database."""
+    uri = os.environ.get("BENCH_MONGO_URI")
+    if uri:
+        db = DatabaseAdapterBuilder(uri, "gameviz_benchmarks").build()
+        loop.run_until_complete(db.client.drop_database(db.name))
+    else:
+        db = MemoryDatabase("gameviz_benchmarks")
+
+    previous = DatabaseAdapter.CRICKET._db
+    DatabaseAdapter.CRICKET.use(db)
+    Caches.DIMENSIONS.clear()
+    # Like the ingest script and the API, so both backends answer the benchmarked queries from indexes
+    loop.run_until_complete(ensure_indexes())
+    yield db
+    DatabaseAdapter.CRICKET._db = previous
+    Caches.DIMENSIONS.clear()
+    if uri:
+        loop.run_until_complete(db.client.drop_database(db.name))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not _RESULTS:
+        return
+
+    output = results.report(_RESULTS)
+    path = config.getoption("--bench-json")
+    if path:
+        with open(path, "w") as file:
+            json.dump(output, file, indent=2)
+
+    baseline_path = config.getoption("--bench-baseline")
+    if baseline_path:
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        config._bench_regressions = results.compare(output, baseline, config.getoption("--bench-threshold"))
+        if config._bench_regressions:
+            session.exitstatus = 1
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    # The terminal reporter prints its summary after every other `pytest_sessionfinish` hook has run
+    if not _RESULTS:
+        return
+
+    terminalreporter.section("benchmarks")
+    for name, result in _RESULTS.items():
+        terminalreporter.write_line(f"{name:<48} {result['median']:>14,.0f} {result['unit']}")
+    for line in getattr(config, "_bench_regressions", []):
+        terminalreporter.write_line(f"REGRESSION {line}", red=True)
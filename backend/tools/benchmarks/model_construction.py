@@ -0,0 +1,40 @@
+import argparse
+import time
+
+import samples
+from shared.models import cricket
+
+CASES = {
+    "RunsModel()": samples.runs,
+    "DeliveryModel()": samples.delivery,
+    "Series()": samples.series,
+}
+
+
+def _rate(func, seconds: float) -> float:
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(1000):
+            func()
+        count += 1000
+    return count / (time.perf_counter() - started)
+
+
+def main(seconds: float):
+    delivery = samples.delivery()
+    cases = dict(CASES)
+    cases["DeliveryModel.to_dict()"] = delivery.to_dict
+    document = samples.innings_document(samples.load_sample())
+    cases["InningsModel decode"] = lambda: cricket.InningsModel._from_document(document)
+    cases["InningsModel decode trusted"] = lambda: cricket.InningsModel._from_document(document, trusted=True)
+
+    for name, func in cases.items():
+        print(f"{name:<28} {_rate(func, seconds):>12,.0f} objects/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure model construction and serialisation throughput.")
+    parser.add_argument("--seconds", type=float, default=1.0, help="Time spent on each case")
+    main(parser.parse_args().seconds)
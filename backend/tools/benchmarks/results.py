@@ -0,0 +1,65 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+def summarise(rates: List[float], unit: str) -> Dict[str, Any]:
+    return {"unit": unit,
+            "median": statistics.median(rates),
+            "min": min(rates),
+            "max": max(rates),
+            "rounds": len(rates)}
+
+
+def report(results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    return {"meta": {"created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                     "python": platform.python_version(),
+                     "platform": platform.platform(),
+                     "numpy": np.__version__},
+            "results": results}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Returns one line per benchmark whose median rate fell more than `threshold` (0.1 = 10%) below the baseline, or
+    whose latency rose by as much."""
+    regressions = []
+    for name, stored in baseline["results"].items():
+        measured = current["results"].get(name)
+        if measured is None:
+            continue
+
+        change = measured["median"] / stored["median"] - 1
+        if stored.get("lower_is_better"):
+            change = stored["median"] / measured["median"] - 1
+        if change < -threshold:
+            regressions.append(f"{name}: {measured['median']:,.0f} {measured['unit']} vs baseline "
+                               f"{stored['median']:,.0f} ({change:+.1%})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("current", help="Results written by `pytest tools/benchmarks --bench-json`")
+    parser.add_argument("baseline", help="Stored baseline results")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed slowdown, 0.1 for 10%%")
+    args = parser.parse_args()
+
+    with open(args.current) as file:
+        current = json.load(file)
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+
+    regressions = compare(current, baseline, args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
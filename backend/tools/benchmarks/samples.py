@@ -0,0 +1,153 @@
+import copy
+import json
+import os
+import random
+from typing import Any, Dict, Tuple
+
+from bson import ObjectId
+
+from shared.models import cricket
+from shared.models.columnar import InningsColumnsBuilder
+from shared.scoring.scorecard import scorecard_from_cricsheet
+
+SAMPLE_MATCH = os.path.join(os.path.dirname(__file__), "..", "ipl.json")
+
+# Ids are created once so the numbers reflect model overhead rather than ObjectId generation
+IDS = [ObjectId() for _ in range(6)]
+
+
+def load_sample() -> Dict[str, Any]:
+    with open(SAMPLE_MATCH) as file:
+        return json.load(file)
+
+
+def runs() -> cricket.RunsModel:
+    return cricket.RunsModel(runs_by_batter=1, extras=0, total=1)
+
+
+def delivery() -> cricket.DeliveryModel:
+    return cricket.DeliveryModel(
+        delivery_id=IDS[0],
+        over_id=IDS[1],
+        delivery_number=1,
+        batter=IDS[2],
+        bowler=IDS[3],
+        non_striker=IDS[4],
+        runs=cricket.RunsModel(runs_by_batter=4, extras=0, total=4),
+    )
+
+
+def series() -> cricket.Series:
+    return cricket.Series(name="Indian Premier League", season="2007/08", gender="male", match_type="T20")
+
+
+def player() -> cricket.Player:
+    return cricket.Player(cric_sheet_id="4a8a2e3b", name="MS Dhoni", full_name="MS Dhoni", teams=[IDS[0]])
+
+
+def match() -> cricket.Match:
+    return cricket.Match(
+        cric_sheet_id="335983",
+        dates=[],
+        match_number=2,
+        outcome=cricket.Outcome(winner="Chennai Super Kings", by_runs=33),
+        series=IDS[0],
+        team_1=cricket.TeamPlayers(players=IDS[:3], team_id=IDS[3]),
+        team_2=cricket.TeamPlayers(players=IDS[3:], team_id=IDS[4]),
+        umpires=cricket.Officials(umpires=IDS[:2], tv_umpires=IDS[2:3], match_referees=IDS[3:4]),
+        venue=IDS[5],
+    )
+
+
+def innings(sample: Dict[str, Any]) -> cricket.InningsModel:
+    """First innings of the sample match, including its full scorecard."""
+    first = sample["innings"][0]
+    return cricket.InningsModel(
+        innings_id=IDS[0],
+        match_id=IDS[1],
+        innings_number=0,
+        team=IDS[2],
+        overs=[ObjectId() for _ in first["overs"]],
+        power_play=cricket.PowerplayModel(from_over=0.1, to_over=5.6, type="mandatory"),
+        scoreboard=scorecard_from_cricsheet(first),
+    )
+
+
+def innings_document(sample: Dict[str, Any]) -> Dict[str, Any]:
+    """Stored form of `innings(sample)`, as read back from the database."""
+    document = innings(sample).to_dict()
+    document["_id"] = IDS[0]
+    return document
+
+
+def innings_columns(sample: Dict[str, Any]) -> cricket.InningsColumnsModel:
+    names: Dict[str, ObjectId] = {}
+    builder = InningsColumnsBuilder()
+    for over in sample["innings"][0]["overs"]:
+        for number, ball in enumerate(over["deliveries"], start=1):
+            builder.append(over["over"], cricket.DeliveryModel(
+                delivery_id=IDS[0],
+                over_id=IDS[1],
+                delivery_number=number,
+                batter=names.setdefault(ball["batter"], ObjectId()),
+                bowler=names.setdefault(ball["bowler"], ObjectId()),
+                non_striker=names.setdefault(ball["non_striker"], ObjectId()),
+                runs=cricket.RunsModel(runs_by_batter=ball["runs"]["batter"], extras=ball["runs"]["extras"],
+                                       total=ball["runs"]["total"]),
+            ))
+    return builder.build(IDS[0], IDS[1], 0, IDS[2])
+
+
+def synthetic_corpus(directory: str, matches: int, /, players: int = 300, seed: int = 7) -> Tuple[int, int]:
+    """Writes `matches` Cricsheet files shaped like the sample match and returns `(matches, deliveries)`.
+
+    Players are drawn from a pool of `players` names and batter runs are perturbed, so dimension resolution and
+    scorecards do real work; the same seed always produces the same corpus.
+    """
+    sample = load_sample()
+    rng = random.Random(seed)
+    pool = [(f"Player {index}", f"{index:08x}") for index in range(players)]
+    teams = [f"Team {index}" for index in range(10)]
+    os.makedirs(directory, exist_ok=True)
+    deliveries = 0
+
+    for index in range(matches):
+        data = copy.deepcopy(sample)
+        info = data["info"]
+        original = list(info["registry"]["people"])
+        renamed = dict(zip(original, (name for name, _ in rng.sample(pool, len(original)))))
+        ids = dict(pool)
+
+        home, away = rng.sample(teams, 2)
+        team_names = dict(zip(info["teams"], (home, away)))
+        info["teams"] = [home, away]
+        info["season"] = str(2008 + index % 15)
+        info["dates"] = [f"{info['season']}-04-{1 + index % 28:02d}"]
+        info["outcome"]["winner"] = team_names[info["outcome"]["winner"]]
+        info["players"] = {team_names[team]: [renamed[name] for name in names]
+                           for team, names in info["players"].items()}
+        info["registry"]["people"] = {renamed[name]: ids[renamed[name]] for name in original}
+        info["player_of_match"] = [renamed[name] for name in info["player_of_match"]]
+        for key, names in info["officials"].items():
+            info["officials"][key] = [renamed[name] for name in names]
+
+        for innings_data in data["innings"]:
+            innings_data["team"] = team_names[innings_data["team"]]
+            for over in innings_data["overs"]:
+                for ball in over["deliveries"]:
+                    for key in ("batter", "bowler", "non_striker"):
+                        ball[key] = renamed[ball[key]]
+                    for wicket in ball.get("wickets", []):
+                        wicket["player_out"] = renamed[wicket["player_out"]]
+                        for fielder in wicket.get("fielders", []):
+                            if "name" in fielder:
+                                fielder["name"] = renamed[fielder["name"]]
+                    if ball["runs"]["batter"] in (0, 1, 2) and rng.random() < 0.3:
+                        ball["runs"]["batter"] = rng.choice((0, 1, 2, 4, 6))
+                        ball["runs"]["total"] = ball["runs"]["batter"] + ball["runs"]["extras"]
+                    deliveries += 1
+
+        with open(os.path.join(directory, f"{1000000 + index}.json"), "w") as file:
+            json.dump(data, file)
+
+    return matches, deliveries
@@ -0,0 +1,45 @@
+import argparse
+import asyncio
+import os
+import time
+
+from shared.enrichment.players import PlayerEnricher
+from shared.models.common.indexes import ensure_indexes
+
+
+async def enrich(base_url: str,
+                 cache_dir: str,
+                 concurrency: int,
+                 rate: float,
+                 refresh: bool,
+                 limit: int):
+    enricher = PlayerEnricher(base_url, cache_dir=cache_dir, concurrency=concurrency, rate=rate)
+    await ensure_indexes()
+
+    started = time.perf_counter()
+    await enricher.enrich(refresh=refresh, limit=limit)
+    elapsed = time.perf_counter() - started
+
+    fetcher = enricher.fetcher
+    print(f"Looked up {enricher.players} players in {elapsed:.1f}s: {enricher.updated} enriched, "
+          f"{enricher.not_found} not found, {len(enricher.errors)} failed "
+          f"({fetcher.requests} requests, {fetcher.not_modified} not modified, {fetcher.retries} retries)")
+
+    for cric_sheet_id, error in enricher.errors:
+        print(f"Failed {cric_sheet_id}: {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill player profile fields from an HTTP profile source.")
+    parser.add_argument("--base-url", default=os.environ.get("PLAYER_PROFILES_URL"),
+                        help="Profiles are read from {base-url}/{cric_sheet_id} (default: $PLAYER_PROFILES_URL)")
+    parser.add_argument("--cache-dir", default=".cache/player_profiles", help="Directory of cached responses")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests allowed to run concurrently")
+    parser.add_argument("--rate", type=float, default=10.0, help="Requests per second per host")
+    parser.add_argument("--refresh", action="store_true", help="Also revisit players looked up before")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many players (0 for all)")
+    args = parser.parse_args()
+    if not args.base_url:
+        parser.error("--base-url or PLAYER_PROFILES_URL is required")
+
+    asyncio.run(enrich(args.base_url, args.cache_dir, args.concurrency, args.rate, args.refresh, args.limit))
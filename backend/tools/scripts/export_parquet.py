@@ -0,0 +1,29 @@
+import argparse
+import asyncio
+import time
+
+from shared.analytics.export import ParquetExporter
+
+
+async def export(root: str,
+                 full: bool,
+                 compression: str):
+    exporter = ParquetExporter(root, full=full, compression=compression)
+
+    started = time.perf_counter()
+    await exporter.export()
+    elapsed = time.perf_counter() - started
+
+    print(f"Exported {exporter.exported} partitions with {exporter.deliveries} deliveries in {elapsed:.1f}s")
+    print(f"Skipped {exporter.skipped} unchanged partitions, removed {exporter.removed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export matches, innings and deliveries to partitioned Parquet.")
+    parser.add_argument("root", help="Directory to write the export to")
+    parser.add_argument("--full", action="store_true",
+                        help="Rewrite every partition, including those the manifest records as unchanged")
+    parser.add_argument("--compression", default="zstd", help="Parquet compression codec")
+    args = parser.parse_args()
+
+    asyncio.run(export(args.root, args.full, args.compression))
@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import time
+
+from shared.ingest.cricsheet import CricsheetIngestor
+from shared.ingest.cricsheet import LAYOUTS
+from shared.models.common.indexes import ensure_indexes
+
+
+async def ingest(path: str,
+                 batch_size: int,
+                 max_in_flight: int,
+                 chunk_size: int,
+                 layout: str,
+                 full: bool,
+                 prune: bool):
+    ingestor = CricsheetIngestor(batch_size=batch_size,
+                                 max_in_flight=max_in_flight,
+                                 chunk_size=chunk_size,
+                                 layout=layout,
+                                 incremental=not full,
+                                 prune=prune)
+
+    # Unique natural-key indexes keep concurrent upserts from creating duplicates
+    await ensure_indexes()
+
+    started = time.perf_counter()
+    await ingestor.ingest(path)
+    elapsed = time.perf_counter() - started
+
+    print(f"Ingested {ingestor.matches} matches and {ingestor.deliveries} deliveries "
+          f"in {elapsed:.1f}s ({ingestor.deliveries / max(elapsed, 1e-9):.0f} deliveries/s, "
+          f"{ingestor.writer.batches} batches)")
+    print(f"Replaced {ingestor.replaced} stored matches, skipped {ingestor.skipped} unchanged files, "
+          f"deleted {ingestor.deleted} matches whose file is gone")
+
+    for match_key, error in ingestor.errors:
+        print(f"Skipped {match_key}: {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load Cricsheet match JSON into the cricket database.")
+    parser.add_argument("path", help="Directory or zip archive of Cricsheet JSON match files")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Operations per bulk_write call")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Bulk writes allowed to run concurrently")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Matches whose dimensions are resolved together")
+    parser.add_argument("--layout", choices=LAYOUTS, default="both",
+                        help="Store deliveries as documents, packed innings columns, or both")
+    parser.add_argument("--full", action="store_true",
+                        help="Load every file, including those the manifest records as unchanged")
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete matches recorded in the manifest whose file is no longer under the path")
+    args = parser.parse_args()
+
+    asyncio.run(ingest(args.path, args.batch_size, args.max_in_flight, args.chunk_size, args.layout, args.full,
+                       args.prune))
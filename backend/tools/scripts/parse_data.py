@@ -4,6 +4,7 @@ import typing
 
 from db import collection_structures as coll
 from shared.models import cricket
+from shared.models.common.unit_of_work import UnitOfWork
 
 
 async def parse():
@@ -12,22 +13,26 @@ async def parse():
 
         match_info = data.get("info")
 
-        series = await _get_series(match_info["event"]["name"],
+    # New documents and the series' added team ids are written in one bulk write per collection on leaving the block
+    async with UnitOfWork() as unit:
+        series = await _get_series(unit,
+                                   match_info["event"]["name"],
                                    match_info["season"],
                                    match_info['gender'],
                                    match_info['match_type'])
 
         for team in match_info["teams"]:
-            team_data = await _get_teams(team,
+            team_data = await _get_teams(unit,
+                                         team,
                                          match_info['team_type'])
             if team_data.id not in series.teams:
                 series.teams.append(team_data.id)
 
         print(f"Final series teams: {series.teams}")
-        await series.update_in_db()
 
 
-async def _get_series(name: str,
+async def _get_series(unit: UnitOfWork,
+                      name: str,
                       season: str,
                       gender: str,
                       match_type: str) -> typing.Optional[cricket.Series]:
@@ -41,16 +46,16 @@ async def _get_series(name: str,
     series = await cricket.Series.read_from_db(query)
 
     if not series:
-        series = cricket.Series(name=name,
-                                season=season,
-                                gender=gender,
-                                match_type=match_type)
-        await series.save_to_db()
+        series = unit.add(cricket.Series(name=name,
+                                         season=season,
+                                         gender=gender,
+                                         match_type=match_type))
 
     return series
 
 
-async def _get_teams(name: str,
+async def _get_teams(unit: UnitOfWork,
+                     name: str,
                      team_type: str):
     query = {
         coll.Teams.NAME: name,
@@ -59,11 +64,10 @@ async def _get_teams(name: str,
 
     team = await cricket.Team.read_from_db(query)
     if not team:
-        team = cricket.Team(
+        team = unit.add(cricket.Team(
             name=name,
             team_type=team_type
-        )
-        await team.save_to_db()
+        ))
 
     return team
 